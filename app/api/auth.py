@@ -1,11 +1,17 @@
 """
 FastAPI endpoints for authentication (simple demo: user=admin, password=admin).
+
+La sesión es una cookie firmada con el usuario y el proyecto activo, que determinan
+el espacio de trabajo de cada petición.
 """
-from fastapi import APIRouter, Form, Request
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi import APIRouter, Depends, Form, Request
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse
 from fastapi.templating import Jinja2Templates
 from starlette.status import HTTP_302_FOUND
 
+from app.services.workspaces import DEFAULT_PROJECT, Workspace, current_workspace, list_projects, valid_name
+from app.utils.sessions import SESSION_COOKIE, SESSION_MAX_AGE, sign_session
+
 router = APIRouter()
 templates = Jinja2Templates(directory="templates")
 
@@ -16,6 +22,12 @@ USERS = {
     "admin": "1234",
 }
 
+def _set_session(response, user: str, project: str) -> None:
+    response.set_cookie(
+        SESSION_COOKIE, sign_session(user, project),
+        max_age=SESSION_MAX_AGE, httponly=True, samesite="lax",
+    )
+
 @router.get("/auth/login", response_class=HTMLResponse)
 async def login_form(request: Request):
     """Render login form."""
@@ -26,7 +38,7 @@ async def login_submit(request: Request, username: str = Form(...), password: st
     """Validate login credentials."""
     if username in USERS and password == USERS[username]:
         response = RedirectResponse(url="/", status_code=HTTP_302_FOUND)
-        response.set_cookie("session", "dummy-session-token")
+        _set_session(response, username, DEFAULT_PROJECT)
         return response
     return templates.TemplateResponse(
         "auth/login.html", {"request": request, "error": "Credenciales incorrectas"}
@@ -36,5 +48,23 @@ async def login_submit(request: Request, username: str = Form(...), password: st
 async def logout():
     """Cerrar sesión y redirigir a login."""
     response = RedirectResponse(url="/login")
-    response.delete_cookie("session")
+    response.delete_cookie(SESSION_COOKIE)
+    return response
+
+@router.get("/workspace", response_class=JSONResponse)
+async def get_workspace(workspace: Workspace = Depends(current_workspace)) -> dict:
+    """Usuario, proyecto activo y proyectos disponibles de la sesión."""
+    return {"user": workspace.user, "project": workspace.project, "projects": list_projects(workspace.user)}
+
+@router.post("/workspace/project")
+async def switch_project(project: str = Form(...), workspace: Workspace = Depends(current_workspace)):
+    """Cambia el proyecto activo de la sesión (creándolo si no existe) y vuelve a la pantalla principal."""
+    project = project.strip()
+    if not valid_name(project):
+        return JSONResponse(
+            status_code=400,
+            content={"error": "Nombre de proyecto no válido (letras, números, '-' y '_', hasta 64 caracteres)."},
+        )
+    response = RedirectResponse(url="/", status_code=HTTP_302_FOUND)
+    _set_session(response, workspace.user, project)
     return response
@@ -1,11 +1,15 @@
 """
 FastAPI API routes for ChatBot IA con Azure OpenAI y contexto del documento funcional.
 """
-from fastapi import APIRouter, Request, HTTPException, Body
+from fastapi import APIRouter, Request, HTTPException, Body, Depends
 from fastapi.templating import Jinja2Templates
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from app.models.chatbot import ChatRequest, ChatResponse
-from app.services.openai_service import ask_azure_openai
+from app.services.openai_service import ask_azure_openai, stream_azure_openai
+from app.services.document_context import funcional_indexes
+from app.services.llm_cache import llm_cache
+from app.services.workspaces import Workspace, current_workspace
+from app.utils.sse import SSE_HEADERS, sse_event
 import asyncio
 from typing import Optional
 
@@ -17,16 +21,51 @@ def chatbot_page(request: Request):
     """Renderiza la página del chatbot."""
     return templates.TemplateResponse("chatbot/index.html", {"request": request})
 
+async def _resolve_document_content(data: ChatRequest, workspace: Workspace) -> str:
+    """Contexto documental de la consulta: con document_ref se resuelve en el servidor (funcional del espacio
+    de trabajo de la sesión); document_content puede ser vacío."""
+    if data.document_ref == "funcional" or data.section_id:
+        index = funcional_indexes.get(workspace.key)
+        return await asyncio.to_thread(index.context_for, data.message, data.section_id)
+    return data.document_content or ""
+
+@router.get("/chatbot/llm-cache/stats", response_class=JSONResponse)
+async def llm_cache_stats() -> dict:
+    """Devuelve los aciertos/fallos y la ocupación de la caché de respuestas del modelo."""
+    return llm_cache.stats()
+
 @router.post("/chatbot", response_model=ChatResponse)
 async def chatbot_ask(
-    data: ChatRequest = Body(...)
+    data: ChatRequest = Body(...),
+    workspace: Workspace = Depends(current_workspace),
 ):
     """Recibe mensaje y contexto, responde usando Azure OpenAI."""
     if not data.message:
         raise HTTPException(status_code=400, detail="Falta el mensaje para la consulta.")
-    # document_content puede ser vacío
+    document_content = await _resolve_document_content(data, workspace)
     try:
-        response = await ask_azure_openai(data.message, data.document_content or "")
+        response = await ask_azure_openai(data.message, document_content, use_cache=not data.no_cache)
         return ChatResponse(response=response)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error IA: {str(e)}")
+
+@router.post("/chatbot/stream")
+async def chatbot_ask_stream(
+    data: ChatRequest = Body(...),
+    workspace: Workspace = Depends(current_workspace),
+):
+    """Igual que /chatbot, pero relaya la respuesta como Server-Sent Events (eventos token, error y done)."""
+    if not data.message:
+        raise HTTPException(status_code=400, detail="Falta el mensaje para la consulta.")
+    document_content = await _resolve_document_content(data, workspace)
+
+    async def events():
+        try:
+            async for delta in stream_azure_openai(data.message, document_content, use_cache=not data.no_cache):
+                yield sse_event({"delta": delta}, event="token")
+        except Exception as e:
+            yield sse_event({"error": f"Error IA: {str(e)}"}, event="error")
+            return
+        yield sse_event({}, event="done")
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
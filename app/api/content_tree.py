@@ -1,33 +1,22 @@
 """
 FastAPI API routes for content tree.
 """
-from fastapi import APIRouter, Request
+from fastapi import APIRouter, Depends, Request
 from fastapi.templating import Jinja2Templates
-import re
-from pathlib import Path
+import asyncio
+
+from app.services.document_context import funcional_indexes
+from app.services.workspaces import Workspace, current_workspace
 
 router = APIRouter()
 templates = Jinja2Templates(directory="templates")
 
 @router.get("/content-tree")
-def content_tree_page(request: Request):
-    """Renderiza el árbol de contenidos desde plantilla.txt SOLO si existe el funcional generado."""
-    funcional_path = Path("static/uploads/funcional_generado.md")
-    tree = []
-    if funcional_path.exists():
-        plantilla_path = Path("plantilla.txt")
-        if plantilla_path.exists():
-            lines = [line.strip() for line in plantilla_path.read_text(encoding="utf-8").splitlines() if line.strip()]
-            current = None
-            for line in lines:
-                m = re.match(r"^(\d+)\.\s*(.+)", line)
-                m2 = re.match(r"^(\d+)\.(\d+)\s*(.+)", line)
-                if m and not m2:
-                    # Título principal
-                    current = {"title": m.group(2), "num": m.group(1), "children": []}
-                    tree.append(current)
-                elif m2 and current:
-                    # Subtítulo
-                    current["children"].append({"title": m2.group(3), "num": f"{m2.group(1)}.{m2.group(2)}"})
+async def content_tree_page(request: Request, workspace: Workspace = Depends(current_workspace)):
+    """Renderiza el árbol de contenidos a partir de los encabezados del funcional del espacio de trabajo.
+
+    Usa el índice de secciones del documento, que solo se reconstruye cuando se guarda una versión nueva.
+    """
+    tree = await asyncio.to_thread(funcional_indexes.get(workspace.key).outline)
     # Si no existe el funcional, tree estará vacío y el índice no se mostrará
     return templates.TemplateResponse("content_tree/index.html", {"request": request, "tree": tree})
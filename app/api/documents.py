@@ -1,27 +1,42 @@
 """
 FastAPI API routes for document list and upload.
 """
-from fastapi import APIRouter, UploadFile, File, Request, HTTPException, BackgroundTasks, Body, Query
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi import APIRouter, UploadFile, File, Request, Response, HTTPException, Body, Depends, Query
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
 from pathlib import Path
 from typing import List
-import concurrent.futures
+import asyncio
+import io
 import logging
 import traceback
-import tempfile
-import markdown
-import pdfkit
-from fpdf import FPDF
 
-from app.services.openai_service import generate_funcional_analysis
-from docx import Document as DocxDocument
-from docx.shared import Pt
+from app.services.openai_service import (
+    FUNCIONAL_GENERATION_MODE,
+    generate_funcional_analysis,
+    generate_funcional_analysis_by_sections,
+    normalization_report,
+    stream_funcional_analysis,
+)
+from app.services import metrics
+from app.services.document_registry import MAX_PAGE_SIZE, document_registry, guess_mime_type
+from app.services.export_cache import export_artifacts, export_etag
+from app.services.exports import EXPORT_FORMATS
+from app.services.extraction import extraction_cache
+from app.services.extraction_jobs import STATUS_PENDING, extraction_jobs
+from app.services.funcional_store import SOURCE_EDIT, SOURCE_GENERATE, SOURCE_STREAM, FuncionalVersionConflict, funcional_store
+from app.services.funcional_writer import FuncionalNotFoundError, funcional_writer
+from app.services.generation_jobs import JOB_DONE, JOB_FAILED, GenerationJob, generation_fingerprint, generation_jobs
+from app.services.plantillas import DEFAULT_PLANTILLA, PlantillaNotFoundError, get_plantilla, plantilla_store
+from app.services.upload_storage import UploadTooLargeError, save_upload_stream
+from app.services.workspaces import Workspace, current_workspace
+from app.models.funcional import FuncionalUpdate, SectionUpdate
+from app.utils.downloads import download_response, is_not_modified, not_modified_response, validator_headers
+from app.utils.markdown_sections import MarkdownIndex
+from app.utils.sse import SSE_HEADERS, sse_event
 
 router = APIRouter()
 templates = Jinja2Templates(directory="templates")
-UPLOAD_DIR = Path("static/uploads")
-UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 
 documents_cache: List[str] = []
 
@@ -32,21 +47,56 @@ logging.basicConfig(
     format="%(asctime)s %(levelname)s %(message)s",
 )
 
+def _uploaded_files(workspace: Workspace) -> list[Path]:
+    """Archivos subidos al espacio de trabajo, ignorando los temporales de subidas en curso."""
+    return [f for f in workspace.uploads_dir.iterdir() if f.is_file() and not f.name.startswith(".")]
+
 @router.get("/documents/list", response_class=JSONResponse)
-async def get_documents_list() -> list[str]:
-    """Return the list of uploaded documents, excluyendo el funcional generado."""
-    files = [f.name for f in UPLOAD_DIR.iterdir() if f.is_file() and f.name != "funcional_generado.md"]
-    return files
+async def get_documents_list(
+    response: Response,
+    page: int = Query(1, ge=1),
+    page_size: int = Query(100, ge=1, le=MAX_PAGE_SIZE),
+    q: str | None = Query(None),
+    status: str | None = Query(None),
+    mime_type: str | None = Query(None),
+    workspace: Workspace = Depends(current_workspace),
+) -> list[dict]:
+    """Return the list of uploaded documents del espacio de trabajo con el estado de su extracción.
+
+    Consulta el índice de documentos paginado (page, page_size) y filtrado por nombre (q), estado de
+    extracción y tipo MIME. El total de documentos que cumplen el filtro va en la cabecera X-Total-Count.
+    """
+    await asyncio.to_thread(document_registry.ensure_synced, workspace.key, workspace.uploads_dir)
+    docs, total = await asyncio.to_thread(
+        document_registry.list, workspace.key, (page - 1) * page_size, page_size, q, status, mime_type
+    )
+    response.headers["X-Total-Count"] = str(total)
+    return docs
 
 @router.post("/upload")
-async def upload_files(files: List[UploadFile] = File(...)):
-    """Handle file uploads."""
+async def upload_files(files: List[UploadFile] = File(...), workspace: Workspace = Depends(current_workspace)):
+    """Handle file uploads en streaming, sin cargar cada archivo completo en memoria."""
     saved = []
     for file in files:
-        dest = UPLOAD_DIR / file.filename
-        with dest.open("wb") as f:
-            f.write(await file.read())
-        saved.append(file.filename)
+        filename = Path(file.filename or "").name
+        if not filename or filename.startswith("."):
+            raise HTTPException(status_code=400, detail="Nombre de archivo no válido.")
+        dest = workspace.uploads_dir / filename
+        # Si se reemplaza un archivo, su texto extraído deja de ser válido
+        extraction_cache.invalidate(dest)
+        try:
+            stored = await save_upload_stream(file, dest)
+        except UploadTooLargeError as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        finally:
+            await file.close()
+        extraction_cache.record_digest(dest, stored.sha256)
+        await asyncio.to_thread(
+            document_registry.record_upload, workspace.key, filename, stored.size, stored.sha256,
+            guess_mime_type(filename, file.content_type), STATUS_PENDING,
+        )
+        extraction_jobs.submit(dest, digest=stored.sha256, workspace=workspace.key)
+        saved.append(filename)
     return {"uploaded": saved}
 
 @router.get("/documents")
@@ -55,307 +105,286 @@ def documents_page(request: Request):
     return templates.TemplateResponse("documents/list.html", {"request": request})
 
 @router.delete("/documents/{filename}", response_class=JSONResponse)
-def delete_document(filename: str):
+def delete_document(filename: str, workspace: Workspace = Depends(current_workspace)):
     """Delete a document by filename."""
-    file_path = UPLOAD_DIR / filename
+    file_path = workspace.uploads_dir / filename
     if file_path.exists() and file_path.is_file():
+        extraction_jobs.forget(file_path)
+        extraction_cache.invalidate(file_path)
         file_path.unlink()
+        document_registry.remove(workspace.key, filename)
         return {"deleted": filename}
     raise HTTPException(status_code=404, detail="Documento no encontrado")
 
-@router.post("/documents/generate-funcional", response_class=JSONResponse)
-async def generate_funcional(background_tasks: BackgroundTasks):
-    """Genera un análisis funcional a partir de los documentos subidos, lo devuelve en memoria y lo guarda en un archivo interno."""
-    files = [str(f) for f in UPLOAD_DIR.iterdir() if f.is_file()]
+@router.get("/documents/extraction-cache/stats", response_class=JSONResponse)
+async def extraction_cache_stats() -> dict:
+    """Devuelve los aciertos/fallos y el tamaño de la caché de extracción de texto."""
+    return extraction_cache.stats()
+
+@router.get("/documents/normalization", response_class=JSONResponse)
+async def get_normalization_report(workspace: Workspace = Depends(current_workspace)) -> dict:
+    """Tokens que ahorra la normalización del texto de cada documento del espacio de trabajo."""
+    files = [str(f) for f in _uploaded_files(workspace)]
+    reports = await asyncio.to_thread(normalization_report, files)
+    return {
+        "documents": [report.to_dict() for report in reports],
+        "tokens_before": sum(report.tokens_before for report in reports),
+        "tokens_after": sum(report.tokens_after for report in reports),
+    }
+
+def _version_conflict(e: FuncionalVersionConflict) -> JSONResponse:
+    return JSONResponse(
+        status_code=409,
+        content={"error": "El documento funcional ha cambiado desde que se editó; recárgalo.", "version": e.current},
+    )
+
+class _SectionNotFound(LookupError):
+    pass
+
+@router.get("/documents/plantillas", response_class=JSONResponse)
+async def list_plantillas() -> dict:
+    """Plantillas disponibles para la generación del funcional."""
+    return {"plantillas": plantilla_store.names(), "default": DEFAULT_PLANTILLA}
+
+@router.post("/documents/generate-funcional", response_class=JSONResponse, status_code=202)
+async def generate_funcional(
+    mode: str | None = Query(None, enum=["single", "sections"]),
+    no_cache: bool = Query(False),
+    force_full: bool = Query(False),
+    plantilla: str | None = Query(None),
+    workspace: Workspace = Depends(current_workspace),
+):
+    """Encola la generación del análisis funcional a partir de los documentos subidos y devuelve el id del trabajo.
+
+    Con mode="sections" se lanza una llamada por sección de la plantilla en paralelo; por defecto
+    se usa FUNCIONAL_GENERATION_MODE. Con no_cache=true se ignora la caché de respuestas del modelo.
+    En modo "sections" solo se regeneran las secciones cuya entrada ha cambiado desde la última
+    generación; force_full=true las regenera todas. plantilla selecciona una plantilla con nombre
+    (ver /documents/plantillas). Si ya hay un trabajo en curso sobre los mismos documentos, plantilla
+    y opciones, se devuelve ese trabajo ("deduplicated": true) en lugar de lanzar otra generación.
+    """
+    files = [str(f) for f in _uploaded_files(workspace)]
     if not files:
-        return {"error": "No hay documentos para analizar."}
-    loop = None
+        return JSONResponse(status_code=400, content={"error": "No hay documentos para analizar."})
+    mode = mode or FUNCIONAL_GENERATION_MODE
     try:
-        import asyncio
-        loop = asyncio.get_running_loop()
-    except RuntimeError:
-        pass
-    def sync_generate():
-        try:
-            from app.services.openai_service import generate_funcional_analysis
-            return generate_funcional_analysis(files)
-        except Exception as e:
-            tb = traceback.format_exc()
-            # Loguea el error y el traceback en un fichero
-            logging.error(f"Error generando el análisis funcional: {e}\nTRACEBACK:\n{tb}")
-            return f"[ERROR] {str(e)}\nTRACEBACK:\n{tb}"
-    if loop:
-        analysis = await loop.run_in_executor(None, sync_generate)
-    else:
-        analysis = sync_generate()
-    if analysis.startswith("[ERROR]"):
-        return JSONResponse(status_code=500, content={"error": analysis})
-    internal_path = UPLOAD_DIR / "funcional_generado.md"
-    internal_path.write_text(analysis, encoding="utf-8")
-    return {"funcional": analysis}
+        fingerprint = await asyncio.to_thread(generation_fingerprint, files, mode, force_full, plantilla, workspace.key, no_cache)
+    except PlantillaNotFoundError:
+        return JSONResponse(status_code=404, content={"error": f"No existe la plantilla '{plantilla}'."})
+
+    async def run() -> str:
+        # Solo se espera a las extracciones lanzadas al subir que sigan en curso
+        await extraction_jobs.wait_for(files)
+        if mode == "sections":
+            analysis = await generate_funcional_analysis_by_sections(
+                files, use_cache=not no_cache, force_full=force_full, plantilla=plantilla, manifest=workspace.manifest
+            )
+        else:
+            analysis = await generate_funcional_analysis(files, use_cache=not no_cache, plantilla=plantilla)
+        if not analysis.startswith("[ERROR]"):
+            await funcional_writer.save(workspace.key, analysis, SOURCE_GENERATE)
+        return analysis
+
+    job, deduplicated = generation_jobs.submit(fingerprint, mode, run, workspace=workspace.key)
+    return {**job.to_dict(), "deduplicated": deduplicated}
+
+def _get_job(job_id: str, workspace: Workspace) -> GenerationJob:
+    job = generation_jobs.get(job_id)
+    # Los trabajos de otros espacios de trabajo no son visibles
+    if job is None or job.workspace != workspace.key:
+        raise HTTPException(status_code=404, detail="Trabajo de generación no encontrado.")
+    return job
+
+@router.get("/documents/generate-funcional/jobs/{job_id}", response_class=JSONResponse)
+async def generation_job_status(job_id: str, workspace: Workspace = Depends(current_workspace)) -> dict:
+    """Estado de un trabajo de generación (queued, running, done, failed o cancelled)."""
+    return _get_job(job_id, workspace).to_dict()
+
+@router.get("/documents/generate-funcional/jobs/{job_id}/result", response_class=JSONResponse)
+async def generation_job_result(job_id: str, workspace: Workspace = Depends(current_workspace)):
+    """Documento generado por el trabajo; 409 si aún no ha terminado y 500 si ha fallado."""
+    job = _get_job(job_id, workspace)
+    if job.status == JOB_DONE:
+        return {"funcional": job.result}
+    if job.status == JOB_FAILED:
+        return JSONResponse(status_code=500, content={"error": job.error})
+    return JSONResponse(status_code=409, content={"error": f"El trabajo está en estado '{job.status}'.", "status": job.status})
+
+@router.delete("/documents/generate-funcional/jobs/{job_id}", response_class=JSONResponse)
+async def cancel_generation_job(job_id: str, workspace: Workspace = Depends(current_workspace)) -> dict:
+    """Cancela un trabajo de generación pendiente o en curso."""
+    job = generation_jobs.cancel(_get_job(job_id, workspace).id)
+    return job.to_dict()
+
+@router.post("/documents/generate-funcional/stream")
+async def generate_funcional_stream(
+    mode: str | None = Query(None, enum=["single", "sections"]),
+    no_cache: bool = Query(False),
+    force_full: bool = Query(False),
+    plantilla: str | None = Query(None),
+    workspace: Workspace = Depends(current_workspace),
+):
+    """Genera el análisis funcional relayando el texto como Server-Sent Events mientras el modelo lo produce.
+
+    Emite eventos status, token, section (sección terminada), done (documento final) y error.
+    Al terminar, el documento validado se guarda como nueva versión del funcional del espacio de trabajo.
+    """
+    files = [str(f) for f in _uploaded_files(workspace)]
+    if not files:
+        return JSONResponse(status_code=400, content={"error": "No hay documentos para analizar."})
+    try:
+        get_plantilla(plantilla)
+    except PlantillaNotFoundError:
+        return JSONResponse(status_code=404, content={"error": f"No existe la plantilla '{plantilla}'."})
+
+    async def events():
+        yield sse_event({"status": "extracting"}, event="status")
+        await extraction_jobs.wait_for(files)
+        yield sse_event({"status": "generating"}, event="status")
+        async for event in stream_funcional_analysis(
+            files, mode or FUNCIONAL_GENERATION_MODE, use_cache=not no_cache, force_full=force_full,
+            plantilla=plantilla, manifest=workspace.manifest,
+        ):
+            name = event.pop("event")
+            event.pop("index", None)
+            if name == "done":
+                event["version"] = (await funcional_writer.save(workspace.key, event["funcional"], SOURCE_STREAM)).version
+            yield sse_event(event, event=name)
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers=SSE_HEADERS)
 
 @router.post("/documents/update-funcional", response_class=JSONResponse)
-async def update_funcional(data: dict = Body(...)) -> dict:
-    """Actualiza el documento funcional en memoria y en el archivo funcional_generado.md."""
-    content = data.get("content", "")
-    internal_path = UPLOAD_DIR / "funcional_generado.md"
-    internal_path.write_text(content, encoding="utf-8")
-    return {"ok": True}
+async def update_funcional(data: FuncionalUpdate = Body(...), workspace: Workspace = Depends(current_workspace)):
+    """Guarda el contenido editado del documento funcional del espacio de trabajo.
 
-@router.get("/documents/export-funcional")
-async def export_funcional(format: str = Query("docx", enum=["docx", "pdf"])):
-    """Exporta el documento funcional a Word o PDF con formato interpretado desde Markdown."""
-    internal_path = UPLOAD_DIR / "funcional_generado.md"
-    if not internal_path.exists():
-        return JSONResponse(status_code=404, content={"error": "No existe el documento funcional generado."})
-    content = internal_path.read_text(encoding="utf-8")
-    if format == "docx":
-        import markdown
-        from bs4 import BeautifulSoup
-        from docx import Document as DocxDocument
-        import tempfile
-        html = markdown.markdown(content)
-        soup = BeautifulSoup(html, "html.parser")
-        doc = DocxDocument()
-        # --- Insertar solo la Tabla de Contenido nativa de Word (TOC) ---
-        from docx.oxml import OxmlElement
-        from docx.oxml.ns import qn
-        p = doc.add_paragraph()
-        run = p.add_run()
-        fldChar1 = OxmlElement('w:fldChar')
-        fldChar1.set(qn('w:fldCharType'), 'begin')
-        instrText = OxmlElement('w:instrText')
-        instrText.text = r'TOC \o "1-3" \h \z \u'
-        fldChar2 = OxmlElement('w:fldChar')
-        fldChar2.set(qn('w:fldCharType'), 'end')
-        r_element = run._r
-        r_element.append(fldChar1)
-        r_element.append(instrText)
-        r_element.append(fldChar2)
-        doc.add_paragraph("")  # Espacio tras el TOC
-        # --- Insertar el resto del documento ---
-        for el in soup.children:
-            if el.name and el.name.startswith('h') and el.name[1:].isdigit():
-                level = int(el.name[1:])
-                doc.add_heading(el.get_text(), level=level if level <= 4 else 4)
-            elif el.name == 'ul':
-                for li in el.find_all('li', recursive=False):
-                    p = doc.add_paragraph(li.get_text(), style='List Bullet')
-            elif el.name == 'ol':
-                for li in el.find_all('li', recursive=False):
-                    p = doc.add_paragraph(li.get_text(), style='List Number')
-            elif el.name == 'p':
-                p = doc.add_paragraph(el.get_text())
-            elif el.name == 'strong':
-                p = doc.add_paragraph()
-                run = p.add_run(el.get_text())
-                run.bold = True
-            elif el.name == 'em':
-                p = doc.add_paragraph()
-                run = p.add_run(el.get_text())
-                run.italic = True
-            # Puedes agregar más reglas para otros elementos si lo necesitas
-        # No se añade ningún índice textual ni contenido relacionado con el árbol de contenido al final
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".docx") as tmp:
-            doc.save(tmp.name)
-            tmp.flush()
-            return FileResponse(tmp.name, filename="funcional_generado.docx", media_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document")
-    elif format == "pdf":
+    La edición se agrupa con las siguientes en el buffer de escritura diferida. Con base_version,
+    responde 409 si el documento ya no está en esa versión.
+    """
+    try:
         try:
-            import tempfile
-            import re
-            class PDF(FPDF):
-                def header(self):
-                    self.set_font('Arial', 'B', 14)
-                    self.set_text_color(30, 64, 175)
-                    self.cell(0, 10, 'Documento Funcional', ln=True, align='C')
-                    self.ln(4)
-            pdf = PDF()
-            pdf.add_page()
-            pdf.set_auto_page_break(auto=True, margin=15)
-            pdf.set_font('Arial', '', 12)
-            bullet = '-'  # O '*'
-            lines = content.split('\n')
-
-            MAX_CHARS_PER_LINE = 120
-
-            def force_fit_line(line: str, pdf: FPDF, max_width: float) -> list[str]:
-                """
-                Divide la línea en fragmentos que nunca exceden el ancho de la celda.
-                Si una palabra es demasiado larga, la trocea carácter a carácter.
-                Si ni un solo carácter imprimible cabe, pone '?'.
-                """
-                safe_chunks = []
-                current = ''
-                widest = max((pdf.get_string_width(chr(c)) for c in range(32, 127)), default=1)
-                if max_width < widest or max_width < 1:
-                    return ['?']
-                for word in line.split(' '):
-                    while word:
-                        if pdf.get_string_width(word) <= max_width:
-                            if current:
-                                test = current + ' ' + word
-                            else:
-                                test = word
-                            if pdf.get_string_width(test) <= max_width:
-                                current = test
-                                word = ''
-                            else:
-                                if current:
-                                    safe_chunks.append(current)
-                                    current = ''
-                                else:
-                                    i = 1
-                                    while i <= len(word):
-                                        if pdf.get_string_width(word[:i]) > max_width:
-                                            if i == 1:
-                                                safe_chunks.append('?')
-                                                word = word[1:]
-                                            else:
-                                                safe_chunks.append(word[:i-1])
-                                                word = word[i-1:]
-                                            break
-                                        i += 1
-                                    else:
-                                        safe_chunks.append(word)
-                                        word = ''
-                        else:
-                            i = 1
-                            while i <= len(word):
-                                if pdf.get_string_width(word[:i]) > max_width:
-                                    if i == 1:
-                                        safe_chunks.append('?')
-                                        word = word[1:]
-                                    else:
-                                        safe_chunks.append(word[:i-1])
-                                        word = word[i-1:]
-                                    break
-                                i += 1
-                            else:
-                                safe_chunks.append(word)
-                                word = ''
-                if current:
-                    safe_chunks.append(current)
-                return safe_chunks
-
-            def split_long_line(line: str, max_chars: int) -> list[str]:
-                """
-                Divide una línea en sublíneas de máximo max_chars caracteres.
-                """
-                return [line[i:i+max_chars] for i in range(0, len(line), max_chars)]
-
-            for line in lines:
-                line = line.rstrip('\r').strip()
-                if not line:
-                    pdf.ln(4)
-                    continue
-                # Reemplaza cualquier tabulación por espacio
-                line = line.replace('\t', ' ')
-                # Reemplaza cualquier carácter no imprimible por espacio
-                line = ''.join(c if 32 <= ord(c) <= 126 else ' ' for c in line)
-                max_width = pdf.w - pdf.l_margin - pdf.r_margin
-                # Limita la longitud de la línea antes de procesar
-                sublines = split_long_line(line, MAX_CHARS_PER_LINE)
-                for subline in sublines:
-                    # Encabezados
-                    m = re.match(r'^(#+)\s*(.*)', subline)
-                    if m:
-                        level = len(m.group(1))
-                        text = m.group(2)
-                        if level == 1:
-                            pdf.set_font('Arial', 'B', 16)
-                            pdf.set_text_color(30, 64, 175)
-                            for chunk in force_fit_line(text, pdf, max_width):
-                                if not chunk.strip() or pdf.get_string_width(chunk) > max_width:
-                                    chunk = '?'
-                                pdf.multi_cell(max_width, 10, chunk)
-                            pdf.set_font('Arial', '', 12)
-                            pdf.set_text_color(34, 34, 34)
-                        elif level == 2:
-                            pdf.set_font('Arial', 'B', 14)
-                            pdf.set_text_color(30, 64, 175)
-                            for chunk in force_fit_line(text, pdf, max_width):
-                                if not chunk.strip() or pdf.get_string_width(chunk) > max_width:
-                                    chunk = '?'
-                                pdf.multi_cell(max_width, 8, chunk)
-                            pdf.set_font('Arial', '', 12)
-                            pdf.set_text_color(34, 34, 34)
-                        elif level == 3:
-                            pdf.set_font('Arial', 'B', 12)
-                            pdf.set_text_color(30, 64, 175)
-                            for chunk in force_fit_line(text, pdf, max_width):
-                                if not chunk.strip() or pdf.get_string_width(chunk) > max_width:
-                                    chunk = '?'
-                                pdf.multi_cell(max_width, 7, chunk)
-                            pdf.set_font('Arial', '', 12)
-                            pdf.set_text_color(34, 34, 34)
-                        else:
-                            pdf.set_font('Arial', 'B', 11)
-                            pdf.set_text_color(30, 64, 175)
-                            for chunk in force_fit_line(text, pdf, max_width):
-                                if not chunk.strip() or pdf.get_string_width(chunk) > max_width:
-                                    chunk = '?'
-                                pdf.multi_cell(max_width, 6, chunk)
-                            pdf.set_font('Arial', '', 12)
-                            pdf.set_text_color(34, 34, 34)
-                        continue
-                    # Listas
-                    if subline.startswith('- '):
-                        pdf.set_x(pdf.get_x() + 5)
-                        for chunk in force_fit_line(f'{bullet} ' + subline[2:], pdf, max_width - 5):
-                            if not chunk.strip() or pdf.get_string_width(chunk) > max_width - 5:
-                                chunk = '?'
-                            pdf.multi_cell(max_width - 5, 7, chunk)
-                        continue
-                    # Negrita
-                    bold = re.match(r'^\*\*(.+)\*\*$', subline)
-                    if bold:
-                        pdf.set_font('Arial', 'B', 12)
-                        for chunk in force_fit_line(bold.group(1), pdf, max_width):
-                            if not chunk.strip() or pdf.get_string_width(chunk) > max_width:
-                                chunk = '?'
-                            pdf.multi_cell(max_width, 7, chunk)
-                        pdf.set_font('Arial', '', 12)
-                        continue
-                    # Cursiva
-                    italic = re.match(r'^\*(.+)\*$', subline)
-                    if italic:
-                        pdf.set_font('Arial', 'I', 12)
-                        for chunk in force_fit_line(italic.group(1), pdf, max_width):
-                            if not chunk.strip() or pdf.get_string_width(chunk) > max_width:
-                                chunk = '?'
-                            pdf.multi_cell(max_width, 7, chunk)
-                        pdf.set_font('Arial', '', 12)
-                        continue
-                    # Texto normal
-                    for chunk in force_fit_line(subline, pdf, max_width):
-                        if not chunk.strip() or pdf.get_string_width(chunk) > max_width:
-                            chunk = '?'
-                        pdf.multi_cell(max_width, 7, chunk)
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-                pdf.output(tmp.name)
-                tmp.flush()
-                return FileResponse(tmp.name, filename="funcional_generado.pdf", media_type="application/pdf")
-        except Exception as e:
-            import traceback
-            logging.error(f"Error exportando a PDF: {e}\nTRACEBACK:\n{traceback.format_exc()}")
-            return JSONResponse(status_code=500, content={"error": f"Error exportando a PDF: {str(e)}"})
-    return JSONResponse(status_code=400, content={"error": "Formato no soportado."})
+            document = await funcional_writer.edit(workspace.key, lambda _: data.content, data.base_version)
+        except FuncionalNotFoundError:
+            document = await funcional_writer.save(workspace.key, data.content, SOURCE_EDIT, data.base_version)
+    except FuncionalVersionConflict as e:
+        return _version_conflict(e)
+    return {"ok": True, "version": document.version}
+
+@router.get("/documents/funcional", response_class=JSONResponse)
+async def get_funcional(workspace: Workspace = Depends(current_workspace)):
+    """Versión actual del documento funcional del espacio de trabajo (incluidas las ediciones sin escribir)."""
+    try:
+        document = await funcional_writer.current(workspace.key)
+    except FuncionalVersionConflict as e:
+        return _version_conflict(e)
+    if document is None:
+        return JSONResponse(status_code=404, content={"error": "No existe el documento funcional generado."})
+    return document.to_dict()
+
+@router.get("/documents/funcional/sections/{section_id}", response_class=JSONResponse)
+async def get_funcional_section(section_id: str, workspace: Workspace = Depends(current_workspace)):
+    """Sección del documento funcional (por número o título) con sus subsecciones y la versión del documento."""
+    try:
+        document = await funcional_writer.current(workspace.key)
+    except FuncionalVersionConflict as e:
+        return _version_conflict(e)
+    if document is None:
+        return JSONResponse(status_code=404, content={"error": "No existe el documento funcional generado."})
+    index = MarkdownIndex(document.content)
+    i = index.find(section_id)
+    if i is None:
+        return JSONResponse(status_code=404, content={"error": f"No existe la sección '{section_id}'."})
+    section = index.sections[i]
+    return {"section": section.title, "content": section.subtree_text(document.content), "version": document.version}
+
+@router.patch("/documents/funcional/sections/{section_id}", response_class=JSONResponse)
+async def patch_funcional_section(
+    section_id: str,
+    data: SectionUpdate = Body(...),
+    workspace: Workspace = Depends(current_workspace),
+):
+    """Sustituye una sección (con sus subsecciones) del documento funcional.
+
+    Solo se reescribe el rango de la sección, localizado con el índice de encabezados. La edición
+    se agrupa en el buffer de escritura diferida; 409 si base_version ya no es la versión actual.
+    """
+    new_sections = MarkdownIndex(data.content).sections
+    if not new_sections or new_sections[0].start != 0:
+        return JSONResponse(status_code=400, content={"error": "El contenido debe empezar por el encabezado de la sección."})
+
+    def replace(markdown: str) -> str:
+        index = MarkdownIndex(markdown)
+        i = index.find(section_id)
+        if i is None:
+            raise _SectionNotFound(section_id)
+        return index.replace_subtree(i, data.content)
+
+    try:
+        document = await funcional_writer.edit(workspace.key, replace, data.base_version)
+    except FuncionalNotFoundError:
+        return JSONResponse(status_code=404, content={"error": "No existe el documento funcional generado."})
+    except _SectionNotFound:
+        return JSONResponse(status_code=404, content={"error": f"No existe la sección '{section_id}'."})
+    except FuncionalVersionConflict as e:
+        return _version_conflict(e)
+    return {"ok": True, "section": new_sections[0].title, "version": document.version}
+
+@router.get("/documents/funcional/versions", response_class=JSONResponse)
+async def list_funcional_versions(workspace: Workspace = Depends(current_workspace)) -> list[dict]:
+    """Versiones conservadas del documento funcional (sin contenido), de la más reciente a la más antigua."""
+    await funcional_writer.flush(workspace.key)
+    return await asyncio.to_thread(funcional_store.versions, workspace.key)
+
+@router.get("/documents/funcional/versions/{version}", response_class=JSONResponse)
+async def get_funcional_version(version: int, workspace: Workspace = Depends(current_workspace)):
+    """Contenido de una versión concreta del documento funcional."""
+    await funcional_writer.flush(workspace.key)
+    document = await asyncio.to_thread(funcional_store.get, workspace.key, version)
+    if document is None:
+        return JSONResponse(status_code=404, content={"error": f"No existe la versión {version} del documento funcional."})
+    return document.to_dict()
+
+async def _export_response(request: Request, format: str, workspace: Workspace):
+    """Sirve la exportación desde la caché de exportaciones, con ETag/Last-Modified y 304 si no ha cambiado."""
+    # Se exporta lo último editado
+    await funcional_writer.flush(workspace.key)
+    head = await asyncio.to_thread(funcional_store.current, workspace.key, False)
+    if head is None:
+        return JSONResponse(status_code=404, content={"error": "No existe el documento funcional generado."})
+    headers = validator_headers(export_etag(head.sha256, format), head.timestamp)
+    # El ETag depende solo del contenido: el 304 se responde sin leer el documento ni renderizar nada
+    if is_not_modified(request.headers, headers["ETag"], head.timestamp):
+        metrics.export_requests.inc(format=format, result="not_modified")
+        return not_modified_response(headers)
+    document = await asyncio.to_thread(funcional_store.get, workspace.key, head.version)
+    if document is None:
+        # La versión se ha descartado entretanto: se sirve la actual
+        document = await asyncio.to_thread(funcional_store.current, workspace.key)
+        headers = validator_headers(export_etag(document.sha256, format), document.timestamp)
+    export_format = EXPORT_FORMATS[format]
+    try:
+        artifact = await export_artifacts.get(document.content, format, document.sha256)
+    except Exception as e:
+        metrics.export_requests.inc(format=format, result="error")
+        logging.error(f"Error exportando a {export_format.label}: {e}\nTRACEBACK:\n{traceback.format_exc()}")
+        return JSONResponse(status_code=500, content={"error": f"Error exportando a {export_format.label}: {str(e)}"})
+    metrics.export_requests.inc(format=format, result="ok")
+    return download_response(io.BytesIO(artifact.data), export_format.filename, export_format.media_type, headers)
+
+@router.get("/documents/export-funcional")
+async def export_funcional(
+    request: Request,
+    format: str = Query("docx", enum=["docx", "pdf"]),
+    workspace: Workspace = Depends(current_workspace),
+):
+    """Exporta el documento funcional a Word o PDF con formato interpretado desde Markdown.
+
+    Cada versión del documento se renderiza una sola vez (normalmente en segundo plano al guardarla).
+    """
+    if format not in ("docx", "pdf"):
+        return JSONResponse(status_code=400, content={"error": "Formato no soportado."})
+    return await _export_response(request, format, workspace)
 
 @router.get("/documents/export-funcional-pdf-unrestricted")
-async def export_funcional_pdf_unrestricted():
+async def export_funcional_pdf_unrestricted(request: Request, workspace: Workspace = Depends(current_workspace)):
     """Exporta el documento funcional a PDF sin restricciones de formato."""
-    internal_path = UPLOAD_DIR / "funcional_generado.md"
-    if not internal_path.exists():
-        return JSONResponse(status_code=404, content={"error": "No existe el documento funcional generado."})
-    content = internal_path.read_text(encoding="utf-8")
-    import markdown
-    import pdfkit
-    import tempfile
-    # Convierte Markdown a HTML sin aplicar estilos ni restricciones
-    html = markdown.markdown(content)
-    html_doc = f"<html><body>{html}</body></html>"
-    with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp:
-        pdfkit.from_string(html_doc, tmp.name)
-        tmp.flush()
-        return FileResponse(tmp.name, filename="funcional_generado_unrestricted.pdf", media_type="application/pdf")
+    return await _export_response(request, "pdf-unrestricted", workspace)
@@ -0,0 +1,98 @@
+"""
+Endpoint /metrics (formato de texto de Prometheus) y middleware de latencia por ruta.
+
+Con METRICS_TIMING_HEADERS=1 cada respuesta incluye la cabecera Server-Timing con
+el tiempo total de la petición y el de sus etapas medidas (extracción, llamadas
+al modelo, post-proceso, exportación), visible en las herramientas de desarrollo
+del navegador.
+"""
+import os
+import time
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.services import metrics
+from app.services.export_cache import export_artifacts
+from app.services.llm_cache import llm_cache
+from app.services.llm_gateway import llm_gateway
+
+METRICS_TIMING_HEADERS = os.getenv("METRICS_TIMING_HEADERS", "0") == "1"
+
+router = APIRouter()
+
+metrics.registry.gauge(
+    "llm_cache_memory_entries", "Respuestas del modelo en la caché en memoria.", lambda: llm_cache.stats()["memory_entries"]
+)
+metrics.registry.gauge(
+    "llm_cache_disk_bytes", "Tamaño de la caché en disco de respuestas del modelo.", lambda: llm_cache.stats()["disk_bytes"] or 0
+)
+metrics.registry.gauge(
+    "llm_gateway_concurrency_limit", "Límite actual (AIMD) de llamadas al modelo en curso.", lambda: int(llm_gateway.limit)
+)
+metrics.registry.gauge("llm_gateway_in_flight", "Llamadas al modelo en curso.", lambda: llm_gateway.in_flight)
+metrics.registry.gauge("llm_gateway_queued", "Llamadas al modelo esperando plaza o cuota.", lambda: llm_gateway.queued)
+metrics.registry.gauge("export_cache_entries", "Exportaciones renderizadas en memoria.", lambda: len(export_artifacts))
+
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def metrics_endpoint() -> PlainTextResponse:
+    """Métricas de este proceso en formato de exposición de Prometheus."""
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def _server_timing(timings: dict[str, float], total: float) -> bytes:
+    parts = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items()]
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts).encode("latin-1")
+
+
+class MetricsMiddleware:
+    """Middleware ASGI: histograma de latencia por ruta (plantilla de la ruta, no la URL) y Server-Timing.
+
+    La latencia se mide hasta el último fragmento del cuerpo, también en las respuestas en
+    streaming; Server-Timing recoge lo medido hasta el envío de las cabeceras.
+    """
+
+    def __init__(self, app, timing_headers: bool = METRICS_TIMING_HEADERS):
+        self.app = app
+        self.timing_headers = timing_headers
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        timings: dict[str, float] = {}
+        token = metrics.request_timings.set(timings)
+        status = 500
+        observed = False
+
+        def observe() -> None:
+            nonlocal observed
+            if observed:
+                return
+            observed = True
+            # Las URLs sin ruta asociada se agrupan para no crear una serie por cada ruta inexistente
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            metrics.http_request_duration.observe(
+                time.perf_counter() - start, method=scope["method"], route=route, status=status
+            )
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.timing_headers:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", _server_timing(timings, time.perf_counter() - start)))
+                    message = {**message, "headers": headers}
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                observe()
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            observe()
+            metrics.request_timings.reset(token)
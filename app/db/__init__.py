@@ -1,3 +1,3 @@
 """
-Archivo limpio: sin SQLAlchemy ni async session. Solo para futuras utilidades si se requieren.
+Persistencia de metadatos de la aplicación con SQLAlchemy (ver database.py y models.py).
 """
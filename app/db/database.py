@@ -0,0 +1,64 @@
+"""
+Motor SQLAlchemy de la aplicación (SQLite por defecto).
+
+La base de datos guarda los metadatos de los documentos subidos y las versiones
+del documento funcional de cada espacio de trabajo; los ficheros subidos siguen
+en disco. Las tablas se crean al arrancar con init_db().
+
+El motor usa un pool de conexiones acotado (DB_POOL_SIZE + DB_MAX_OVERFLOW) y,
+con SQLite, modo WAL y busy_timeout para que varios workers de uvicorn lean y
+escriban la misma base de datos a la vez.
+"""
+import os
+from pathlib import Path
+
+from sqlalchemy import create_engine, event, inspect
+from sqlalchemy.orm import DeclarativeBase, sessionmaker
+
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///.cache/metasketch.db")
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+# Espera máxima de SQLite por el bloqueo de escritura de otro proceso
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", 5000))
+
+
+class Base(DeclarativeBase):
+    """Base declarativa de los modelos de la aplicación."""
+
+
+def _create_engine(url: str):
+    pool = {"pool_size": DB_POOL_SIZE, "max_overflow": DB_MAX_OVERFLOW, "pool_pre_ping": True}
+    if not url.startswith("sqlite"):
+        return create_engine(url, **pool)
+    database = url.split("///", 1)[-1]
+    if not database or database == ":memory:":
+        return create_engine(url, connect_args={"check_same_thread": False})
+    Path(database).parent.mkdir(parents=True, exist_ok=True)
+    # Las sesiones se usan desde hilos (asyncio.to_thread) y callbacks de los pools de trabajo
+    engine = create_engine(url, connect_args={"check_same_thread": False}, **pool)
+
+    @event.listens_for(engine, "connect")
+    def _sqlite_pragmas(dbapi_connection, _):
+        cursor = dbapi_connection.cursor()
+        # WAL: las lecturas del listado no se bloquean mientras se registra una subida
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT_MS}")
+        cursor.close()
+
+    return engine
+
+
+engine = _create_engine(DATABASE_URL)
+SessionLocal = sessionmaker(bind=engine, expire_on_commit=False)
+
+
+def init_db() -> None:
+    """Crea las tablas que falten."""
+    from app.db import models
+    # La tabla de documentos se reconstruye desde disco al arrancar: si es de antes de los
+    # espacios de trabajo se descarta en lugar de migrarla
+    inspector = inspect(engine)
+    if inspector.has_table("documents") and "workspace" not in {c["name"] for c in inspector.get_columns("documents")}:
+        models.DocumentRecord.__table__.drop(engine)
+    Base.metadata.create_all(engine)
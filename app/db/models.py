@@ -0,0 +1,55 @@
+"""
+Modelos SQLAlchemy.
+
+Todas las tablas están particionadas por espacio de trabajo ("<usuario>/<proyecto>").
+"""
+from datetime import datetime
+
+from sqlalchemy import DateTime, Integer, String, Text, UniqueConstraint
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.db.database import Base
+
+
+class DocumentRecord(Base):
+    """Metadatos de un documento subido (el fichero está en el directorio de subidas del espacio de trabajo)."""
+
+    __tablename__ = "documents"
+    __table_args__ = (UniqueConstraint("workspace", "filename"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    workspace: Mapped[str] = mapped_column(String(160), index=True)
+    filename: Mapped[str] = mapped_column(String(255))
+    size: Mapped[int] = mapped_column(Integer)
+    sha256: Mapped[str | None] = mapped_column(String(64))
+    mime_type: Mapped[str | None] = mapped_column(String(127))
+    uploaded_at: Mapped[datetime] = mapped_column(DateTime, index=True)
+    extraction_status: Mapped[str | None] = mapped_column(String(16), index=True)
+    extraction_error: Mapped[str | None] = mapped_column(Text)
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.filename,
+            "size": self.size,
+            "sha256": self.sha256,
+            "mime_type": self.mime_type,
+            "uploaded_at": self.uploaded_at.isoformat(),
+            "status": self.extraction_status,
+            "error": self.extraction_error,
+        }
+
+
+class FuncionalVersion(Base):
+    """Versión guardada del documento funcional de un espacio de trabajo."""
+
+    __tablename__ = "funcional_versions"
+    __table_args__ = (UniqueConstraint("workspace", "version"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    workspace: Mapped[str] = mapped_column(String(160), index=True)
+    version: Mapped[int] = mapped_column(Integer)
+    content: Mapped[str] = mapped_column(Text)
+    sha256: Mapped[str] = mapped_column(String(64))
+    # generate (trabajo de generación), stream (generación en streaming) o edit (edición del usuario)
+    source: Mapped[str] = mapped_column(String(16))
+    created_at: Mapped[datetime] = mapped_column(DateTime)
@@ -1,6 +1,9 @@
 """
 Main FastAPI app for Metasketch prototype.
 """
+import asyncio
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI, Request
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
@@ -8,8 +11,58 @@ from fastapi.templating import Jinja2Templates
 from fastapi.responses import HTMLResponse, RedirectResponse
 from app.api import documents, content_tree, markdown_editor, chatbot
 from app.api.auth import router as auth_router
+from app.api.metrics import MetricsMiddleware, router as metrics_router
+from app.db.database import init_db
+from app.services.document_registry import document_registry
+from app.services.extraction_jobs import STATUS_PENDING, extraction_jobs
+from app.services.funcional_writer import funcional_writer
+from app.services.generation_jobs import generation_jobs
+from app.services.llm_client import close_llm_client
+from app.services.upload_storage import UploadSizeLimitMiddleware
+from app.services.warmup import STARTUP_WARMUP, warm_up
+from app.services.worker_lock import worker_lock
+from app.services.workspaces import Workspace, list_projects
+from app.utils.sessions import SESSION_COOKIE, read_session
+
+
+async def _requeue_pending_extractions() -> None:
+    """Vuelve a encolar las extracciones que quedaron pendientes al parar el proceso anterior.
+
+    Con un solo worker (ver app/services/worker_lock.py), al arrancar ninguna está en curso.
+    """
+    for key, filename in await asyncio.to_thread(document_registry.with_extraction_status, STATUS_PENDING):
+        path = Workspace(*key.split("/", 1)).uploads_dir / filename
+        if path.is_file():
+            extraction_jobs.submit(path, workspace=key)
+        else:
+            await asyncio.to_thread(document_registry.remove, key, filename)
+
 
-app = FastAPI(title="Metasketch Prototype")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Arranque y parada ordenada de los recursos compartidos de la aplicación."""
+    # Los trabajos y el buffer del funcional están en memoria: un solo worker por directorio de datos
+    worker_lock.acquire()
+    init_db()
+    # La conciliación del índice con los directorios se hace en la primera consulta de cada espacio de trabajo
+    await _requeue_pending_extractions()
+    # El cliente del modelo se crea en la primera llamada, salvo con precarga (app/services/warmup.py)
+    warmup_task = None
+    if STARTUP_WARMUP == "blocking":
+        await warm_up()
+    elif STARTUP_WARMUP == "background":
+        warmup_task = asyncio.create_task(warm_up())
+    yield
+    if warmup_task is not None:
+        await warmup_task
+    await generation_jobs.shutdown()
+    await funcional_writer.shutdown()
+    await close_llm_client()
+    extraction_jobs.shutdown()
+    worker_lock.release()
+
+
+app = FastAPI(title="Metasketch Prototype", lifespan=lifespan)
 
 # Static files (uploads, etc.)
 app.mount("/static", StaticFiles(directory="static"), name="static")
@@ -23,6 +76,7 @@ app.include_router(content_tree.router, prefix="/api")
 app.include_router(markdown_editor.router, prefix="/api")
 app.include_router(chatbot.router, prefix="/api")
 app.include_router(auth_router, prefix="/api")
+app.include_router(metrics_router)
 
 # CORS (for local dev)
 app.add_middleware(
@@ -33,15 +87,22 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Latencia por ruta y cabecera Server-Timing (ver app/api/metrics.py)
+app.add_middleware(MetricsMiddleware)
+
+# Rechazo de subidas demasiado grandes antes de recibir el cuerpo (ver app/services/upload_storage.py)
+app.add_middleware(UploadSizeLimitMiddleware, path="/api/upload")
+
 @app.get("/", response_class=HTMLResponse)
 async def root(request: Request):
     """Mostrar pantalla principal solo si el usuario está logueado."""
-    session = request.cookies.get("session")
-    if session != "dummy-session-token":
+    session = read_session(request.cookies.get(SESSION_COOKIE))
+    if session is None:
         return RedirectResponse(url="/login")
+    workspace = Workspace(session.user, session.project)
     return templates.TemplateResponse(
         "index.html",
-        {"request": request, "title": "Home"}
+        {"request": request, "title": "Home", "workspace": workspace, "projects": list_projects(session.user)}
     )
 
 @app.get("/login", response_class=HTMLResponse)
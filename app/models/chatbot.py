@@ -1,10 +1,19 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import Literal, Optional
 
 class ChatRequest(BaseModel):
-    """Modelo para la petición al chatbot."""
+    """Modelo para la petición al chatbot.
+
+    document_ref="funcional" indica que el contexto es el funcional generado guardado en el servidor;
+    section_id limita el contexto a una sección concreta (p. ej. "4.1"). document_content se mantiene
+    por compatibilidad para enviar el documento completo desde el navegador. no_cache fuerza una
+    respuesta nueva del modelo aunque la pregunta ya esté en la caché.
+    """
     message: str
     document_content: Optional[str] = None
+    document_ref: Optional[Literal["funcional"]] = None
+    section_id: Optional[str] = None
+    no_cache: bool = False
 
 class ChatResponse(BaseModel):
     """Modelo para la respuesta del chatbot."""
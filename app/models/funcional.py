@@ -0,0 +1,21 @@
+from pydantic import BaseModel
+from typing import Optional
+
+class SectionUpdate(BaseModel):
+    """Modelo para la actualización de una sección del documento funcional.
+
+    content es el Markdown de la sección con sus subsecciones, empezando por su encabezado.
+    base_version es la versión del documento sobre la que se hizo la edición: si ya no es la
+    actual, la actualización se rechaza con 409 en lugar de pisar cambios ajenos.
+    """
+    content: str
+    base_version: Optional[int] = None
+
+class FuncionalUpdate(BaseModel):
+    """Modelo para guardar el documento funcional completo editado.
+
+    base_version es la versión sobre la que se hizo la edición: si ya no es la actual, el
+    guardado se rechaza con 409.
+    """
+    content: str
+    base_version: Optional[int] = None
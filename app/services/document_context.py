@@ -0,0 +1,127 @@
+"""
+Contexto del documento funcional para el chatbot, resuelto en el servidor.
+
+En lugar de recibir el documento completo en cada mensaje, el chatbot recibe una
+referencia al funcional generado (y opcionalmente un id de sección). El servidor
+mantiene un índice de secciones del documento de cada espacio de trabajo, que solo
+se reconstruye cuando se guarda una versión nueva, y envía al modelo únicamente
+las secciones relevantes.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from app.services.funcional_store import FuncionalStore, funcional_store
+from app.services.retrieval import BM25Index, Chunk
+from app.utils.markdown_sections import MarkdownIndex
+from app.utils.tokens import estimate_tokens
+
+# Presupuesto de tokens del documento funcional en el prompt del chatbot
+CHAT_CONTEXT_TOKENS = int(os.getenv("CHAT_CONTEXT_TOKENS", 3000))
+CHAT_CONTEXT_TOP_K = int(os.getenv("CHAT_CONTEXT_TOP_K", 6))
+# Intervalo mínimo entre comprobaciones de la versión actual en la base de datos; los guardados
+# de este proceso actualizan el índice directamente (update)
+FUNCIONAL_INDEX_RECHECK_SECONDS = float(os.getenv("FUNCIONAL_INDEX_RECHECK_SECONDS", 2))
+# Espacios de trabajo cuyo índice se mantiene en memoria
+FUNCIONAL_INDEX_CACHE_SIZE = int(os.getenv("FUNCIONAL_INDEX_CACHE_SIZE", 32))
+
+
+class FuncionalSectionIndex:
+    """Índice de secciones del funcional de un espacio de trabajo, invalidado por número de versión."""
+
+    def __init__(self, workspace: str, store: FuncionalStore = funcional_store, recheck_seconds: float = FUNCIONAL_INDEX_RECHECK_SECONDS):
+        self.workspace = workspace
+        self.store = store
+        self.recheck_seconds = recheck_seconds
+        self._lock = threading.Lock()
+        self._checked_at: float | None = None
+        self._version: int | None = None
+        self._document = MarkdownIndex("")
+        self._index: BM25Index | None = None
+
+    def _refresh(self) -> bool:
+        """Recarga el índice si hay una versión nueva. Devuelve False si aún no hay documento."""
+        now = time.monotonic()
+        with self._lock:
+            if self._checked_at is not None and now - self._checked_at < self.recheck_seconds:
+                return self._version is not None
+        # Otros workers pueden haber guardado una versión: se comprueba solo el número
+        version = self.store.latest_version(self.workspace)
+        if version is None:
+            with self._lock:
+                self._checked_at, self._version, self._document, self._index = now, None, MarkdownIndex(""), None
+            return False
+        with self._lock:
+            if version == self._version:
+                self._checked_at = now
+                return True
+        document = self.store.current(self.workspace)
+        if document is None:
+            return False
+        self._load(document.content, document.version, now)
+        return True
+
+    def _load(self, markdown: str, version: int, checked_at: float) -> None:
+        document = MarkdownIndex(markdown)
+        chunks = [
+            Chunk(section.title, i, section.text(markdown), estimate_tokens(section.text(markdown)))
+            for i, section in enumerate(document.sections)
+        ]
+        index = BM25Index(chunks)
+        with self._lock:
+            self._checked_at, self._version, self._document, self._index = checked_at, version, document, index
+
+    def update(self, version: int, markdown: str) -> None:
+        """Actualiza el índice con la versión que la aplicación acaba de guardar."""
+        self._load(markdown, version, time.monotonic())
+
+    def outline(self) -> list[dict]:
+        """Árbol de secciones numeradas del documento (vacío si no existe)."""
+        if not self._refresh():
+            return []
+        with self._lock:
+            return self._document.outline()
+
+    def context_for(self, question: str, section_id: str | None = None, token_budget: int = CHAT_CONTEXT_TOKENS) -> str:
+        """Devuelve las secciones del documento relevantes para la pregunta, en orden de documento.
+
+        Si se indica section_id se incluye esa sección con sus subsecciones. Si el documento
+        completo cabe en el presupuesto se devuelve íntegro.
+        """
+        if not self._refresh():
+            return ""
+        with self._lock:
+            document, index = self._document, self._index
+        markdown = document.markdown
+        if section_id:
+            i = document.find(section_id)
+            if i is not None:
+                return document.sections[i].subtree_text(markdown).strip()
+        if estimate_tokens(markdown) <= token_budget or index is None:
+            return markdown
+        chunks = index.select(question, top_k=CHAT_CONTEXT_TOP_K, token_budget=token_budget)
+        return "\n\n".join(chunk.text.strip() for chunk in chunks)
+
+
+class FuncionalIndexes:
+    """Índices de sección por espacio de trabajo (LRU de FUNCIONAL_INDEX_CACHE_SIZE espacios)."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max(1, max_entries)
+        self._lock = threading.Lock()
+        self._indexes: OrderedDict[str, FuncionalSectionIndex] = OrderedDict()
+
+    def get(self, workspace: str) -> FuncionalSectionIndex:
+        with self._lock:
+            index = self._indexes.get(workspace)
+            if index is None:
+                index = self._indexes[workspace] = FuncionalSectionIndex(workspace)
+                while len(self._indexes) > self.max_entries:
+                    self._indexes.popitem(last=False)
+            else:
+                self._indexes.move_to_end(workspace)
+            return index
+
+
+funcional_indexes = FuncionalIndexes(FUNCIONAL_INDEX_CACHE_SIZE)
@@ -0,0 +1,138 @@
+"""
+Índice de metadatos de los documentos subidos en la base de datos.
+
+La subida y el borrado mantienen la tabla sincronizada con el directorio de
+subidas de cada espacio de trabajo, y la cola de extracción registra el estado
+de cada archivo. El listado consulta la tabla paginada y filtrada en lugar de
+recorrer el directorio y hacer un stat por archivo. La primera consulta de cada
+espacio de trabajo en el proceso concilia la tabla con los ficheros existentes
+(p. ej. añadidos o borrados a mano), y al arrancar se vuelven a encolar las
+extracciones que quedaron pendientes al parar el proceso anterior.
+"""
+import mimetypes
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+
+from sqlalchemy import delete, func, select
+
+from app.db.database import SessionLocal
+from app.db.models import DocumentRecord
+from app.services.extraction import file_sha256
+
+MAX_PAGE_SIZE = 1000
+
+
+def guess_mime_type(filename: str, declared: str | None = None) -> str | None:
+    """Tipo MIME declarado por el cliente o, si es genérico, el deducido de la extensión."""
+    if declared and declared != "application/octet-stream":
+        return declared
+    return mimetypes.guess_type(filename)[0] or declared
+
+
+class DocumentRegistry:
+    """Operaciones sobre la tabla de documentos."""
+
+    def __init__(self, session_factory=SessionLocal):
+        self._session_factory = session_factory
+        self._lock = threading.Lock()
+        self._sync_locks: dict[str, threading.Lock] = {}
+        self._synced: set[str] = set()
+
+    def record_upload(self, workspace: str, filename: str, size: int, sha256: str, mime_type: str | None, status: str | None = None) -> None:
+        """Registra (o reemplaza) los metadatos de un archivo recién subido."""
+        with self._session_factory.begin() as session:
+            record = session.scalar(select(DocumentRecord).where(DocumentRecord.workspace == workspace, DocumentRecord.filename == filename))
+            if record is None:
+                record = DocumentRecord(workspace=workspace, filename=filename)
+                session.add(record)
+            record.size = size
+            record.sha256 = sha256
+            record.mime_type = mime_type
+            record.uploaded_at = datetime.now(timezone.utc).replace(tzinfo=None)
+            record.extraction_status = status
+            record.extraction_error = None
+
+    def remove(self, workspace: str, filename: str) -> None:
+        with self._session_factory.begin() as session:
+            session.execute(delete(DocumentRecord).where(DocumentRecord.workspace == workspace, DocumentRecord.filename == filename))
+
+    def set_extraction_status(self, workspace: str, filename: str, status: str | None, error: str | None = None) -> None:
+        """Guarda el estado de la extracción de texto del archivo (si sigue registrado)."""
+        with self._session_factory.begin() as session:
+            record = session.scalar(select(DocumentRecord).where(DocumentRecord.workspace == workspace, DocumentRecord.filename == filename))
+            if record is not None:
+                record.extraction_status = status
+                record.extraction_error = error
+
+    def with_extraction_status(self, status: str) -> list[tuple[str, str]]:
+        """(espacio de trabajo, archivo) de todos los documentos con ese estado de extracción."""
+        with self._session_factory() as session:
+            rows = session.execute(
+                select(DocumentRecord.workspace, DocumentRecord.filename).where(DocumentRecord.extraction_status == status)
+            )
+            return [(workspace, filename) for workspace, filename in rows]
+
+    def list(
+        self,
+        workspace: str,
+        offset: int = 0,
+        limit: int = 100,
+        name: str | None = None,
+        status: str | None = None,
+        mime_type: str | None = None,
+    ) -> tuple[list[dict], int]:
+        """Página de documentos ordenada por nombre y número total de documentos que cumplen el filtro."""
+        query = select(DocumentRecord).where(DocumentRecord.workspace == workspace)
+        if name:
+            escaped = name.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            query = query.where(DocumentRecord.filename.ilike(f"%{escaped}%", escape="\\"))
+        if status:
+            query = query.where(DocumentRecord.extraction_status == status)
+        if mime_type:
+            query = query.where(DocumentRecord.mime_type == mime_type)
+        with self._session_factory() as session:
+            total = session.scalar(select(func.count()).select_from(query.subquery()))
+            records = session.scalars(query.order_by(DocumentRecord.filename).offset(offset).limit(min(limit, MAX_PAGE_SIZE)))
+            return [r.to_dict() for r in records], total
+
+    def sync_directory(self, workspace: str, directory: Path) -> None:
+        """Concilia la tabla con los archivos del directorio: añade los que faltan y quita los que ya no existen."""
+        on_disk = {
+            f.name: f for f in directory.iterdir()
+            if f.is_file() and not f.name.startswith(".")
+        } if directory.is_dir() else {}
+        with self._session_factory.begin() as session:
+            known = set(session.scalars(select(DocumentRecord.filename).where(DocumentRecord.workspace == workspace)))
+            missing = known - on_disk.keys()
+            if missing:
+                session.execute(delete(DocumentRecord).where(DocumentRecord.workspace == workspace, DocumentRecord.filename.in_(missing)))
+            for filename in on_disk.keys() - known:
+                path = on_disk[filename]
+                st = path.stat()
+                session.add(DocumentRecord(
+                    workspace=workspace,
+                    filename=filename,
+                    size=st.st_size,
+                    sha256=file_sha256(path),
+                    mime_type=guess_mime_type(filename),
+                    uploaded_at=datetime.fromtimestamp(st.st_mtime, timezone.utc).replace(tzinfo=None),
+                ))
+
+    def ensure_synced(self, workspace: str, directory: Path) -> None:
+        """Concilia la tabla con el directorio la primera vez que se consulta el espacio de trabajo en este proceso."""
+        with self._lock:
+            if workspace in self._synced:
+                return
+            lock = self._sync_locks.setdefault(workspace, threading.Lock())
+        with lock:
+            with self._lock:
+                if workspace in self._synced:
+                    return
+            self.sync_directory(workspace, directory)
+            with self._lock:
+                self._synced.add(workspace)
+                self._sync_locks.pop(workspace, None)
+
+
+document_registry = DocumentRegistry()
@@ -0,0 +1,114 @@
+"""
+Caché de exportaciones ya renderizadas del documento funcional.
+
+Cada formato se renderiza una sola vez por versión del documento (hash SHA-256
+del Markdown) y se sirve desde memoria mientras el contenido no cambie. Al
+guardar un funcional nuevo se programa el prerenderizado de
+EXPORT_PRERENDER_FORMATS en segundo plano, de modo que la descarga ya está
+lista cuando el usuario la pide. Las peticiones simultáneas sobre el mismo
+documento y formato comparten un único renderizado.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import traceback
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from app.services import metrics
+from app.services.exports import EXPORT_FORMATS
+
+# Artefactos (documento, formato) que se conservan en memoria
+EXPORT_CACHE_MAX_ENTRIES = int(os.getenv("EXPORT_CACHE_MAX_ENTRIES", 8))
+# Formatos que se renderizan en segundo plano al guardar el funcional ("" = ninguno)
+EXPORT_PRERENDER_FORMATS = [f.strip() for f in os.getenv("EXPORT_PRERENDER_FORMATS", "docx,pdf").split(",") if f.strip()]
+
+
+def content_digest(content: str) -> str:
+    """Hash del contenido Markdown que identifica la versión del documento."""
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def export_etag(digest: str, format: str) -> str:
+    """ETag de la exportación de esa versión del documento en ese formato."""
+    return f'"{digest[:32]}-{format}"'
+
+
+@dataclass(frozen=True)
+class ExportArtifact:
+    """Exportación renderizada de una versión concreta del documento."""
+
+    digest: str
+    format: str
+    data: bytes
+
+    @property
+    def etag(self) -> str:
+        return export_etag(self.digest, self.format)
+
+
+class ExportArtifactCache:
+    """LRU en memoria de exportaciones, con renderizado único por (documento, formato).
+
+    Se usa solo desde el bucle de eventos; el renderizado se ejecuta en un hilo.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._artifacts: OrderedDict[tuple[str, str], ExportArtifact] = OrderedDict()
+        self._pending: dict[tuple[str, str], asyncio.Task] = {}
+
+    async def get(self, content: str, format: str, digest: str | None = None) -> ExportArtifact:
+        """Devuelve la exportación del contenido, renderizándola solo si no está ya en caché o en curso."""
+        digest = digest or content_digest(content)
+        key = (digest, format)
+        artifact = self._artifacts.get(key)
+        if artifact is not None:
+            self._artifacts.move_to_end(key)
+            metrics.export_cache_lookups.inc(format=format, result="hit")
+            return artifact
+        task = self._pending.get(key)
+        metrics.export_cache_lookups.inc(format=format, result="miss" if task is None else "pending")
+        if task is None:
+            task = asyncio.create_task(self._render(content, digest, format))
+            self._pending[key] = task
+            task.add_done_callback(lambda _: self._pending.pop(key, None))
+        # Si el cliente se desconecta, el renderizado sigue para la siguiente petición
+        return await asyncio.shield(task)
+
+    async def _render(self, content: str, digest: str, format: str) -> ExportArtifact:
+        with metrics.export_render_duration.time("export", format=format):
+            data = await asyncio.to_thread(EXPORT_FORMATS[format].render, content)
+        metrics.export_bytes.inc(len(data), format=format)
+        artifact = ExportArtifact(digest, format, data)
+        self._artifacts[(digest, format)] = artifact
+        while len(self._artifacts) > self.max_entries:
+            self._artifacts.popitem(last=False)
+        return artifact
+
+    def prerender(self, content: str) -> None:
+        """Programa en segundo plano el renderizado de EXPORT_PRERENDER_FORMATS para este contenido."""
+        digest = content_digest(content)
+        for format in EXPORT_PRERENDER_FORMATS:
+            if format not in EXPORT_FORMATS:
+                continue
+            task = asyncio.create_task(self.get(content, format, digest))
+            task.add_done_callback(_log_prerender_error)
+
+    def clear(self) -> None:
+        self._artifacts.clear()
+
+    def __len__(self) -> int:
+        return len(self._artifacts)
+
+
+def _log_prerender_error(task: asyncio.Task) -> None:
+    if task.cancelled() or task.exception() is None:
+        return
+    e = task.exception()
+    tb = "".join(traceback.format_exception(type(e), e, e.__traceback__))
+    logging.error(f"Error prerenderizando la exportación del funcional: {e}\nTRACEBACK:\n{tb}")
+
+
+export_artifacts = ExportArtifactCache(EXPORT_CACHE_MAX_ENTRIES)
@@ -0,0 +1,116 @@
+"""
+Exportadores del documento funcional (Word y PDF).
+
+Cada exportador renderiza el documento en memoria en lugar de dejar ficheros
+en /tmp. EXPORT_FORMATS reúne los formatos disponibles para las descargas y la
+caché de exportaciones. Las bibliotecas de cada formato (python-docx, markdown,
+BeautifulSoup, fpdf2, pdfkit) se importan en su primera exportación.
+"""
+import io
+from dataclasses import dataclass
+from typing import BinaryIO, Callable
+
+from app.utils.markdown_sections import MarkdownIndex
+
+DOCX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+PDF_MEDIA_TYPE = "application/pdf"
+
+
+def _add_toc(doc) -> None:
+    """Inserta solo la Tabla de Contenido nativa de Word (TOC)."""
+    from docx.oxml import OxmlElement
+    from docx.oxml.ns import qn
+    p = doc.add_paragraph()
+    run = p.add_run()
+    fldChar1 = OxmlElement('w:fldChar')
+    fldChar1.set(qn('w:fldCharType'), 'begin')
+    instrText = OxmlElement('w:instrText')
+    instrText.text = r'TOC \o "1-3" \h \z \u'
+    fldChar2 = OxmlElement('w:fldChar')
+    fldChar2.set(qn('w:fldCharType'), 'end')
+    r_element = run._r
+    r_element.append(fldChar1)
+    r_element.append(instrText)
+    r_element.append(fldChar2)
+    doc.add_paragraph("")  # Espacio tras el TOC
+
+
+def render_funcional_docx(content: str, stream: BinaryIO) -> None:
+    """Convierte el Markdown del funcional en un documento Word y lo escribe en stream."""
+    import markdown
+    from bs4 import BeautifulSoup
+    from docx import Document as DocxDocument
+    document = MarkdownIndex(content)
+    md = markdown.Markdown()
+    doc = DocxDocument()
+    _add_toc(doc)
+
+    # Los encabezados salen del índice de secciones; el cuerpo de cada sección se convierte por separado
+    def add_body(text: str) -> None:
+        soup = BeautifulSoup(md.reset().convert(text), "html.parser")
+        for el in soup.children:
+            if el.name and el.name.startswith('h') and el.name[1:].isdigit():
+                level = int(el.name[1:])
+                doc.add_heading(el.get_text(), level=level if level <= 4 else 4)
+            elif el.name == 'ul':
+                for li in el.find_all('li', recursive=False):
+                    doc.add_paragraph(li.get_text(), style='List Bullet')
+            elif el.name == 'ol':
+                for li in el.find_all('li', recursive=False):
+                    doc.add_paragraph(li.get_text(), style='List Number')
+            elif el.name == 'p':
+                doc.add_paragraph(el.get_text())
+            elif el.name == 'strong':
+                p = doc.add_paragraph()
+                run = p.add_run(el.get_text())
+                run.bold = True
+            elif el.name == 'em':
+                p = doc.add_paragraph()
+                run = p.add_run(el.get_text())
+                run.italic = True
+            # Puedes agregar más reglas para otros elementos si lo necesitas
+
+    add_body(document.preamble)
+    for section in document.sections:
+        doc.add_heading(section.title, level=section.level if section.level <= 4 else 4)
+        add_body(section.body(content))
+    # No se añade ningún índice textual ni contenido relacionado con el árbol de contenido al final
+    doc.save(stream)
+
+
+def render_funcional_html_pdf(content: str) -> bytes:
+    """Convierte el Markdown a HTML sin estilos ni restricciones y lo pasa a PDF con wkhtmltopdf."""
+    import markdown
+    import pdfkit
+    html = markdown.markdown(content)
+    html_doc = f"<html><body>{html}</body></html>"
+    # Con output_path=False pdfkit devuelve el PDF en memoria
+    return pdfkit.from_string(html_doc, False)
+
+
+def _docx_bytes(content: str) -> bytes:
+    buffer = io.BytesIO()
+    render_funcional_docx(content, buffer)
+    return buffer.getvalue()
+
+
+def _pdf_bytes(content: str) -> bytes:
+    from app.services.pdf_layout import render_funcional_pdf
+    return render_funcional_pdf(content)
+
+
+@dataclass(frozen=True)
+class ExportFormat:
+    """Formato de exportación: función de renderizado, nombre del fichero descargado y tipo MIME."""
+
+    render: Callable[[str], bytes]
+    filename: str
+    media_type: str
+    label: str
+
+
+EXPORT_FORMATS = {
+    "docx": ExportFormat(_docx_bytes, "funcional_generado.docx", DOCX_MEDIA_TYPE, "Word"),
+    "pdf": ExportFormat(_pdf_bytes, "funcional_generado.pdf", PDF_MEDIA_TYPE, "PDF"),
+    "pdf-unrestricted": ExportFormat(render_funcional_html_pdf, "funcional_generado_unrestricted.pdf", PDF_MEDIA_TYPE, "PDF"),
+}
@@ -0,0 +1,313 @@
+"""
+Extracción de texto de documentos subidos con caché persistente en disco.
+
+Las entradas de la caché se indexan por el hash SHA-256 del contenido del
+fichero y por la versión del extractor: un fichero renombrado reutiliza su
+entrada y cualquier cambio en el extractor invalida las anteriores.
+
+Los PDF se extraen página a página: una página que no se puede leer se
+sustituye por un marcador sin perder el resto del documento, y la extracción
+se puede detener al alcanzar un presupuesto de tokens (las páginas ya
+extraídas se guardan y una extracción posterior con más presupuesto continúa
+desde ahí). Cada entrada guarda el texto de las páginas separado por saltos de
+página.
+
+PyPDF2 y python-docx se importan al extraer el primer documento de cada tipo, no
+al arrancar la aplicación.
+"""
+import hashlib
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterator
+
+from app.services import metrics
+from app.utils.tokens import estimate_tokens
+
+if TYPE_CHECKING:
+    from PyPDF2 import PdfReader
+
+# Incrementar cuando cambie la forma de extraer texto para invalidar la caché
+EXTRACTOR_VERSION = "2"
+EXTRACTION_CACHE_DIR = Path(os.getenv("EXTRACTION_CACHE_DIR", ".cache/extraction"))
+# Tokens extraídos como máximo por documento para el prompt (0: documento completo)
+EXTRACTION_MAX_DOCUMENT_TOKENS = int(os.getenv("EXTRACTION_MAX_DOCUMENT_TOKENS", 0))
+_HASH_CHUNK_SIZE = 1024 * 1024
+_PAGE_SEPARATOR = "\f"
+
+
+def _file_format(file_path: str) -> str:
+    """Formato del archivo para las métricas de extracción."""
+    lower = file_path.lower()
+    if lower.endswith(".pdf"):
+        return "pdf"
+    elif lower.endswith(".docx"):
+        return "docx"
+    return "txt"
+
+
+def _iter_pdf_pages(reader: "PdfReader", start: int, stop: int) -> Iterator[str]:
+    for number in range(start, stop):
+        try:
+            text = reader.pages[number].extract_text() or ""
+        except Exception as e:
+            logging.error(f"No se pudo extraer el texto de la página {number + 1}: {e}")
+            metrics.extraction_page_errors.inc(format="pdf")
+            text = f"[No se pudo extraer el texto de la página {number + 1}]"
+        yield text.replace(_PAGE_SEPARATOR, "\n")
+
+
+def _iter_single_page(file_path: str, file_format: str) -> Iterator[str]:
+    if file_format == "docx":
+        from docx import Document
+        doc = Document(file_path)
+        yield "\n".join(p.text for p in doc.paragraphs)
+    else:
+        with open(file_path, encoding="utf-8", errors="ignore") as f:
+            yield f.read()
+
+
+def open_pages(file_path: str, start: int = 0, stop: int | None = None) -> tuple[int, Iterator[str]]:
+    """Número de páginas del archivo y generador del texto de las páginas [start, stop), una a una.
+
+    Los DOCX y TXT se tratan como una sola página. Propaga los errores al abrir el archivo;
+    los de cada página de un PDF se sustituyen por un marcador.
+    """
+    file_format = _file_format(file_path)
+    if file_format == "pdf":
+        from PyPDF2 import PdfReader
+        reader = PdfReader(file_path)
+        total = len(reader.pages)
+        return total, _iter_pdf_pages(reader, start, min(stop if stop is not None else total, total))
+    return 1, _iter_single_page(file_path, file_format) if start == 0 else iter(())
+
+
+def pdf_page_count(file_path: str) -> int:
+    """Número de páginas de un PDF (sin extraer su texto)."""
+    from PyPDF2 import PdfReader
+    return len(PdfReader(file_path).pages)
+
+
+def extract_pages(
+    file_path: str,
+    start: int = 0,
+    stop: int | None = None,
+    token_budget: int = 0,
+    tokens: int = 0,
+) -> tuple[list[str], bool]:
+    """Extrae las páginas desde start hasta stop, el final del archivo o hasta que los tokens acumulados
+    (empezando en tokens) alcancen token_budget. Devuelve las páginas y si se ha llegado al final."""
+    file_format = _file_format(file_path)
+    pages: list[str] = []
+    try:
+        with metrics.extraction_duration.time("extraction", format=file_format):
+            total, iterator = open_pages(file_path, start, stop)
+            for text in iterator:
+                pages.append(text)
+                tokens += estimate_tokens(text)
+                if token_budget and tokens >= token_budget:
+                    break
+    except Exception:
+        metrics.extraction_errors.inc(format=file_format)
+        raise
+    if file_format == "pdf":
+        metrics.extraction_pages.inc(len(pages), format=file_format)
+    metrics.extraction_bytes.inc(os.path.getsize(file_path), format=file_format)
+    return pages, start + len(pages) >= total
+
+
+def _within_budget(pages: list[str], token_budget: int) -> list[str]:
+    """Primeras páginas hasta alcanzar token_budget (incluida la que lo alcanza)."""
+    if not token_budget:
+        return pages
+    tokens = 0
+    for i, text in enumerate(pages):
+        tokens += estimate_tokens(text)
+        if tokens >= token_budget:
+            return pages[:i + 1]
+    return pages
+
+
+def join_pages(pages: list[str]) -> str:
+    return "\n".join(pages)
+
+
+def _extraction_error_text(file_path: str) -> str:
+    """Texto de sustitución cuando no se puede extraer el contenido de un archivo."""
+    name = os.path.basename(file_path)
+    if file_path.lower().endswith(".pdf"):
+        return f"[No se pudo extraer texto del PDF: {name}]"
+    elif file_path.lower().endswith(".docx"):
+        return f"[No se pudo extraer texto del DOCX: {name}]"
+    return f"[No se pudo leer el archivo: {name}]"
+
+
+def extract_text_from_file(file_path: str) -> str:
+    """Extrae texto de un archivo PDF, DOCX o TXT."""
+    try:
+        return join_pages(extract_pages(file_path)[0])
+    except Exception:
+        return _extraction_error_text(file_path)
+
+
+def file_sha256(file_path: str | Path) -> str:
+    """Calcula el hash SHA-256 de un archivo leyéndolo por bloques."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(_HASH_CHUNK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class ExtractionCache:
+    """Caché en disco del texto extraído, direccionada por contenido."""
+
+    def __init__(self, cache_dir: Path):
+        self.cache_dir = cache_dir
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # ruta -> (mtime_ns, tamaño, hash) para no recalcular el hash de ficheros sin cambios
+        self._digests: dict[str, tuple[int, int, str]] = {}
+
+    def _entry_path(self, digest: str) -> Path:
+        return self.cache_dir / f"{digest}.v{EXTRACTOR_VERSION}.txt"
+
+    def digest(self, file_path: str | Path) -> str:
+        """Devuelve el hash de contenido del archivo, reutilizándolo si no ha cambiado en disco."""
+        key = str(file_path)
+        st = os.stat(key)
+        with self._lock:
+            cached = self._digests.get(key)
+        if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+            return cached[2]
+        digest = file_sha256(key)
+        with self._lock:
+            self._digests[key] = (st.st_mtime_ns, st.st_size, digest)
+        return digest
+
+    def record_digest(self, file_path: str | Path, digest: str) -> None:
+        """Registra un hash ya calculado (p. ej. durante la subida) para no volver a leer el archivo."""
+        key = str(file_path)
+        st = os.stat(key)
+        with self._lock:
+            self._digests[key] = (st.st_mtime_ns, st.st_size, digest)
+
+    def _partial_path(self, digest: str) -> Path:
+        return self.cache_dir / f"{digest}.v{EXTRACTOR_VERSION}.partial.txt"
+
+    def get_text(self, file_path: str, token_budget: int = 0) -> str:
+        """Devuelve el texto del archivo (hasta token_budget si se indica) desde la caché o lo extrae y lo almacena."""
+        return join_pages(self.get_pages(file_path, token_budget))
+
+    def get_pages(self, file_path: str, token_budget: int = 0) -> list[str]:
+        """Como get_text, pero con el texto de cada página por separado."""
+        try:
+            return self._load_or_extract(file_path, token_budget)
+        except Exception:
+            # Los fallos al abrir el archivo no se cachean: se reintentará en la siguiente llamada
+            return [_extraction_error_text(file_path)]
+
+    def warm(self, file_path: str, token_budget: int = 0) -> int:
+        """Garantiza que el texto del archivo está en la caché y devuelve su longitud.
+
+        A diferencia de get_text, propaga los errores de extracción.
+        """
+        return len(join_pages(self._load_or_extract(file_path, token_budget)))
+
+    def is_cached(self, file_path: str) -> bool:
+        """Si el texto completo del archivo ya está en la caché."""
+        return self._entry_path(self.digest(file_path)).exists()
+
+    def store_pages(self, file_path: str, pages: list[str]) -> None:
+        """Guarda el texto completo de un archivo extraído fuera de la caché (p. ej. por rangos de páginas)."""
+        digest = self.digest(file_path)
+        self._store(self._entry_path(digest), _PAGE_SEPARATOR.join(pages))
+        self._partial_path(digest).unlink(missing_ok=True)
+
+    def _read_pages(self, entry: Path) -> list[str] | None:
+        try:
+            return entry.read_text(encoding="utf-8").split(_PAGE_SEPARATOR)
+        except FileNotFoundError:
+            return None
+
+    def _load_or_extract(self, file_path: str, token_budget: int = 0) -> list[str]:
+        digest = self.digest(file_path)
+        entry = self._entry_path(digest)
+        pages = self._read_pages(entry)
+        if pages is None:
+            partial_entry = self._partial_path(digest)
+            partial = self._read_pages(partial_entry) or []
+            tokens = sum(estimate_tokens(text) for text in partial)
+            if partial and token_budget and tokens >= token_budget:
+                # Una extracción anterior ya llegó a este presupuesto
+                pages = partial
+        if pages is not None:
+            with self._lock:
+                self.hits += 1
+            return _within_budget(pages, token_budget)
+        with self._lock:
+            self.misses += 1
+        # Se continúa desde la última página extraída en una llamada anterior con menos presupuesto
+        new_pages, complete = extract_pages(file_path, len(partial), token_budget=token_budget, tokens=tokens)
+        pages = partial + new_pages
+        if complete:
+            self._store(entry, _PAGE_SEPARATOR.join(pages))
+            partial_entry.unlink(missing_ok=True)
+        else:
+            self._store(partial_entry, _PAGE_SEPARATOR.join(pages))
+        return pages
+
+    def _store(self, entry: Path, text: str) -> None:
+        """Escribe la entrada de forma atómica para no dejar ficheros a medias."""
+        try:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            tmp = entry.with_name(f"{entry.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp.write_text(text, encoding="utf-8")
+            os.replace(tmp, entry)
+        except OSError as e:
+            logging.error(f"No se pudo guardar la caché de extracción {entry.name}: {e}")
+
+    def invalidate(self, file_path: str | Path) -> bool:
+        """Elimina la entrada asociada al contenido actual del archivo (antes de reemplazarlo o borrarlo)."""
+        key = str(file_path)
+        if not os.path.isfile(key):
+            return False
+        digest = self.digest(key)
+        with self._lock:
+            self._digests.pop(key, None)
+        self._partial_path(digest).unlink(missing_ok=True)
+        try:
+            self._entry_path(digest).unlink()
+        except FileNotFoundError:
+            return False
+        return True
+
+    def stats(self) -> dict:
+        """Contadores de aciertos/fallos y ocupación de la caché."""
+        entries = list(self.cache_dir.glob(f"*.v{EXTRACTOR_VERSION}*.txt")) if self.cache_dir.exists() else []
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / total, 4) if total else 0.0,
+            "entries": len(entries),
+            "size_bytes": sum(e.stat().st_size for e in entries),
+            "extractor_version": EXTRACTOR_VERSION,
+        }
+
+
+extraction_cache = ExtractionCache(EXTRACTION_CACHE_DIR)
+
+
+def extract_text_cached(file_path: str, token_budget: int = EXTRACTION_MAX_DOCUMENT_TOKENS) -> str:
+    """Extrae texto de un archivo usando la caché de extracción (por defecto hasta EXTRACTION_MAX_DOCUMENT_TOKENS)."""
+    return extraction_cache.get_text(file_path, token_budget)
+
+
+def extract_pages_cached(file_path: str, token_budget: int = EXTRACTION_MAX_DOCUMENT_TOKENS) -> list[str]:
+    """Como extract_text_cached, pero devuelve el texto de cada página por separado."""
+    return extraction_cache.get_pages(file_path, token_budget)
@@ -0,0 +1,187 @@
+"""
+Extracción de texto en segundo plano al subir documentos.
+
+Cada archivo subido se encola en un ProcessPoolExecutor acotado (un archivo
+por tarea) que deja el texto en la caché de extracción en disco. La generación
+del funcional solo espera a las extracciones que sigan en curso.
+
+Con EXTRACTION_SPLIT_PAGES, los PDF con más páginas se reparten por rangos de
+ese número de páginas entre los procesos del pool y el texto se une en el
+proceso principal.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+from app.services import metrics
+from app.services.document_registry import document_registry
+from app.services.extraction import EXTRACTION_MAX_DOCUMENT_TOKENS, extract_pages, extraction_cache, pdf_page_count
+
+EXTRACTION_WORKERS = int(os.getenv("EXTRACTION_WORKERS", os.cpu_count() or 1))
+# Páginas por tarea al repartir un PDF grande entre procesos (0: un archivo por tarea)
+EXTRACTION_SPLIT_PAGES = int(os.getenv("EXTRACTION_SPLIT_PAGES", 0))
+
+STATUS_PENDING = "pending"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+
+def _extract_in_worker(file_path: str, digest: str | None = None, token_budget: int = 0) -> tuple[int, dict]:
+    """Punto de entrada en el proceso hijo: extrae el texto (hasta token_budget) y lo guarda en la caché.
+
+    Devuelve la longitud del texto y las métricas acumuladas en el hijo desde su tarea
+    anterior (las de una tarea fallida llegan con la siguiente).
+    """
+    if digest:
+        # Hash calculado durante la subida: el hijo no necesita volver a leer el archivo para obtenerlo
+        extraction_cache.record_digest(file_path, digest)
+    length = extraction_cache.warm(file_path, token_budget)
+    return length, metrics.registry.drain()
+
+
+def _extract_range_in_worker(file_path: str, start: int, stop: int) -> tuple[list[str], dict]:
+    """Punto de entrada en el proceso hijo: texto de las páginas [start, stop) de un PDF, sin caché."""
+    pages, _ = extract_pages(file_path, start, stop)
+    return pages, metrics.registry.drain()
+
+
+class ExtractionJobs:
+    """Cola de extracciones con estado por archivo (pending/done/failed)."""
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max(1, max_workers)
+        self._executor: ProcessPoolExecutor | None = None
+        self._splitter: ThreadPoolExecutor | None = None
+        self._lock = threading.RLock()
+        self._futures: dict[str, Future] = {}
+        self._status: dict[str, dict] = {}
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn evita hacer fork de un proceso con hilos y bucle de eventos activos
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    def _submit_to_pool(self, fn, *args) -> Future:
+        with self._lock:
+            try:
+                return self._get_executor().submit(fn, *args)
+            except BrokenProcessPool:
+                # Un proceso hijo murió de forma abrupta: se recrea el pool
+                self._executor = None
+                return self._get_executor().submit(fn, *args)
+
+    def submit(self, file_path: str | Path, digest: str | None = None, workspace: str | None = None) -> None:
+        """Encola la extracción de un archivo, sustituyendo cualquier tarea previa sobre la misma ruta.
+
+        Con workspace, el estado de la extracción se registra también en el índice de documentos.
+        """
+        key = str(file_path)
+        with self._lock:
+            previous = self._futures.pop(key, None)
+            if previous is not None:
+                previous.cancel()
+            if EXTRACTION_SPLIT_PAGES > 0 and key.lower().endswith(".pdf"):
+                if self._splitter is None:
+                    self._splitter = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="extraction-split")
+                future = self._splitter.submit(self._extract_split, key, digest)
+            else:
+                future = self._submit_to_pool(_extract_in_worker, key, digest, EXTRACTION_MAX_DOCUMENT_TOKENS)
+            self._futures[key] = future
+            self._status[key] = {"status": STATUS_PENDING}
+        future.add_done_callback(lambda f, key=key: self._on_done(key, f, workspace))
+
+    def _on_done(self, key: str, future: Future, workspace: str | None = None) -> None:
+        with self._lock:
+            if self._futures.get(key) is not future:
+                # La tarea fue sustituida o el archivo se borró
+                return
+            del self._futures[key]
+            if future.cancelled():
+                self._status.pop(key, None)
+                return
+            error = future.exception()
+            if error is None:
+                _, worker_metrics = future.result()
+                metrics.registry.merge(worker_metrics)
+                self._status[key] = {"status": STATUS_DONE}
+            else:
+                logging.error(f"Error extrayendo texto de {os.path.basename(key)}: {error}")
+                self._status[key] = {"status": STATUS_FAILED, "error": str(error)}
+            status = self._status[key]
+        if workspace is None:
+            return
+        # El estado también queda en el índice de documentos para el listado
+        try:
+            document_registry.set_extraction_status(workspace, os.path.basename(key), status["status"], status.get("error"))
+        except Exception as e:
+            logging.error(f"Error registrando el estado de extracción de {os.path.basename(key)}: {e}")
+
+    def _extract_split(self, key: str, digest: str | None) -> tuple[int, dict]:
+        """En un hilo: reparte las páginas de un PDF grande entre los procesos y guarda el texto completo.
+
+        Con presupuesto de tokens (EXTRACTION_MAX_DOCUMENT_TOKENS) se extrae en orden en un solo
+        proceso, para poder detenerse al alcanzarlo.
+        """
+        if digest:
+            extraction_cache.record_digest(key, digest)
+        if extraction_cache.is_cached(key):
+            return 0, {}
+        pages = pdf_page_count(key)
+        if pages <= EXTRACTION_SPLIT_PAGES or EXTRACTION_MAX_DOCUMENT_TOKENS:
+            return self._submit_to_pool(_extract_in_worker, key, digest, EXTRACTION_MAX_DOCUMENT_TOKENS).result()
+        ranges = [(start, min(start + EXTRACTION_SPLIT_PAGES, pages)) for start in range(0, pages, EXTRACTION_SPLIT_PAGES)]
+        futures = [self._submit_to_pool(_extract_range_in_worker, key, start, stop) for start, stop in ranges]
+        texts: list[str] = []
+        try:
+            for future in futures:
+                range_pages, worker_metrics = future.result()
+                metrics.registry.merge(worker_metrics)
+                texts.extend(range_pages)
+        finally:
+            for future in futures:
+                future.cancel()
+        extraction_cache.store_pages(key, texts)
+        return sum(len(t) for t in texts) + len(texts) - 1, {}
+
+    def status(self, file_path: str | Path) -> dict | None:
+        """Estado de la última extracción encolada para el archivo, o None si no hay ninguna."""
+        with self._lock:
+            return self._status.get(str(file_path))
+
+    def forget(self, file_path: str | Path) -> None:
+        """Cancela y olvida la extracción de un archivo que se va a borrar."""
+        key = str(file_path)
+        with self._lock:
+            future = self._futures.pop(key, None)
+            self._status.pop(key, None)
+        if future is not None:
+            future.cancel()
+
+    async def wait_for(self, file_paths: list[str]) -> None:
+        """Espera únicamente a las extracciones todavía en curso de los archivos indicados."""
+        with self._lock:
+            pending = [self._futures[str(p)] for p in file_paths if str(p) in self._futures]
+        if pending:
+            await asyncio.gather(*(asyncio.wrap_future(f) for f in pending), return_exceptions=True)
+
+    def shutdown(self) -> None:
+        """Detiene el pool de procesos descartando las tareas sin empezar."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+            splitter, self._splitter = self._splitter, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+        if splitter is not None:
+            splitter.shutdown(wait=False, cancel_futures=True)
+
+
+extraction_jobs = ExtractionJobs(EXTRACTION_WORKERS)
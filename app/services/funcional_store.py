@@ -0,0 +1,157 @@
+"""
+Documento funcional de cada espacio de trabajo, con historial de versiones.
+
+Cada guardado (generación o edición) crea una versión nueva numerada en la
+base de datos; la versión actual es la de número más alto. Se conservan las
+últimas FUNCIONAL_MAX_VERSIONS versiones por espacio de trabajo. Un guardado
+puede exigir que la versión actual sea la que el cliente editó (concurrencia
+optimista); si no lo es, falla con FuncionalVersionConflict.
+"""
+import hashlib
+import os
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+from sqlalchemy import delete, func, select
+from sqlalchemy.exc import IntegrityError
+
+from app.db.database import SessionLocal
+from app.db.models import FuncionalVersion
+
+FUNCIONAL_MAX_VERSIONS = int(os.getenv("FUNCIONAL_MAX_VERSIONS", 50))
+
+SOURCE_GENERATE = "generate"
+SOURCE_STREAM = "stream"
+SOURCE_EDIT = "edit"
+
+
+class FuncionalVersionConflict(Exception):
+    """La versión actual del documento no es la versión sobre la que se hicieron los cambios."""
+
+    def __init__(self, workspace: str, expected: int | None, current: int | None):
+        super().__init__(f"El documento funcional de {workspace} está en la versión {current}, no en la {expected}.")
+        self.workspace = workspace
+        self.expected = expected
+        self.current = current
+
+
+@dataclass(frozen=True)
+class FuncionalDocument:
+    """Versión del documento funcional (content es None si se consultaron solo los metadatos)."""
+
+    workspace: str
+    version: int
+    sha256: str
+    source: str
+    created_at: datetime
+    content: str | None = None
+
+    @property
+    def timestamp(self) -> float:
+        """Momento de creación en segundos desde epoch."""
+        return self.created_at.replace(tzinfo=timezone.utc).timestamp()
+
+    def to_dict(self) -> dict:
+        data = {
+            "version": self.version,
+            "sha256": self.sha256,
+            "source": self.source,
+            "created_at": self.created_at.isoformat(),
+        }
+        if self.content is not None:
+            data["content"] = self.content
+        return data
+
+
+_METADATA = (
+    FuncionalVersion.workspace,
+    FuncionalVersion.version,
+    FuncionalVersion.sha256,
+    FuncionalVersion.source,
+    FuncionalVersion.created_at,
+)
+
+
+class FuncionalStore:
+    """Versiones del documento funcional por espacio de trabajo."""
+
+    def __init__(self, session_factory=SessionLocal, max_versions: int = FUNCIONAL_MAX_VERSIONS):
+        self._session_factory = session_factory
+        self.max_versions = max(1, max_versions)
+
+    def latest_version(self, workspace: str) -> int | None:
+        """Número de la versión actual, o None si aún no hay documento (consulta ligera)."""
+        with self._session_factory() as session:
+            return session.scalar(select(func.max(FuncionalVersion.version)).where(FuncionalVersion.workspace == workspace))
+
+    def current(self, workspace: str, include_content: bool = True) -> FuncionalDocument | None:
+        """Versión actual del documento, o None si aún no se ha generado."""
+        columns = _METADATA + ((FuncionalVersion.content,) if include_content else ())
+        query = (
+            select(*columns)
+            .where(FuncionalVersion.workspace == workspace)
+            .order_by(FuncionalVersion.version.desc())
+            .limit(1)
+        )
+        with self._session_factory() as session:
+            row = session.execute(query).first()
+        return FuncionalDocument(*row) if row is not None else None
+
+    def get(self, workspace: str, version: int) -> FuncionalDocument | None:
+        """Versión concreta del documento, si se conserva."""
+        query = select(*_METADATA, FuncionalVersion.content).where(
+            FuncionalVersion.workspace == workspace, FuncionalVersion.version == version
+        )
+        with self._session_factory() as session:
+            row = session.execute(query).first()
+        return FuncionalDocument(*row) if row is not None else None
+
+    def versions(self, workspace: str) -> list[dict]:
+        """Metadatos de las versiones conservadas, de la más reciente a la más antigua."""
+        query = select(*_METADATA).where(FuncionalVersion.workspace == workspace).order_by(FuncionalVersion.version.desc())
+        with self._session_factory() as session:
+            return [FuncionalDocument(*row).to_dict() for row in session.execute(query)]
+
+    def save(
+        self,
+        workspace: str,
+        content: str,
+        source: str,
+        expected_version: int | None = None,
+        version: int | None = None,
+    ) -> FuncionalDocument:
+        """Guarda el contenido como nueva versión actual y descarta las versiones más antiguas.
+
+        Con expected_version, falla con FuncionalVersionConflict si la versión actual es otra. version
+        fija el número de la nueva versión (por defecto, la siguiente a la actual).
+        """
+        sha256 = hashlib.sha256(content.encode("utf-8")).hexdigest()
+        created_at = datetime.now(timezone.utc).replace(tzinfo=None)
+        attempts = 3
+        while True:
+            attempts -= 1
+            try:
+                with self._session_factory.begin() as session:
+                    last = session.scalar(select(func.max(FuncionalVersion.version)).where(FuncionalVersion.workspace == workspace))
+                    if expected_version is not None and last != expected_version:
+                        raise FuncionalVersionConflict(workspace, expected_version, last)
+                    new_version = version if version is not None and version > (last or 0) else (last or 0) + 1
+                    session.add(FuncionalVersion(
+                        workspace=workspace, version=new_version, content=content,
+                        sha256=sha256, source=source, created_at=created_at,
+                    ))
+                    session.flush()
+                    session.execute(delete(FuncionalVersion).where(
+                        FuncionalVersion.workspace == workspace,
+                        FuncionalVersion.version <= new_version - self.max_versions,
+                    ))
+                return FuncionalDocument(workspace, new_version, sha256, source, created_at, content)
+            except IntegrityError:
+                # Otro worker ha guardado la misma versión a la vez
+                if expected_version is not None:
+                    raise FuncionalVersionConflict(workspace, expected_version, self.latest_version(workspace))
+                if not attempts:
+                    raise
+
+
+funcional_store = FuncionalStore()
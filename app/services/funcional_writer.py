@@ -0,0 +1,220 @@
+"""
+Escritura del documento funcional con buffer de escritura diferida (write-behind).
+
+Las ediciones del editor (documento completo o una sección) se aplican en
+memoria y reciben su número de versión al instante, pero no se escriben en la
+base de datos hasta que pasan FUNCIONAL_WRITE_DELAY segundos sin ediciones
+nuevas (o FUNCIONAL_WRITE_MAX_DELAY desde la primera edición pendiente): una
+ráfaga de guardados automáticos produce una sola versión durable. La lectura
+del documento y las exportaciones ven siempre la última edición; el índice de
+secciones (chatbot, árbol de contenidos) se actualiza al escribirla. El buffer
+se vacía al parar la aplicación.
+
+Cada edición puede indicar la versión sobre la que se hizo (base_version); si
+ya no es la actual se rechaza con FuncionalVersionConflict en lugar de pisar
+los cambios de otro. Al escribir el buffer se exige lo mismo a la base de datos,
+por si otro worker ha guardado otra versión entretanto: las ediciones ya
+confirmadas al cliente no se descartan en silencio, sino que el conflicto se
+lanza en la siguiente llamada a current() o edit() del espacio de trabajo. Si la
+escritura falla por otro motivo, se reintenta con espera exponencial.
+
+Se usa solo desde el bucle de eventos; el acceso a la base de datos se ejecuta
+en un hilo.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import traceback
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Callable
+
+from app.services.document_context import funcional_indexes
+from app.services.export_cache import export_artifacts
+from app.services.funcional_store import (
+    SOURCE_EDIT,
+    FuncionalDocument,
+    FuncionalStore,
+    FuncionalVersionConflict,
+    funcional_store,
+)
+
+FUNCIONAL_WRITE_DELAY = float(os.getenv("FUNCIONAL_WRITE_DELAY", 2))
+FUNCIONAL_WRITE_MAX_DELAY = float(os.getenv("FUNCIONAL_WRITE_MAX_DELAY", 10))
+# Espera antes del primer reintento de una escritura fallida (se duplica en cada fallo, hasta FUNCIONAL_WRITE_MAX_DELAY)
+FUNCIONAL_WRITE_RETRY_DELAY = float(os.getenv("FUNCIONAL_WRITE_RETRY_DELAY", 1))
+
+
+class FuncionalNotFoundError(LookupError):
+    """El espacio de trabajo todavía no tiene documento funcional."""
+
+
+@dataclass
+class _PendingEdits:
+    """Ediciones aún no escritas de un espacio de trabajo."""
+
+    base_version: int | None
+    document: FuncionalDocument
+    first_edit_at: float
+    timer: asyncio.TimerHandle | None = None
+    # Escrituras fallidas seguidas (para el backoff de los reintentos)
+    failures: int = 0
+    # Otra versión se guardó antes que estas ediciones: se comunica al siguiente que use el documento
+    conflict: FuncionalVersionConflict | None = None
+
+
+class FuncionalWriter:
+    """Guardado del funcional por espacio de trabajo, con las ediciones agrupadas en memoria."""
+
+    def __init__(self, store: FuncionalStore, delay: float, max_delay: float, retry_delay: float = FUNCIONAL_WRITE_RETRY_DELAY):
+        self.store = store
+        self.delay = delay
+        self.max_delay = max(delay, max_delay)
+        self.retry_delay = retry_delay
+        self._pending: dict[str, _PendingEdits] = {}
+        self._locks: dict[str, asyncio.Lock] = {}
+        self._flushes: set[asyncio.Task] = set()
+
+    def _lock(self, workspace: str) -> asyncio.Lock:
+        lock = self._locks.get(workspace)
+        if lock is None:
+            lock = self._locks[workspace] = asyncio.Lock()
+        return lock
+
+    async def current(self, workspace: str) -> FuncionalDocument | None:
+        """Versión actual del documento, incluidas las ediciones pendientes de escribir.
+
+        Si las ediciones pendientes no se pudieron escribir porque otro guardó antes otra versión, se
+        descartan y se lanza FuncionalVersionConflict (una sola vez).
+        """
+        pending = self._pending.get(workspace)
+        if pending is not None:
+            if pending.conflict is not None:
+                del self._pending[workspace]
+                raise pending.conflict
+            return pending.document
+        return await asyncio.to_thread(self.store.current, workspace)
+
+    async def edit(
+        self,
+        workspace: str,
+        apply: Callable[[str], str],
+        base_version: int | None = None,
+    ) -> FuncionalDocument:
+        """Aplica apply al contenido actual como nueva versión y programa su escritura diferida.
+
+        Lanza FuncionalNotFoundError si no hay documento y FuncionalVersionConflict si base_version
+        no es la versión actual. Las excepciones de apply se propagan sin modificar nada.
+        """
+        async with self._lock(workspace):
+            current = await self.current(workspace)
+            if current is None:
+                raise FuncionalNotFoundError(workspace)
+            if base_version is not None and base_version != current.version:
+                raise FuncionalVersionConflict(workspace, base_version, current.version)
+            content = apply(current.content)
+            document = FuncionalDocument(
+                workspace=workspace,
+                version=current.version + 1,
+                sha256=hashlib.sha256(content.encode("utf-8")).hexdigest(),
+                source=SOURCE_EDIT,
+                created_at=datetime.now(timezone.utc).replace(tzinfo=None),
+                content=content,
+            )
+            loop = asyncio.get_running_loop()
+            pending = self._pending.get(workspace)
+            if pending is None:
+                pending = self._pending[workspace] = _PendingEdits(current.version, document, loop.time())
+            else:
+                pending.document = document
+            # Cada edición aplaza la escritura, salvo que la primera pendiente ya sea demasiado antigua
+            if pending.timer is not None:
+                pending.timer.cancel()
+            delay = min(self.delay, max(0.0, pending.first_edit_at + self.max_delay - loop.time()))
+            pending.timer = loop.call_later(delay, self._start_flush, workspace)
+            return document
+
+    async def save(
+        self,
+        workspace: str,
+        content: str,
+        source: str,
+        base_version: int | None = None,
+    ) -> FuncionalDocument:
+        """Guarda el documento completo como nueva versión durable (tras escribir las ediciones pendientes)."""
+        async with self._lock(workspace):
+            if base_version is not None:
+                current = await self.current(workspace)
+                current_version = current.version if current is not None else None
+                if base_version != current_version:
+                    raise FuncionalVersionConflict(workspace, base_version, current_version)
+            await self._flush_locked(workspace, overwrite=True)
+            document = await asyncio.to_thread(self.store.save, workspace, content, source, base_version)
+            self._on_saved(document)
+            return document
+
+    def _start_flush(self, workspace: str) -> None:
+        task = asyncio.create_task(self.flush(workspace))
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def flush(self, workspace: str) -> None:
+        """Escribe ya las ediciones pendientes del espacio de trabajo, si las hay."""
+        async with self._lock(workspace):
+            await self._flush_locked(workspace)
+
+    async def _flush_locked(self, workspace: str, overwrite: bool = False) -> None:
+        """Escribe las ediciones pendientes; con overwrite se descartan las que están en conflicto."""
+        pending = self._pending.get(workspace)
+        if pending is None:
+            return
+        if pending.conflict is not None:
+            if overwrite:
+                # Se va a guardar un documento completo nuevo encima: las ediciones en conflicto quedan sustituidas
+                logging.error(f"Se descartan las ediciones en conflicto del funcional de {workspace}: {pending.conflict}")
+                del self._pending[workspace]
+            return
+        if pending.timer is not None:
+            pending.timer.cancel()
+            pending.timer = None
+        edited = pending.document
+        try:
+            # Las ediciones siguen en _pending mientras se escriben: current() devuelve la versión editada
+            document = await asyncio.to_thread(
+                self.store.save, workspace, edited.content, SOURCE_EDIT, pending.base_version, edited.version
+            )
+        except FuncionalVersionConflict as e:
+            # Otro worker ha guardado una versión entretanto: sus cambios prevalecen y el conflicto se
+            # comunica en la siguiente llamada a current() o edit()
+            logging.error(f"No se pueden escribir las ediciones del funcional (versión {edited.version}): {e}")
+            pending.conflict = e
+            return
+        except Exception as e:
+            logging.error(f"Error escribiendo las ediciones del funcional de {workspace}: {e}\nTRACEBACK:\n{traceback.format_exc()}")
+            pending.failures += 1
+            delay = min(self.max_delay, self.retry_delay * 2 ** (pending.failures - 1))
+            pending.timer = asyncio.get_running_loop().call_later(delay, self._start_flush, workspace)
+            return
+        del self._pending[workspace]
+        self._on_saved(document)
+
+    def _on_saved(self, document: FuncionalDocument) -> None:
+        # Índice de secciones actualizado sin volver a leer el documento y exportaciones prerenderizadas
+        funcional_indexes.get(document.workspace).update(document.version, document.content)
+        export_artifacts.prerender(document.content)
+
+    async def shutdown(self) -> None:
+        """Escribe todas las ediciones pendientes."""
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+        for workspace in list(self._pending):
+            await self.flush(workspace)
+        for workspace, pending in self._pending.items():
+            # Sin bucle de eventos no habrá más reintentos
+            if pending.timer is not None:
+                pending.timer.cancel()
+            logging.error(f"Ediciones del funcional de {workspace} sin escribir al parar (versión {pending.document.version})")
+
+
+funcional_writer = FuncionalWriter(funcional_store, FUNCIONAL_WRITE_DELAY, FUNCIONAL_WRITE_MAX_DELAY)
@@ -0,0 +1,161 @@
+"""
+Cola de trabajos de generación del documento funcional.
+
+La petición HTTP solo encola el trabajo y devuelve su id; la generación se
+ejecuta en segundo plano en un pool acotado (GENERATION_WORKERS trabajos a la
+vez). Las peticiones concurrentes sobre la misma entrada (espacio de trabajo,
+huella de los documentos, la plantilla y el modo) comparten un único trabajo en
+curso.
+"""
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+import time
+import traceback
+import uuid
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable
+
+from app.services.extraction import extraction_cache
+from app.services.plantillas import get_plantilla
+
+GENERATION_WORKERS = int(os.getenv("GENERATION_WORKERS", 2))
+# Trabajos terminados que se conservan para consultar su estado/resultado
+GENERATION_JOB_HISTORY = int(os.getenv("GENERATION_JOB_HISTORY", 50))
+
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+JOB_CANCELLED = "cancelled"
+_FINISHED = (JOB_DONE, JOB_FAILED, JOB_CANCELLED)
+
+
+def generation_fingerprint(
+    file_paths: list[str],
+    mode: str,
+    force_full: bool = False,
+    plantilla: str | None = None,
+    workspace: str = "",
+    no_cache: bool = False,
+) -> str:
+    """Huella de la entrada de una generación: espacio de trabajo, contenido de los documentos, plantilla y opciones."""
+    template = get_plantilla(plantilla)
+    h = hashlib.sha256()
+    h.update(
+        f"workspace={workspace}\nmode={mode}\nforce_full={force_full}\nno_cache={no_cache}\n"
+        f"plantilla={template.name}:{template.digest}\n".encode("utf-8")
+    )
+    for path in sorted(file_paths):
+        h.update(f"{os.path.basename(path)}={extraction_cache.digest(path)}\n".encode("utf-8"))
+    return h.hexdigest()
+
+
+@dataclass
+class GenerationJob:
+    """Estado de un trabajo de generación."""
+
+    id: str
+    fingerprint: str
+    mode: str
+    workspace: str = ""
+    status: str = JOB_QUEUED
+    created_at: float = field(default_factory=time.time)
+    started_at: float | None = None
+    finished_at: float | None = None
+    result: str | None = None
+    error: str | None = None
+    task: asyncio.Task | None = field(default=None, repr=False)
+
+    def to_dict(self) -> dict:
+        """Estado serializable del trabajo (sin el resultado)."""
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "mode": self.mode,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": self.error,
+        }
+
+
+class GenerationJobs:
+    """Trabajos de generación con deduplicación por huella (single-flight)."""
+
+    def __init__(self, max_workers: int, history: int):
+        self.max_workers = max(1, max_workers)
+        self.history = history
+        self._lock = threading.Lock()
+        self._jobs: dict[str, GenerationJob] = {}
+        self._inflight: dict[str, str] = {}
+        self._semaphore: asyncio.Semaphore | None = None
+
+    def submit(self, fingerprint: str, mode: str, runner: Callable[[], Awaitable[str]], workspace: str = "") -> tuple[GenerationJob, bool]:
+        """Encola un trabajo, o devuelve el trabajo en curso con la misma huella.
+
+        Devuelve (trabajo, reutilizado). Debe llamarse desde el bucle de eventos.
+        """
+        with self._lock:
+            job_id = self._inflight.get(fingerprint)
+            if job_id is not None:
+                return self._jobs[job_id], True
+            job = GenerationJob(id=uuid.uuid4().hex, fingerprint=fingerprint, mode=mode, workspace=workspace)
+            self._jobs[job.id] = job
+            self._inflight[fingerprint] = job.id
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_workers)
+        job.task = asyncio.create_task(self._run(job, runner))
+        return job, False
+
+    async def _run(self, job: GenerationJob, runner: Callable[[], Awaitable[str]]) -> None:
+        try:
+            async with self._semaphore:
+                job.status, job.started_at = JOB_RUNNING, time.time()
+                result = await runner()
+            if result.startswith("[ERROR]"):
+                job.status, job.error = JOB_FAILED, result
+            else:
+                job.status, job.result = JOB_DONE, result
+        except asyncio.CancelledError:
+            job.status = JOB_CANCELLED
+        except Exception as e:
+            logging.error(f"Error en el trabajo de generación {job.id}: {e}\nTRACEBACK:\n{traceback.format_exc()}")
+            job.status, job.error = JOB_FAILED, f"[ERROR] {str(e)}"
+        finally:
+            job.finished_at = time.time()
+            with self._lock:
+                if self._inflight.get(job.fingerprint) == job.id:
+                    del self._inflight[job.fingerprint]
+                self._prune()
+
+    def _prune(self) -> None:
+        finished = [j for j in self._jobs.values() if j.status in _FINISHED]
+        for job in sorted(finished, key=lambda j: j.finished_at or 0)[:max(0, len(finished) - self.history)]:
+            del self._jobs[job.id]
+
+    def get(self, job_id: str) -> GenerationJob | None:
+        """Devuelve el trabajo o None si no existe (o ya se descartó del historial)."""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> GenerationJob | None:
+        """Cancela un trabajo pendiente o en curso (compartido por todas las peticiones que lo reutilizan)."""
+        job = self.get(job_id)
+        if job is not None and job.status not in _FINISHED and job.task is not None:
+            job.task.cancel()
+        return job
+
+    async def shutdown(self) -> None:
+        """Cancela los trabajos sin terminar y espera a que se detengan."""
+        with self._lock:
+            tasks = [j.task for j in self._jobs.values() if j.task is not None and not j.task.done()]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+
+generation_jobs = GenerationJobs(GENERATION_WORKERS, GENERATION_JOB_HISTORY)
@@ -0,0 +1,67 @@
+"""
+Manifiesto de la última generación por secciones del documento funcional.
+
+Para cada sección de la plantilla guarda la huella de su entrada (prompt con los
+fragmentos de documentos seleccionados, modelo y parámetros), qué fragmentos la
+alimentaron y el Markdown generado. En la siguiente generación solo se vuelven a
+pedir al modelo las secciones cuya huella ha cambiado.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+
+GENERATION_MANIFEST_PATH = Path(os.getenv("GENERATION_MANIFEST_PATH", ".cache/generation/manifest.json"))
+MANIFEST_VERSION = 1
+
+
+def text_sha256(text: str) -> str:
+    """Hash de un texto, para identificar los fragmentos de entrada en el manifiesto."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class SectionManifest:
+    """Entradas por número de sección: fingerprint, title, sources y markdown."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def load(self) -> dict[str, dict]:
+        """Devuelve las entradas guardadas; vacío si no hay manifiesto o es de otra versión."""
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+        if data.get("version") != MANIFEST_VERSION:
+            return {}
+        return data.get("sections", {})
+
+    def reusable(self, entries: dict[str, dict], section_num: str, fingerprint: str) -> str | None:
+        """Markdown de la sección si su entrada no ha cambiado desde la última generación."""
+        entry = entries.get(section_num)
+        if entry and entry.get("fingerprint") == fingerprint and entry.get("markdown"):
+            return entry["markdown"]
+        return None
+
+    def save(self, entries: dict[str, dict]) -> None:
+        """Sustituye el manifiesto de forma atómica."""
+        data = json.dumps({"version": MANIFEST_VERSION, "sections": entries}, ensure_ascii=False, indent=1)
+        with self._lock:
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+                tmp.write_text(data, encoding="utf-8")
+                os.replace(tmp, self.path)
+            except OSError as e:
+                logging.error(f"No se pudo guardar el manifiesto de generación {self.path}: {e}")
+
+    def clear(self) -> None:
+        """Olvida la última generación (la siguiente será completa)."""
+        with self._lock:
+            self.path.unlink(missing_ok=True)
+
+
+section_manifest = SectionManifest(GENERATION_MANIFEST_PATH)
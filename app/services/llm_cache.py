@@ -0,0 +1,185 @@
+"""
+Caché de respuestas del modelo para el chatbot y la generación del funcional.
+
+La clave es un hash del modelo, los parámetros de la llamada y los prompts de
+sistema y usuario normalizados (espacios y saltos de línea), de modo que una
+pregunta repetida sobre el mismo documento o una regeneración sobre los mismos
+documentos se responde sin volver a llamar a Azure OpenAI.
+
+Tiene un nivel en memoria (LRU acotado por número de entradas) y un nivel
+opcional en disco (LLM_CACHE_DIR, acotado por tamaño). Ambos expiran por TTL.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1").lower() not in ("0", "false", "no")
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", 256))
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", 24 * 3600))
+# Vacío = sin nivel en disco
+LLM_CACHE_DIR = os.getenv("LLM_CACHE_DIR", "")
+LLM_CACHE_DISK_MAX_BYTES = int(os.getenv("LLM_CACHE_DISK_MAX_BYTES", 256 * 1024 * 1024))
+
+_SPACES_RE = re.compile(r"[ \t\u00a0]+")
+_BLANK_LINES_RE = re.compile(r"\n{3,}")
+
+
+def normalize_prompt(text: str) -> str:
+    """Normaliza diferencias irrelevantes: Unicode NFC, saltos de línea, espacios repetidos y finales."""
+    text = unicodedata.normalize("NFC", text).replace("\r\n", "\n").replace("\r", "\n")
+    text = "\n".join(_SPACES_RE.sub(" ", line).strip() for line in text.split("\n"))
+    return _BLANK_LINES_RE.sub("\n\n", text).strip()
+
+
+def cache_key(model: str | None, params: dict, system_prompt: str, user_prompt: str) -> str:
+    """Hash estable de una llamada al modelo."""
+    payload = json.dumps(
+        {
+            "model": model,
+            "params": params,
+            "system": normalize_prompt(system_prompt),
+            "user": normalize_prompt(user_prompt),
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """Caché LRU en memoria con TTL y nivel opcional en disco acotado por tamaño."""
+
+    def __init__(self, max_entries: int, ttl: float, cache_dir: str = "", disk_max_bytes: int = 0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.disk_max_bytes = disk_max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._memory: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_bytes: int | None = None
+
+    def get(self, key: str) -> str | None:
+        """Devuelve la respuesta cacheada o None si no existe o ha expirado."""
+        now = time.time()
+        with self._lock:
+            item = self._memory.get(key)
+            if item is not None:
+                if item[0] > now:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return item[1]
+                del self._memory[key]
+        value = self._disk_get(key, now)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        self._memory_set(key, value, now)
+        return value
+
+    def set(self, key: str, value: str) -> None:
+        """Guarda una respuesta en ambos niveles."""
+        now = time.time()
+        self._memory_set(key, value, now)
+        self._disk_set(key, value, now)
+
+    def _memory_set(self, key: str, value: str, now: float) -> None:
+        with self._lock:
+            self._memory[key] = (now + self.ttl, value)
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def _disk_path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def _disk_get(self, key: str, now: float) -> str | None:
+        if self.cache_dir is None:
+            return None
+        path = self._disk_path(key)
+        try:
+            entry = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        if entry.get("created", 0) + self.ttl <= now:
+            path.unlink(missing_ok=True)
+            return None
+        return entry.get("value")
+
+    def _disk_set(self, key: str, value: str, now: float) -> None:
+        if self.cache_dir is None:
+            return
+        path = self._disk_path(key)
+        data = json.dumps({"created": now, "value": value}, ensure_ascii=False)
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp.write_text(data, encoding="utf-8")
+            os.replace(tmp, path)
+        except OSError as e:
+            logging.error(f"No se pudo guardar la caché de respuestas {path.name}: {e}")
+            return
+        with self._lock:
+            if self._disk_bytes is None:
+                self._disk_bytes = sum(p.stat().st_size for p in self.cache_dir.glob("*/*.json"))
+            else:
+                self._disk_bytes += len(data.encode("utf-8"))
+            over_limit = self._disk_bytes > self.disk_max_bytes
+        if over_limit:
+            self._evict_disk(now)
+
+    def _evict_disk(self, now: float) -> None:
+        """Elimina las entradas expiradas y, si hace falta, las más antiguas hasta quedar al 90% del límite."""
+        entries = []
+        for p in self.cache_dir.glob("*/*.json"):
+            try:
+                st = p.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, p))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        target = int(self.disk_max_bytes * 0.9)
+        for mtime, size, p in entries:
+            if total <= target and mtime + self.ttl > now:
+                continue
+            p.unlink(missing_ok=True)
+            total -= size
+        with self._lock:
+            self._disk_bytes = total
+
+    def clear(self) -> None:
+        """Vacía ambos niveles."""
+        with self._lock:
+            self._memory.clear()
+            self._disk_bytes = 0
+        if self.cache_dir is not None:
+            for p in self.cache_dir.glob("*/*.json"):
+                p.unlink(missing_ok=True)
+
+    def stats(self) -> dict:
+        """Contadores de aciertos/fallos y ocupación."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "enabled": LLM_CACHE_ENABLED,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+                "memory_entries": len(self._memory),
+                "disk_enabled": self.cache_dir is not None,
+                "disk_bytes": self._disk_bytes,
+            }
+
+
+llm_cache = LLMResponseCache(LLM_CACHE_MAX_ENTRIES, LLM_CACHE_TTL, LLM_CACHE_DIR, LLM_CACHE_DISK_MAX_BYTES)
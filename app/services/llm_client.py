@@ -0,0 +1,82 @@
+"""
+Cliente asíncrono de Azure OpenAI compartido por toda la aplicación.
+
+Se crea una única vez, en la primera llamada al modelo o en la precarga del
+lifespan (app/services/warmup.py), con un pool de conexiones keep-alive y
+límites/timeouts configurables, y se cierra al parar. El SDK de openai tarda en
+importarse y solo se carga al crear el cliente. Con
+LLM_BACKEND=stub el cliente apunta a un servidor local compatible con la API de
+OpenAI (ver app/services/llm_stub.py) para medir latencia y throughput sin red.
+"""
+import os
+from typing import TYPE_CHECKING
+
+from app.services import metrics
+
+if TYPE_CHECKING:
+    import httpx
+    from openai import AsyncOpenAI
+
+LLM_BACKEND = os.getenv("LLM_BACKEND", "azure")
+LLM_STUB_URL = os.getenv("LLM_STUB_URL", "http://127.0.0.1:8001/v1")
+AZURE_OPENAI_API_VERSION = os.getenv("AZURE_OPENAI_API_VERSION", "2023-05-15")
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", 50))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", 20))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", 60))
+LLM_CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", 10))
+# Tiempo máximo de lectura: las generaciones largas pueden tardar minutos
+LLM_READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", 300))
+
+_client: "AsyncOpenAI | None" = None
+
+
+async def _record_response(response: "httpx.Response") -> None:
+    """Hook de httpx: cuenta cada respuesta del backend, incluidas las de los reintentos."""
+    metrics.llm_http_responses.inc(status=response.status_code)
+
+
+def create_llm_client() -> "AsyncOpenAI":
+    """Crea el cliente del backend configurado con su propio pool de conexiones HTTP."""
+    import httpx
+    from openai import AsyncAzureOpenAI, AsyncOpenAI
+
+    http_client = httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=LLM_KEEPALIVE_EXPIRY,
+        ),
+        timeout=httpx.Timeout(LLM_READ_TIMEOUT, connect=LLM_CONNECT_TIMEOUT),
+        event_hooks={"response": [_record_response]},
+    )
+    if LLM_BACKEND == "stub":
+        return AsyncOpenAI(api_key="stub", base_url=LLM_STUB_URL, http_client=http_client, max_retries=0)
+    return AsyncAzureOpenAI(
+        api_key=os.getenv("AZURE_OPENAI_API_KEY"),
+        api_version=AZURE_OPENAI_API_VERSION,
+        azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
+        http_client=http_client,
+        # Los reintentos los gestiona la pasarela (app/services/llm_gateway.py)
+        max_retries=0,
+    )
+
+
+def init_llm_client() -> "AsyncOpenAI":
+    """Crea el cliente compartido si aún no existe."""
+    global _client
+    if _client is None:
+        _client = create_llm_client()
+    return _client
+
+
+def get_llm_client() -> "AsyncOpenAI":
+    """Devuelve el cliente compartido; lo crea en la primera llamada."""
+    return _client or init_llm_client()
+
+
+async def close_llm_client() -> None:
+    """Cierra el cliente compartido y su pool de conexiones."""
+    global _client
+    client, _client = _client, None
+    if client is not None:
+        await client.close()
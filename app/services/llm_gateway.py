@@ -0,0 +1,274 @@
+"""
+Pasarela única de las llamadas al modelo: cuota, concurrencia adaptativa, reintentos y prioridades.
+
+Todas las completions pasan por aquí (ver openai_service._complete y
+_stream_completion):
+
+- Cuota: cubetas de tokens por minuto y peticiones por minuto (LLM_TPM_LIMIT,
+  LLM_RPM_LIMIT) dimensionadas con la cuota del despliegue de Azure. Cada
+  petición consume los tokens del prompt más max_tokens, que es lo que Azure
+  descuenta de la cuota al recibirla.
+- Concurrencia adaptativa (AIMD): el límite de peticiones en curso sube en una
+  unidad por cada "ventana" de respuestas correctas y se divide por dos con cada
+  429 o timeout, entre LLM_MIN_CONCURRENCY y LLM_MAX_CONCURRENCY.
+- Reintentos de 429, timeouts, errores de conexión y 5xx con espera exponencial
+  con jitter, o la indicada en Retry-After; tras un 429 con Retry-After no se
+  envía ninguna petición hasta que pase ese tiempo. El SDK no reintenta por su
+  cuenta (max_retries=0 en llm_client).
+- Prioridades: cuando hay cola, las peticiones interactivas (chatbot) pasan por
+  delante de las de generación por lotes.
+
+Se usa solo desde el bucle de eventos. El SDK de openai (para clasificar los
+errores) se importa con la primera petición.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import os
+import random
+import time
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Awaitable, Callable
+
+from app.services import metrics
+from app.services.llm_client import get_llm_client
+
+LLM_TPM_LIMIT = int(os.getenv("LLM_TPM_LIMIT", 0))
+LLM_RPM_LIMIT = int(os.getenv("LLM_RPM_LIMIT", 0))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 16))
+LLM_MIN_CONCURRENCY = int(os.getenv("LLM_MIN_CONCURRENCY", 1))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 6))
+LLM_RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", 1))
+LLM_RETRY_MAX_DELAY = float(os.getenv("LLM_RETRY_MAX_DELAY", 60))
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 1
+
+# Tras una reducción del límite, los 429 de las peticiones que ya estaban en curso no lo vuelven a reducir
+_DECREASE_INTERVAL = 1.0
+
+
+class TokenBucket:
+    """Cubeta que se rellena de forma continua a rate_per_minute, con capacidad de un minuto."""
+
+    def __init__(self, rate_per_minute: int):
+        self.capacity = float(rate_per_minute)
+        self.rate = rate_per_minute / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Segundos hasta que haya amount disponibles (0 si ya los hay)."""
+        self._refill(now)
+        # Una petición mayor que la capacidad se admite con la cubeta llena
+        amount = min(amount, self.capacity)
+        return max(0.0, (amount - self.tokens) / self.rate)
+
+    def consume(self, amount: float) -> None:
+        self.tokens -= min(amount, self.capacity)
+
+
+@dataclass(order=True)
+class _Waiter:
+    priority: int
+    seq: int
+    tokens: int = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+
+
+class LLMGateway:
+    """Planificador de las peticiones al modelo (ver docstring del módulo)."""
+
+    def __init__(
+        self,
+        rpm_limit: int,
+        tpm_limit: int,
+        max_concurrency: int,
+        min_concurrency: int,
+        max_retries: int,
+        base_delay: float,
+        max_delay: float,
+    ):
+        self.requests = TokenBucket(rpm_limit) if rpm_limit > 0 else None
+        self.tokens = TokenBucket(tpm_limit) if tpm_limit > 0 else None
+        self.max_concurrency = max(1, max_concurrency)
+        self.min_concurrency = max(1, min(min_concurrency, self.max_concurrency))
+        self.limit = float(self.max_concurrency)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.in_flight = 0
+        self._waiters: list[_Waiter] = []
+        self._seq = itertools.count()
+        self._blocked_until = 0.0
+        self._last_decrease = 0.0
+        self._timer: asyncio.TimerHandle | None = None
+
+    @property
+    def queued(self) -> int:
+        return sum(1 for w in self._waiters if not w.future.done())
+
+    async def complete(self, priority: int, estimated_tokens: int, **params):
+        """chat.completions.create (sin streaming) con cuota, prioridad y reintentos."""
+        response = await self._call(priority, estimated_tokens, lambda: get_llm_client().chat.completions.create(**params))
+        self._release()
+        self._on_success()
+        return response
+
+    async def stream(self, priority: int, estimated_tokens: int, **params) -> AsyncIterator:
+        """chat.completions.create con stream=True; la plaza se ocupa hasta que termina el stream.
+
+        Solo se reintenta la apertura del stream: un error a mitad de respuesta se propaga.
+        """
+        import openai
+        stream = await self._call(
+            priority, estimated_tokens, lambda: get_llm_client().chat.completions.create(stream=True, **params)
+        )
+        try:
+            async for chunk in stream:
+                yield chunk
+        except (openai.APITimeoutError, openai.APIConnectionError):
+            self._on_overload()
+            raise
+        else:
+            self._on_success()
+        finally:
+            self._release()
+            await stream.close()
+
+    async def _call(self, priority: int, estimated_tokens: int, create: Callable[[], Awaitable]):
+        """Ejecuta create() con reintentos y devuelve su resultado con la plaza de concurrencia aún ocupada."""
+        import openai
+        attempt = 0
+        while True:
+            await self._acquire(priority, estimated_tokens)
+            try:
+                return await create()
+            except asyncio.CancelledError:
+                self._release()
+                raise
+            except Exception as e:
+                retry = _is_retryable(e) and attempt < self.max_retries
+                delay = self._retry_delay(e, attempt) if retry else 0.0
+                if _is_overload(e):
+                    self._on_overload()
+                if retry and isinstance(e, openai.RateLimitError) and _retry_after(e) is not None:
+                    # La cuota del despliegue está agotada: nadie vuelve a intentarlo antes de tiempo
+                    self._blocked_until = max(self._blocked_until, time.monotonic() + delay)
+                # Se libera después de actualizar el límite y el bloqueo para no despachar otra petición condenada
+                self._release()
+                if not retry:
+                    raise
+                attempt += 1
+                metrics.llm_retries.inc(source="gateway")
+                logging.warning(f"Reintento {attempt} de la llamada al modelo en {delay:.1f}s: {type(e).__name__}")
+                await asyncio.sleep(delay)
+
+    def _retry_delay(self, error: Exception, attempt: int) -> float:
+        retry_after = _retry_after(error)
+        if retry_after is not None:
+            # Un pequeño jitter evita que todas las peticiones en espera vuelvan a la vez
+            return min(self.max_delay, retry_after) + random.uniform(0, self.base_delay / 2)
+        # Backoff exponencial con "full jitter"
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    async def _acquire(self, priority: int, tokens: int) -> None:
+        waiter = _Waiter(priority, next(self._seq), tokens, asyncio.get_running_loop().create_future())
+        heapq.heappush(self._waiters, waiter)
+        self._dispatch()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # La plaza se concedió justo cuando se cancelaba la espera
+                self._release()
+            raise
+
+    def _release(self) -> None:
+        self.in_flight -= 1
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        """Concede plazas por orden de prioridad mientras haya concurrencia y cuota disponibles."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._waiters:
+            waiter = self._waiters[0]
+            if waiter.future.done():
+                heapq.heappop(self._waiters)
+                continue
+            if self.in_flight >= int(self.limit):
+                return
+            now = time.monotonic()
+            wait = max(
+                self._blocked_until - now,
+                self.requests.wait_time(1, now) if self.requests else 0.0,
+                self.tokens.wait_time(waiter.tokens, now) if self.tokens else 0.0,
+            )
+            if wait > 0:
+                self._timer = asyncio.get_running_loop().call_later(wait, self._dispatch)
+                return
+            heapq.heappop(self._waiters)
+            if self.requests:
+                self.requests.consume(1)
+            if self.tokens:
+                self.tokens.consume(waiter.tokens)
+            self.in_flight += 1
+            waiter.future.set_result(None)
+
+    def _on_success(self) -> None:
+        # Incremento aditivo: +1 por cada ventana completa de respuestas correctas
+        self.limit = min(float(self.max_concurrency), self.limit + 1 / self.limit)
+        self._dispatch()
+
+    def _on_overload(self) -> None:
+        now = time.monotonic()
+        if now - self._last_decrease < _DECREASE_INTERVAL:
+            return
+        self._last_decrease = now
+        # Reducción multiplicativa
+        self.limit = max(float(self.min_concurrency), self.limit / 2)
+
+
+def _is_overload(error: Exception) -> bool:
+    import openai
+    return isinstance(error, (openai.RateLimitError, openai.APITimeoutError))
+
+
+def _is_retryable(error: Exception) -> bool:
+    import openai
+    return isinstance(error, (openai.RateLimitError, openai.APIConnectionError, openai.InternalServerError))
+
+
+def _retry_after(error: Exception) -> float | None:
+    """Segundos indicados por el servidor en retry-after-ms o Retry-After, si los hay."""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+        if "retry-after" in headers:
+            return float(headers["retry-after"])
+    except ValueError:
+        # Retry-After también puede ser una fecha HTTP: se usa el backoff normal
+        return None
+    return None
+
+
+llm_gateway = LLMGateway(
+    LLM_RPM_LIMIT,
+    LLM_TPM_LIMIT,
+    LLM_MAX_CONCURRENCY,
+    LLM_MIN_CONCURRENCY,
+    LLM_MAX_RETRIES,
+    LLM_RETRY_BASE_DELAY,
+    LLM_RETRY_MAX_DELAY,
+)
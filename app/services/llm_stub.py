@@ -0,0 +1,150 @@
+"""
+Servidor local que imita la API de chat completions de (Azure) OpenAI.
+
+Permite probar la aplicación y medir latencia/throughput sin red ni credenciales:
+
+    LLM_STUB_LATENCY=0.5 python -m app.services.llm_stub      # escucha en 127.0.0.1:8001
+    LLM_BACKEND=stub python -m app                            # la app usa el stub
+
+Atiende tanto la ruta de OpenAI (/v1/chat/completions) como la de Azure
+(/openai/deployments/{deployment}/chat/completions) y admite stream=True.
+Además de la latencia hasta el primer token se puede simular la velocidad de
+generación (LLM_STUB_TOKENS_PER_SECOND) y respuestas 429 con Retry-After como
+las de una cuota de Azure agotada (LLM_STUB_429_RATE), p. ej. para los
+benchmarks de benchmarks/.
+"""
+import asyncio
+import json
+import os
+import random
+import re
+import time
+import uuid
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from app.utils.tokens import estimate_tokens
+
+# Latencia simulada antes del primer token (segundos)
+LLM_STUB_LATENCY = float(os.getenv("LLM_STUB_LATENCY", 0.2))
+# Tokens generados por segundo (0: la respuesta completa sin espera adicional)
+LLM_STUB_TOKENS_PER_SECOND = float(os.getenv("LLM_STUB_TOKENS_PER_SECOND", 0))
+# Fracción de peticiones rechazadas con 429 y segundos indicados en Retry-After
+LLM_STUB_429_RATE = float(os.getenv("LLM_STUB_429_RATE", 0))
+LLM_STUB_RETRY_AFTER = int(os.getenv("LLM_STUB_RETRY_AFTER", 1))
+# Longitud mínima aproximada de cada respuesta en tokens (se completa con texto de relleno)
+LLM_STUB_COMPLETION_TOKENS = int(os.getenv("LLM_STUB_COMPLETION_TOKENS", 0))
+
+_FILLER = "El sistema debe registrar cada operación y notificar al usuario responsable. "
+
+app = FastAPI(title="LLM stub")
+
+
+def fake_completion(prompt: str) -> str:
+    """Texto de respuesta determinista y con la forma esperada por cada tipo de prompt."""
+    m = re.search(r"Empieza con el encabezado '(##[^']+)'", prompt)
+    if m:
+        return f"{m.group(1)}\n\nContenido generado por el stub para esta sección.\n"
+    m = re.search(r"ESTRUCTURA DEL DOCUMENTO[^\n]*\n(.*?)\n\n", prompt, re.S)
+    if m:
+        lines = []
+        for line in m.group(1).splitlines():
+            level = "###" if re.match(r"^\d+\.\d+", line) else "##"
+            lines.append(f"{level} {line.strip()}\n\nContenido generado por el stub.\n")
+        return "\n".join(lines)
+    return "Respuesta generada por el stub de Azure OpenAI."
+
+
+def _pad(content: str) -> str:
+    missing = LLM_STUB_COMPLETION_TOKENS - estimate_tokens(content)
+    if missing <= 0:
+        return content
+    repeats = -(-missing // estimate_tokens(_FILLER))
+    return f"{content.rstrip()}\n\n{(_FILLER * repeats).strip()}\n"
+
+
+def _completion_body(model: str, content: str, prompt_tokens: int) -> dict:
+    completion_tokens = estimate_tokens(content)
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:12]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        },
+    }
+
+
+def _chunk_body(completion_id: str, model: str, delta: dict, finish_reason: str | None = None) -> str:
+    body = {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+    }
+    return f"data: {json.dumps(body, ensure_ascii=False)}\n\n"
+
+
+def _rate_limited_response() -> JSONResponse:
+    """Respuesta de Azure OpenAI cuando se supera la cuota de tokens o peticiones por minuto."""
+    message = (
+        "Requests to the ChatCompletions_Create Operation have exceeded the token rate limit of your "
+        f"current pricing tier. Please retry after {LLM_STUB_RETRY_AFTER} seconds."
+    )
+    return JSONResponse(
+        status_code=429,
+        content={"error": {"code": "429", "message": message}},
+        headers={"Retry-After": str(LLM_STUB_RETRY_AFTER)},
+    )
+
+
+def _generation_time(text: str) -> float:
+    return estimate_tokens(text) / LLM_STUB_TOKENS_PER_SECOND if LLM_STUB_TOKENS_PER_SECOND > 0 else 0.0
+
+
+async def _chat_completions(request: Request, model: str) -> JSONResponse | StreamingResponse:
+    payload = await request.json()
+    if LLM_STUB_429_RATE > 0 and random.random() < LLM_STUB_429_RATE:
+        return _rate_limited_response()
+    prompt = "\n".join(str(m.get("content", "")) for m in payload.get("messages", []))
+    content = _pad(fake_completion(prompt))
+    model = payload.get("model") or model
+    await asyncio.sleep(LLM_STUB_LATENCY)
+    if not payload.get("stream"):
+        await asyncio.sleep(_generation_time(content))
+        return JSONResponse(_completion_body(model, content, estimate_tokens(prompt)))
+
+    async def events():
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        yield _chunk_body(completion_id, model, {"role": "assistant", "content": ""})
+        for piece in re.findall(r"\S+\s*|\s+", content):
+            await asyncio.sleep(_generation_time(piece))
+            yield _chunk_body(completion_id, model, {"content": piece})
+        yield _chunk_body(completion_id, model, {}, finish_reason="stop")
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.post("/v1/chat/completions")
+async def openai_chat_completions(request: Request):
+    """Ruta estilo OpenAI."""
+    return await _chat_completions(request, "stub")
+
+
+@app.post("/openai/deployments/{deployment}/chat/completions")
+async def azure_chat_completions(deployment: str, request: Request):
+    """Ruta estilo Azure OpenAI."""
+    return await _chat_completions(request, deployment)
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host=os.getenv("LLM_STUB_HOST", "127.0.0.1"), port=int(os.getenv("LLM_STUB_PORT", 8001)))
@@ -0,0 +1,256 @@
+"""
+Métricas de la aplicación en formato de exposición de Prometheus.
+
+Registro propio y mínimo (contadores, histogramas y métricas calculadas al
+consultar) para no añadir dependencias. Cada proceso tiene su registro: con
+varios workers de uvicorn, /metrics muestra las del worker que atiende la
+petición. Lo medido en los procesos de extracción se envía al proceso
+principal con drain()/merge().
+
+Los temporizadores también anotan su duración en los tiempos de la petición
+en curso (contextvar), que el middleware puede devolver en la cabecera
+Server-Timing.
+"""
+import contextvars
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+# Límites (en segundos) por defecto de los histogramas de latencia
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+# Tiempos acumulados por nombre durante la petición en curso (None fuera de una petición)
+request_timings: contextvars.ContextVar[dict[str, float] | None] = contextvars.ContextVar("request_timings", default=None)
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    """Contador monótono con etiquetas."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values: dict[tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+    def drain(self) -> dict:
+        with self._lock:
+            values, self._values = self._values, {}
+        return values
+
+    def merge(self, values: dict) -> None:
+        with self._lock:
+            for key, value in values.items():
+                self._values[key] = self._values.get(key, 0) + value
+
+
+class Histogram:
+    """Histograma acumulativo con etiquetas (buckets, suma y número de observaciones)."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = (), buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # etiquetas -> [contadores por bucket..., suma, número]
+        self._values: dict[tuple[str, ...], list[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            state[-2] += value
+            state[-1] += 1
+
+    @contextmanager
+    def time(self, timing: str | None = None, **labels) -> Iterator[None]:
+        """Mide la duración del bloque; con timing, la suma también a los tiempos de la petición en curso."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.observe(elapsed, **labels)
+            if timing:
+                record_timing(timing, elapsed)
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            values = {k: list(v) for k, v in self._values.items()}
+        for key, state in sorted(values.items()):
+            cumulative = 0.0
+            for bound, count in zip(self.buckets, state):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {_format_value(cumulative)}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(state[-2])}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, key)} {_format_value(state[-1])}"
+
+    def drain(self) -> dict:
+        with self._lock:
+            values, self._values = self._values, {}
+        return values
+
+    def merge(self, values: dict) -> None:
+        with self._lock:
+            for key, incoming in values.items():
+                state = self._values.get(key)
+                if state is None:
+                    self._values[key] = list(incoming)
+                else:
+                    for i, value in enumerate(incoming):
+                        state[i] += value
+
+
+class Gauge:
+    """Valor calculado en el momento de la consulta (p. ej. ocupación de una caché)."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, fn: Callable[[], float]):
+        self.name = name
+        self.help = help
+        self.fn = fn
+
+    def samples(self) -> Iterator[str]:
+        yield f"{self.name} {_format_value(self.fn())}"
+
+
+class MetricsRegistry:
+    """Conjunto de métricas de este proceso."""
+
+    def __init__(self):
+        self._metrics: dict[str, Counter | Histogram | Gauge] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, help: str, labelnames: tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: tuple[str, ...] = (), buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, labelnames, buckets))
+
+    def gauge(self, name: str, help: str, fn: Callable[[], float]) -> Gauge:
+        return self._register(Gauge(name, help, fn))
+
+    def render(self) -> str:
+        """Todas las métricas en formato de texto de Prometheus (0.0.4)."""
+        lines: list[str] = []
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda m: m.name)
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+    def drain(self) -> dict:
+        """Valores acumulados desde el último drain (y los pone a cero), para enviarlos a otro proceso."""
+        with self._lock:
+            metrics = [m for m in self._metrics.values() if not isinstance(m, Gauge)]
+        return {m.name: values for m in metrics if (values := m.drain())}
+
+    def merge(self, state: dict) -> None:
+        """Suma los valores recibidos de drain() en otro proceso."""
+        with self._lock:
+            metrics = dict(self._metrics)
+        for name, values in state.items():
+            metric = metrics.get(name)
+            if metric is not None and not isinstance(metric, Gauge):
+                metric.merge(values)
+
+
+def record_timing(name: str, seconds: float) -> None:
+    """Suma la duración a los tiempos de la petición en curso (si la hay)."""
+    timings = request_timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+registry = MetricsRegistry()
+
+# Métricas de la aplicación
+http_request_duration = registry.histogram(
+    "http_request_duration_seconds", "Duración de las peticiones HTTP por ruta.", ("method", "route", "status")
+)
+extraction_duration = registry.histogram(
+    "extraction_duration_seconds", "Duración de la extracción de texto por formato.", ("format",)
+)
+extraction_bytes = registry.counter("extraction_bytes_total", "Bytes de documentos procesados por el extractor.", ("format",))
+extraction_pages = registry.counter("extraction_pages_total", "Páginas de PDF procesadas por el extractor.", ("format",))
+extraction_errors = registry.counter("extraction_errors_total", "Extracciones de texto fallidas.", ("format",))
+extraction_page_errors = registry.counter(
+    "extraction_page_errors_total", "Páginas sustituidas por un marcador al no poder extraer su texto.", ("format",)
+)
+llm_request_duration = registry.histogram(
+    "llm_request_duration_seconds", "Duración de las llamadas al modelo (hasta el final del stream).", ("kind", "outcome")
+)
+llm_tokens = registry.counter(
+    "llm_tokens_total", "Tokens de las llamadas al modelo (estimados en las respuestas en streaming).", ("kind", "type")
+)
+llm_errors = registry.counter("llm_errors_total", "Llamadas al modelo fallidas por tipo de error.", ("kind", "error"))
+llm_http_responses = registry.counter(
+    "llm_http_responses_total", "Respuestas HTTP del backend del modelo por código (incluye los reintentos).", ("status",)
+)
+llm_retries = registry.counter("llm_retries_total", "Reintentos de peticiones al modelo por origen.", ("source",))
+llm_cache_lookups = registry.counter("llm_cache_lookups_total", "Consultas a la caché de respuestas del modelo.", ("result",))
+document_tokens = registry.counter(
+    "document_tokens_total", "Tokens estimados del texto de los documentos antes y después de normalizarlo.", ("stage",)
+)
+postprocess_duration = registry.histogram(
+    "postprocess_duration_seconds", "Duración de las etapas de preparación y post-proceso del funcional.", ("step",)
+)
+export_render_duration = registry.histogram(
+    "export_render_duration_seconds", "Duración del renderizado de cada formato de exportación.", ("format",)
+)
+export_bytes = registry.counter("export_bytes_total", "Bytes de exportaciones renderizadas.", ("format",))
+export_requests = registry.counter(
+    "export_requests_total", "Descargas de exportaciones por resultado (ok, not_modified o error).", ("format", "result")
+)
+export_cache_lookups = registry.counter(
+    "export_cache_lookups_total", "Consultas a la caché de exportaciones (hit, pending o miss).", ("format", "result")
+)
@@ -1,75 +1,111 @@
 """
 Servicio para generación de análisis funcional usando Azure OpenAI.
 """
-from typing import List
+from typing import AsyncIterator, List
 import os
-import openai
-from openai import AzureOpenAI
-from docx import Document
-from PyPDF2 import PdfReader
+import re
+import logging
 import asyncio
+import time
 from pathlib import Path
 
-def extract_text_from_file(file_path: str) -> str:
-    """Extrae texto de un archivo PDF, DOCX o TXT."""
-    if file_path.lower().endswith(".pdf"):
-        try:
-            reader = PdfReader(file_path)
-            return "\n".join(page.extract_text() or "" for page in reader.pages)
-        except Exception:
-            return f"[No se pudo extraer texto del PDF: {os.path.basename(file_path)}]"
-    elif file_path.lower().endswith(".docx"):
-        try:
-            doc = Document(file_path)
-            return "\n".join(p.text for p in doc.paragraphs)
-        except Exception:
-            return f"[No se pudo extraer texto del DOCX: {os.path.basename(file_path)}]"
-    else:
-        try:
-            with open(file_path, encoding="utf-8", errors="ignore") as f:
-                return f.read()
-        except Exception:
-            return f"[No se pudo leer el archivo: {os.path.basename(file_path)}]"
+from app.services import metrics
+from app.services.extraction import extract_pages_cached, join_pages
+from app.services.generation_manifest import SectionManifest, section_manifest, text_sha256
+from app.services.llm_cache import LLM_CACHE_ENABLED, cache_key, llm_cache
+from app.services.llm_gateway import PRIORITY_BATCH, PRIORITY_INTERACTIVE, llm_gateway
+from app.services.plantillas import get_plantilla, parse_plantilla, plantilla_to_text
+from app.services.retrieval import (
+    RETRIEVAL_MAX_CONTEXT_TOKENS,
+    SECTION_CONTEXT_TOKENS,
+    BM25Index,
+    format_chunks,
+)
+from app.services.text_normalization import TEXT_NORMALIZATION_ENABLED, NormalizationReport, normalize_documents
+from app.utils.markdown_sections import MarkdownIndex
+from app.utils.tokens import estimate_tokens
+
+# Modo por defecto de generación del funcional: "single" (una sola llamada) o "sections" (una llamada por sección)
+FUNCIONAL_GENERATION_MODE = os.getenv("FUNCIONAL_GENERATION_MODE", "single")
+# Máximo de secciones generadas en paralelo en el modo "sections"
+GENERATION_SECTION_CONCURRENCY = int(os.getenv("GENERATION_SECTION_CONCURRENCY", 4))
+SECTION_MAX_TOKENS = int(os.getenv("SECTION_MAX_TOKENS", 4096))
+
+SYSTEM_PROMPT_FUNCIONAL = "Eres un asistente de IA experto en análisis funcional."
+SYSTEM_PROMPT_CHAT = "Eres un asistente de IA experto."
 
 def parse_plantilla_structure(plantilla_path: str) -> list:
-    """Parses plantilla.txt y devuelve la estructura como lista de dicts."""
-    import re
-    tree = []
-    if Path(plantilla_path).exists():
-        lines = [line.strip() for line in Path(plantilla_path).read_text(encoding="utf-8").splitlines() if line.strip()]
-        current = None
-        for line in lines:
-            m = re.match(r"^(\d+)\.\s*(.+)", line)
-            m2 = re.match(r"^(\d+)\.(\d+)\s*(.+)", line)
-            if m and not m2:
-                current = {"title": m.group(2), "num": m.group(1), "children": []}
-                tree.append(current)
-            elif m2 and current:
-                current["children"].append({"title": m2.group(3), "num": f"{m2.group(1)}.{m2.group(2)}"})
-    return tree
-
-def generate_funcional_analysis(file_paths: List[str]) -> str:
-    """Genera un análisis funcional siguiendo exactamente la estructura de plantilla.txt y usando Azure OpenAI."""
-    import re
-    estructura = parse_plantilla_structure("plantilla.txt")
-    docs_content = []
+    """Parses plantilla.txt y devuelve la estructura como lista de dicts (sin caché; ver app.services.plantillas)."""
+    path = Path(plantilla_path)
+    return parse_plantilla(path.read_text(encoding="utf-8")) if path.exists() else []
+
+def load_document_pages(file_paths: List[str]) -> list[tuple[str, list[str]]]:
+    """Devuelve (nombre, páginas extraídas) de los documentos de referencia, omitiendo el funcional generado."""
+    documents = []
     for path in file_paths:
         if os.path.basename(path) == "funcional_generado.md":
             continue
-        content = extract_text_from_file(path)
-        docs_content.append(f"# {os.path.basename(path)}\n\n{content}")
-    docs_text = "\n\n".join(docs_content)
-    # Construir plantilla como texto plano para el prompt
-    def plantilla_to_text(tree: list) -> str:
-        txt = ""
-        for node in tree:
-            txt += f"{node['num']}. {node['title']}\n"
-            for child in node.get("children", []):
-                txt += f"{child['num']} {child['title']}\n"
-        return txt.strip()
-    plantilla_text = plantilla_to_text(estructura)
-    # Construir el prompt
-    prompt = (
+        documents.append((os.path.basename(path), extract_pages_cached(path)))
+    return documents
+
+def normalization_report(file_paths: List[str]) -> list[NormalizationReport]:
+    """Tokens de cada documento de referencia antes y después de la normalización."""
+    return normalize_documents(load_document_pages(file_paths))[1]
+
+def load_documents(file_paths: List[str]) -> list[tuple[str, str]]:
+    """Devuelve (nombre, texto) de los documentos de referencia, normalizado si TEXT_NORMALIZATION_ENABLED."""
+    documents = load_document_pages(file_paths)
+    if not TEXT_NORMALIZATION_ENABLED:
+        return [(name, join_pages(pages)) for name, pages in documents]
+    normalized, reports = normalize_documents(documents)
+    for report in reports:
+        metrics.document_tokens.inc(report.tokens_before, stage="extracted")
+        metrics.document_tokens.inc(report.tokens_after, stage="normalized")
+        logging.info(
+            f"Normalización de {report.name}: {report.tokens_before} -> {report.tokens_after} tokens "
+            f"({report.repeated_lines} líneas de cabecera/pie, {report.duplicate_paragraphs} párrafos duplicados)"
+        )
+    return normalized
+
+def format_documents(documents: list[tuple[str, str]]) -> str:
+    """Concatena el texto completo de los documentos para el prompt."""
+    return "\n\n".join(f"# {name}\n\n{content}" for name, content in documents)
+
+def build_docs_context(documents: list[tuple[str, str]], estructura: list) -> str:
+    """Texto de referencia para el prompt de llamada única, acotado a RETRIEVAL_MAX_CONTEXT_TOKENS.
+
+    Si el corpus completo cabe en el presupuesto se envía íntegro; si no, se envía la unión de los
+    fragmentos más relevantes para cada sección de la plantilla.
+    """
+    full_text = format_documents(documents)
+    if estimate_tokens(full_text) <= RETRIEVAL_MAX_CONTEXT_TOKENS or not estructura:
+        return full_text
+    index = BM25Index.from_documents(documents)
+    per_section_budget = max(1, RETRIEVAL_MAX_CONTEXT_TOKENS // len(estructura))
+    selected = set()
+    for section in estructura:
+        for chunk in index.select(plantilla_to_text([section]), token_budget=per_section_budget):
+            selected.add((chunk.doc, chunk.position))
+    return format_chunks([c for c in index.chunks if (c.doc, c.position) in selected])
+
+def build_section_inputs(documents: list[tuple[str, str]], estructura: list) -> list[tuple[str, list[dict]]]:
+    """Texto de referencia de cada sección (solo los fragmentos relevantes dentro de SECTION_CONTEXT_TOKENS)
+    y las fuentes que lo forman: documento, posición del fragmento y hash de su texto."""
+    full_text = format_documents(documents)
+    if estimate_tokens(full_text) <= SECTION_CONTEXT_TOKENS:
+        sources = [{"doc": name, "sha256": text_sha256(content)} for name, content in documents]
+        return [(full_text, sources)] * len(estructura)
+    index = BM25Index.from_documents(documents)
+    inputs = []
+    for section in estructura:
+        chunks = index.select(plantilla_to_text([section]))
+        sources = [{"doc": c.doc, "position": c.position, "sha256": text_sha256(c.text)} for c in chunks]
+        inputs.append((format_chunks(chunks), sources))
+    return inputs
+
+def build_funcional_prompt(plantilla_text: str, docs_text: str) -> str:
+    """Prompt de la generación en una sola llamada: documento completo siguiendo la plantilla."""
+    return (
         "Eres un analista funcional experto. Tu tarea es generar un documento funcional en formato Markdown, siguiendo ESTRICTAMENTE la estructura dada a continuación. "
         "Para cada sección y subsección, utiliza la información relevante de los documentos proporcionados. Si no hay información suficiente para una sección, deja un marcador '(Completar sección)'. "
         "No omitas ninguna sección ni subtítulo, aunque no haya contenido.\n\n"
@@ -77,119 +113,443 @@ def generate_funcional_analysis(file_paths: List[str]) -> str:
         f"DOCUMENTOS DE REFERENCIA:\n{docs_text}\n\n"
         "Genera el documento funcional en Markdown, usando encabezados '#', '##', '###' según corresponda."
     )
+
+async def generate_funcional_analysis(file_paths: List[str], use_cache: bool = True, plantilla: str | None = None) -> str:
+    """Genera un análisis funcional siguiendo exactamente la estructura de la plantilla (por defecto plantilla.txt) y usando Azure OpenAI."""
+    template = get_plantilla(plantilla)
+    estructura = template.tree
+    documents = await asyncio.to_thread(load_documents, file_paths)
+    docs_text = await asyncio.to_thread(build_docs_context, documents, estructura)
+    # Construir el prompt
+    prompt = build_funcional_prompt(template.text, docs_text)
     # Llamada a Azure OpenAI
-    client = AzureOpenAI(
-        api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-        api_version="2023-05-15",
-        azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
+    try:
+        ai_md = await _complete(prompt, SYSTEM_PROMPT_FUNCIONAL, 4096, use_cache)
+    except Exception as e:
+        import traceback
+        # El traceback solo va al log: el resultado llega al navegador
+        logging.error(f"Error generando el análisis funcional: {e}\nTRACEBACK:\n{traceback.format_exc()}")
+        return f"[ERROR] {str(e)}"
+    return await asyncio.to_thread(validate_funcional_markdown, ai_md, estructura)
+
+def build_section_prompt(section: dict, plantilla_text: str, docs_text: str) -> str:
+    """Prompt para generar una única sección de primer nivel de la plantilla con sus subsecciones."""
+    section_text = plantilla_to_text([section])
+    return (
+        "Eres un analista funcional experto. Estás redactando un documento funcional en Markdown cuya estructura completa es la siguiente:\n"
+        f"{plantilla_text}\n\n"
+        "Genera ÚNICAMENTE la sección indicada a continuación, con todos sus subtítulos, utilizando la información relevante de los documentos proporcionados. "
+        "Si no hay información suficiente, deja un marcador '(Completar sección)'. No incluyas otras secciones, índices ni texto introductorio.\n\n"
+        f"SECCIÓN A GENERAR (usa exactamente estos títulos):\n{section_text}\n\n"
+        f"DOCUMENTOS DE REFERENCIA:\n{docs_text}\n\n"
+        f"Empieza con el encabezado '## {section['num']}. {section['title']}' y usa '###' para los subtítulos ('####' para los de niveles inferiores)."
     )
+
+def plan_section_generation(
+    documents: list[tuple[str, str]],
+    estructura: list,
+    force_full: bool = False,
+    manifest: SectionManifest = section_manifest,
+) -> list[dict]:
+    """Prompt, huella de entrada y fuentes de cada sección de primer nivel.
+
+    "reused" contiene el Markdown de la generación anterior registrada en manifest si la huella de
+    la sección no ha cambiado (y force_full es False); None si hay que generarla.
+    """
+    plantilla_text = plantilla_to_text(estructura)
+    previous = {} if force_full else manifest.load()
+    params = _completion_params(SECTION_MAX_TOKENS)
+    plan = []
+    for section, (docs_text, sources) in zip(estructura, build_section_inputs(documents, estructura)):
+        prompt = build_section_prompt(section, plantilla_text, docs_text)
+        fingerprint = _cache_key(prompt, SYSTEM_PROMPT_FUNCIONAL, params)
+        plan.append({
+            "section": section,
+            "prompt": prompt,
+            "fingerprint": fingerprint,
+            "sources": sources,
+            "reused": manifest.reusable(previous, section["num"], fingerprint),
+        })
+    return plan
+
+def save_section_manifest(plan: list[dict], sections_md: list[str], manifest: SectionManifest = section_manifest) -> None:
+    """Registra la entrada y el resultado de cada sección para la próxima regeneración incremental."""
+    manifest.save({
+        item["section"]["num"]: {
+            "title": item["section"]["title"],
+            "fingerprint": item["fingerprint"],
+            "sources": item["sources"],
+            "markdown": markdown,
+        }
+        for item, markdown in zip(plan, sections_md)
+    })
+
+async def generate_funcional_analysis_by_sections(
+    file_paths: List[str],
+    use_cache: bool = True,
+    force_full: bool = False,
+    plantilla: str | None = None,
+    manifest: SectionManifest = section_manifest,
+) -> str:
+    """Genera el análisis funcional con una llamada a Azure OpenAI por sección de primer nivel de la plantilla.
+
+    Las llamadas se lanzan en paralelo (acotadas por GENERATION_SECTION_CONCURRENCY), cada una con su
+    propio presupuesto de salida, y el resultado se ensambla en el orden de la plantilla. Las secciones
+    cuya entrada no ha cambiado desde la última generación se reutilizan sin llamar al modelo, salvo
+    con force_full.
+    """
+    estructura = get_plantilla(plantilla).tree
+    documents = await asyncio.to_thread(load_documents, file_paths)
+    plan = await asyncio.to_thread(plan_section_generation, documents, estructura, force_full, manifest)
+    semaphore = asyncio.Semaphore(max(1, GENERATION_SECTION_CONCURRENCY))
+
+    async def generate_section(item: dict) -> str:
+        if item["reused"] is not None:
+            return item["reused"]
+        async with semaphore:
+            content = await _complete(item["prompt"], SYSTEM_PROMPT_FUNCIONAL, SECTION_MAX_TOKENS, use_cache)
+        return content.strip()
+
     try:
-        response = client.chat.completions.create(
-            model=os.getenv("AZURE_OPENAI_DEPLOYMENT"),
-            messages=[
-                {"role": "system", "content": "Eres un asistente de IA experto en análisis funcional."},
-                {"role": "user", "content": prompt},
-            ],
-            temperature=0.2,
-            max_tokens=4096,
-        )
-        ai_md = response.choices[0].message.content
+        sections_md = await asyncio.gather(*(generate_section(item) for item in plan))
     except Exception as e:
         import traceback
-        tb = traceback.format_exc()
-        return f"[ERROR] {str(e)}\nTRACEBACK:\n{tb}"
-    # Validar que todas las secciones de la plantilla estén presentes
-    def section_in_output(section_title: str, output: str) -> bool:
-        # Busca el título como encabezado Markdown
-        pattern = re.compile(rf"^#+\\s*{re.escape(section_title)}", re.MULTILINE)
-        return bool(pattern.search(output))
-    # Reconstruir el markdown si falta alguna sección
-    def build_section_md(node, output):
-        md = f"\n\n## {node['num']}. {node['title']}\n"
-        if node.get("children"):
-            for child in node["children"]:
-                child_title = f"{child['num']} {child['title']}"
-                if not section_in_output(child_title, output):
-                    md += f"\n### {child['num']} {child['title']}\n(Completar sección)\n"
+        logging.error(f"Error generando el análisis funcional por secciones: {e}\nTRACEBACK:\n{traceback.format_exc()}")
+        return f"[ERROR] {str(e)}"
+    await asyncio.to_thread(save_section_manifest, plan, sections_md, manifest)
+    return await asyncio.to_thread(validate_funcional_markdown, "\n\n".join(sections_md), estructura)
+
+def _messages(prompt: str, system_prompt: str) -> list[dict]:
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": prompt},
+    ]
+
+def _completion_params(max_tokens: int) -> dict:
+    return {"model": os.getenv("AZURE_OPENAI_DEPLOYMENT"), "temperature": 0.2, "max_tokens": max_tokens}
+
+def _cache_key(prompt: str, system_prompt: str, params: dict) -> str:
+    return cache_key(params["model"], {k: v for k, v in params.items() if k != "model"}, system_prompt, prompt)
+
+def _estimated_tokens(prompt: str, system_prompt: str, max_tokens: int) -> int:
+    """Tokens que la petición descuenta de la cuota del despliegue (prompt + salida máxima)."""
+    return estimate_tokens(system_prompt) + estimate_tokens(prompt) + max_tokens
+
+async def _complete(
+    prompt: str,
+    system_prompt: str,
+    max_tokens: int,
+    use_cache: bool = True,
+    priority: int = PRIORITY_BATCH,
+) -> str:
+    """Completion no incremental a través de la pasarela del modelo, servida desde la caché de respuestas si es posible."""
+    params = _completion_params(max_tokens)
+    use_cache = use_cache and LLM_CACHE_ENABLED
+    key = _cache_key(prompt, system_prompt, params) if use_cache else None
+    if key:
+        cached = llm_cache.get(key)
+        metrics.llm_cache_lookups.inc(result="miss" if cached is None else "hit")
+        if cached is not None:
+            return cached
+    outcome = "cancelled"
+    start = time.perf_counter()
+    try:
+        response = await llm_gateway.complete(
+            priority,
+            _estimated_tokens(prompt, system_prompt, max_tokens),
+            messages=_messages(prompt, system_prompt),
+            **params,
+        )
+        outcome = "ok"
+    except Exception as e:
+        outcome = "error"
+        metrics.llm_errors.inc(kind="complete", error=type(e).__name__)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        metrics.llm_request_duration.observe(elapsed, kind="complete", outcome=outcome)
+        metrics.record_timing("llm", elapsed)
+    if response.usage is not None:
+        metrics.llm_tokens.inc(response.usage.prompt_tokens, kind="complete", type="prompt")
+        metrics.llm_tokens.inc(response.usage.completion_tokens, kind="complete", type="completion")
+    content = response.choices[0].message.content or ""
+    if key and content:
+        llm_cache.set(key, content)
+    return content
+
+async def _stream_completion(
+    prompt: str,
+    system_prompt: str,
+    max_tokens: int,
+    use_cache: bool = True,
+    priority: int = PRIORITY_BATCH,
+) -> AsyncIterator[str]:
+    """Relaya los fragmentos de texto de una completion en streaming a medida que llegan.
+
+    Si la respuesta está en caché se emite de una vez; si no, se guarda al terminar el stream completo.
+    """
+    params = _completion_params(max_tokens)
+    use_cache = use_cache and LLM_CACHE_ENABLED
+    key = _cache_key(prompt, system_prompt, params) if use_cache else None
+    if key:
+        cached = llm_cache.get(key)
+        metrics.llm_cache_lookups.inc(result="miss" if cached is None else "hit")
+        if cached is not None:
+            yield cached
+            return
+    parts: list[str] = []
+    # Un stream que se abandona a medias (cliente desconectado) cuenta como cancelado
+    outcome = "cancelled"
+    stream = llm_gateway.stream(
+        priority,
+        _estimated_tokens(prompt, system_prompt, max_tokens),
+        messages=_messages(prompt, system_prompt),
+        **params,
+    )
+    start = time.perf_counter()
+    try:
+        async for chunk in stream:
+            # Azure envía un primer chunk sin choices con los resultados del filtro de contenido
+            if chunk.choices and chunk.choices[0].delta.content:
+                parts.append(chunk.choices[0].delta.content)
+                yield chunk.choices[0].delta.content
+        outcome = "ok"
+    except Exception as e:
+        outcome = "error"
+        metrics.llm_errors.inc(kind="stream", error=type(e).__name__)
+        raise
+    finally:
+        # Libera en el momento la plaza de la pasarela si el stream se abandona a medias
+        await stream.aclose()
+        elapsed = time.perf_counter() - start
+        metrics.llm_request_duration.observe(elapsed, kind="stream", outcome=outcome)
+        metrics.record_timing("llm", elapsed)
+        # La API no devuelve el uso de tokens en streaming: se estima
+        metrics.llm_tokens.inc(estimate_tokens(system_prompt) + estimate_tokens(prompt), kind="stream", type="prompt")
+        metrics.llm_tokens.inc(estimate_tokens("".join(parts)), kind="stream", type="completion")
+    if key and parts:
+        llm_cache.set(key, "".join(parts))
+
+async def stream_funcional_analysis(
+    file_paths: List[str],
+    mode: str = FUNCIONAL_GENERATION_MODE,
+    use_cache: bool = True,
+    force_full: bool = False,
+    plantilla: str | None = None,
+    manifest: SectionManifest = section_manifest,
+) -> AsyncIterator[dict]:
+    """Genera el análisis funcional emitiendo eventos a medida que el modelo produce texto.
+
+    Eventos (campo "event"):
+      - "token": fragmento de texto ("delta") de la sección "section" (None en modo de llamada única).
+      - "section": sección de primer nivel terminada, con su Markdown ("reused" si no ha cambiado
+        desde la última generación por secciones).
+      - "done": documento final validado ("funcional").
+      - "error": la generación ha fallado ("error").
+    """
+    try:
+        template = get_plantilla(plantilla)
+        estructura, plantilla_text = template.tree, template.text
+        documents = await asyncio.to_thread(load_documents, file_paths)
+        if mode == "sections":
+            plan = await asyncio.to_thread(plan_section_generation, documents, estructura, force_full, manifest)
+            sections_md = [item["reused"] or "" for item in plan]
+            for index, item in enumerate(plan):
+                if item["reused"] is not None:
+                    yield {**_section_event(index, item["section"], item["reused"]), "reused": True}
+            pending = [i for i, item in enumerate(plan) if item["reused"] is None]
+            async for event in _stream_sections([plan[i]["section"] for i in pending], [plan[i]["prompt"] for i in pending], use_cache):
+                if event["event"] == "section":
+                    event["index"] = pending[event["index"]]
+                    sections_md[event["index"]] = event["markdown"]
+                yield event
+            await asyncio.to_thread(save_section_manifest, plan, sections_md, manifest)
+            ai_md = "\n\n".join(sections_md)
         else:
-            if not section_in_output(f"{node['num']}. {node['title']}", output):
-                md += "(Completar sección)\n"
-        return md
-    # Agregar secciones faltantes
-    validated_md = ai_md
-    for section in estructura:
-        # Sección principal
-        if not section_in_output(f"{section['num']}. {section['title']}", validated_md):
-            validated_md += build_section_md(section, validated_md)
-        # Subsecciones
-        for child in section.get("children", []):
-            child_title = f"{child['num']} {child['title']}"
-            if not section_in_output(child_title, validated_md):
-                validated_md += f"\n### {child['num']} {child['title']}\n(Completar sección)\n"
-    # Eliminar cualquier índice textual del árbol de contenidos al final del documento funcional
-    def remove_content_tree_index(md: str) -> str:
-        import re
-        # Busca un bloque que empiece por 'Índice' o 'Árbol de contenidos' y lo elimina
-        pattern = re.compile(r"(^#+\s*(Índice|Índice de contenidos|Árbol de contenidos)[\s\S]+?)(?=^#|\Z)", re.MULTILINE | re.IGNORECASE)
-        return re.sub(pattern, '', md).strip()
-    validated_md = remove_content_tree_index(validated_md)
-    # Eliminar cualquier índice textual que aparezca después del glosario
-    def remove_index_after_glossary(md: str) -> str:
-        import re
-        # Busca el encabezado del glosario
-        glossary_pattern = re.compile(r"^(#+\s*9\.\s*Glosario.*)$", re.MULTILINE | re.IGNORECASE)
-        match = glossary_pattern.search(md)
-        if not match:
-            return md
-        glossary_end = match.end()
-        # Busca el primer encabezado de sección después del glosario
-        next_header = re.search(r"^#+\s*\d+\.\s*", md[glossary_end:], re.MULTILINE)
-        if next_header:
-            # Hay otra sección después del glosario, no eliminar nada
-            return md
-        # Si no hay más secciones, elimina cualquier bloque de índice textual después del glosario
-        # Busca patrones típicos de índice textual
-        index_pattern = re.compile(r"(^#+\s*(Índice|Índice de contenidos|Árbol de contenidos)[\s\S]+$)", re.MULTILINE | re.IGNORECASE)
-        before = md[:glosario_end]
-        after = md[glosario_end:]
-        after = re.sub(index_pattern, '', after).strip()
-        return before + after
-    validated_md = remove_index_after_glossary(validated_md)
-    # Eliminar cualquier índice textual (Índice, Índice de contenidos, Árbol de contenidos) al final del documento
-    def remove_trailing_index(md: str) -> str:
-        import re
-        # Busca un bloque de índice al final del documento (después del último encabezado real)
-        pattern = re.compile(r"(^#+\s*(Índice|Índice de contenidos|Árbol de contenidos)[\s\S]*$)", re.MULTILINE | re.IGNORECASE)
-        return re.sub(pattern, '', md).rstrip()
-    validated_md = remove_trailing_index(validated_md)
-    return validated_md.strip()
-
-async def ask_azure_openai(message: str, document_content: str) -> str:
-    """Consulta Azure OpenAI con o sin contexto de documento funcional."""
+            docs_text = await asyncio.to_thread(build_docs_context, documents, estructura)
+            prompt = build_funcional_prompt(plantilla_text, docs_text)
+            parts: list[str] = []
+            line_buffer = ""
+            current_section: dict | None = None
+
+            def finished_sections(lines: list[str]) -> list[dict]:
+                """Una sección de primer nivel termina cuando empieza la siguiente."""
+                nonlocal current_section
+                finished = []
+                for line in lines:
+                    m = _TOP_HEADING_RE.match(line)
+                    if m:
+                        if current_section:
+                            finished.append({"event": "section", **current_section})
+                        current_section = {"section": m.group(1), "title": line.lstrip("# ").strip()}
+                return finished
+
+            async for delta in _stream_completion(prompt, SYSTEM_PROMPT_FUNCIONAL, 4096, use_cache):
+                parts.append(delta)
+                yield {"event": "token", "section": None, "delta": delta}
+                *lines, line_buffer = (line_buffer + delta).split("\n")
+                for event in finished_sections(lines):
+                    yield event
+            # La última línea puede no terminar en salto de línea
+            for event in finished_sections([line_buffer]):
+                yield event
+            if current_section:
+                yield {"event": "section", **current_section}
+            ai_md = "".join(parts)
+        validated_md = await asyncio.to_thread(validate_funcional_markdown, ai_md, estructura)
+    except Exception as e:
+        import traceback
+        logging.error(f"Error generando en streaming el análisis funcional: {e}\nTRACEBACK:\n{traceback.format_exc()}")
+        yield {"event": "error", "error": str(e)}
+        return
+    yield {"event": "done", "funcional": validated_md}
+
+_TOP_HEADING_RE = re.compile(r"^#{1,2}\s*(\d+)\.\s")
+
+def _section_event(index: int, section: dict, markdown: str) -> dict:
+    return {
+        "event": "section",
+        "index": index,
+        "section": section["num"],
+        "title": f"{section['num']}. {section['title']}",
+        "markdown": markdown,
+    }
+
+async def _stream_sections(estructura: list, prompts: list[str], use_cache: bool = True) -> AsyncIterator[dict]:
+    """Lanza en paralelo una completion en streaming por sección y entrelaza sus eventos."""
+    queue: asyncio.Queue = asyncio.Queue()
+    semaphore = asyncio.Semaphore(max(1, GENERATION_SECTION_CONCURRENCY))
+
+    async def run(index: int, section: dict, prompt: str) -> None:
+        parts: list[str] = []
+        try:
+            async with semaphore:
+                async for delta in _stream_completion(prompt, SYSTEM_PROMPT_FUNCIONAL, SECTION_MAX_TOKENS, use_cache):
+                    parts.append(delta)
+                    await queue.put({"event": "token", "section": section["num"], "delta": delta})
+        except Exception as e:
+            await queue.put({"event": "_failed", "exception": e})
+            return
+        await queue.put(_section_event(index, section, "".join(parts).strip()))
+
+    tasks = [asyncio.create_task(run(i, section, prompt)) for i, (section, prompt) in enumerate(zip(estructura, prompts))]
+    remaining = len(tasks)
+    try:
+        while remaining:
+            event = await queue.get()
+            if event["event"] == "_failed":
+                # El primer error de cualquier sección aborta la generación
+                raise event["exception"]
+            if event["event"] == "section":
+                remaining -= 1
+            yield event
+    finally:
+        for task in tasks:
+            task.cancel()
+
+# Encabezados de índices textuales que el modelo añade a veces y que no forman parte del funcional
+_TEXT_INDEX_TITLE_RE = re.compile(r"^(Índice|Índice de contenidos|Árbol de contenidos)\b", re.IGNORECASE)
+
+@metrics.postprocess_duration.time("postprocess", step="validate")
+def validate_funcional_markdown(ai_md: str, estructura: list) -> str:
+    """Completa las secciones de la plantilla que falten y elimina los índices textuales generados.
+
+    El documento se indexa una sola vez (ver app.utils.markdown_sections) y las secciones se
+    localizan por su número. Las que faltan se insertan en su posición según la plantilla, con
+    el marcador '(Completar sección)'. Los índices textuales se eliminan; si aparecen después de la
+    última sección de la plantilla (p. ej. tras el glosario) se elimina todo lo que les sigue.
+    """
+    index = MarkdownIndex(ai_md)
+    last_section = index.by_number(estructura[-1]["num"]) if estructura else None
+    removed: list[tuple[int, int]] = []
+    for section in index.sections:
+        if not _TEXT_INDEX_TITLE_RE.match(section.title):
+            continue
+        if last_section is not None and section.start > last_section.start:
+            removed.append((section.start, len(ai_md)))
+            break
+        removed.append((section.start, section.end))
+    present = {}
+    for section in index.sections:
+        number = section.number
+        if number is not None and number not in present and not any(a <= section.start < b for a, b in removed):
+            present[number] = section
+
+    insertions: list[tuple[int, str]] = []
+
+    def fill(nodes: list, container_end: int, level: int) -> None:
+        for k, node in enumerate(nodes):
+            section = present.get(node["num"])
+            if section is not None:
+                fill(node.get("children", []), section.subtree_end, level + 1)
+                continue
+            # Antes de la siguiente sección hermana presente o al final de la sección contenedora
+            position = next((present[n["num"]].start for n in nodes[k + 1:] if n["num"] in present), container_end)
+            insertions.append((position, _missing_section_md(node, level)))
+
+    fill(estructura, len(ai_md), 2)
+    return _apply_edits(ai_md, removed, insertions).strip()
+
+def _missing_section_md(node: dict, level: int) -> str:
+    """Markdown de una sección ausente de la plantilla, con sus subsecciones."""
+    separator = "." if "." not in node["num"] else ""
+    md = f"{'#' * min(level, 6)} {node['num']}{separator} {node['title']}\n"
+    children = node.get("children", [])
+    if not children:
+        return md + "\n(Completar sección)\n"
+    return md + "".join("\n" + _missing_section_md(child, level + 1) for child in children)
+
+def _apply_edits(md: str, removed: list[tuple[int, int]], insertions: list[tuple[int, str]]) -> str:
+    """Aplica en una sola pasada los rangos eliminados y los bloques insertados (offsets sobre md)."""
+    def clamp(position: int) -> int:
+        # Un bloque insertado dentro de un rango eliminado se coloca al comienzo del rango
+        for a, b in removed:
+            if a < position <= b:
+                return a
+        return position
+
+    # En una misma posición: primero los bloques insertados, en el orden en que se generaron
+    edits = sorted(
+        [(clamp(pos), 0, seq, pos, text) for seq, (pos, text) in enumerate(insertions)]
+        + [(a, 1, 0, b, "") for a, b in removed]
+    )
+    parts: list[str] = []
+    cursor = 0
+    for position, kind, _, extra, text in edits:
+        if position > cursor:
+            parts.append(md[cursor:position])
+            cursor = position
+        if kind == 1:
+            cursor = max(cursor, extra)
+            continue
+        tail = "".join(parts[-2:])
+        prefix = "" if not tail or tail.endswith("\n\n") else ("\n" if tail.endswith("\n") else "\n\n")
+        parts.append(prefix + text + "\n")
+    parts.append(md[cursor:])
+    return "".join(parts)
+
+def build_chat_prompt(message: str, document_content: str) -> str:
+    """Prompt del chatbot con o sin contexto de documento funcional."""
     if document_content.strip():
-        prompt = (
+        return (
             "Eres un asistente experto en análisis funcional. Responde la consulta del usuario usando únicamente la información relevante del siguiente documento funcional en Markdown.\n\n"
             f"DOCUMENTO FUNCIONAL:\n{document_content}\n\n"
             f"PREGUNTA DEL USUARIO: {message}"
         )
-    else:
-        prompt = (
-            "Eres un asistente de IA. Responde la consulta del usuario de forma clara y útil.\n\n"
-            f"PREGUNTA DEL USUARIO: {message}"
-        )
-    client = AzureOpenAI(
-        api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-        api_version="2023-05-15",
-        azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
+    return (
+        "Eres un asistente de IA. Responde la consulta del usuario de forma clara y útil.\n\n"
+        f"PREGUNTA DEL USUARIO: {message}"
     )
-    response = await asyncio.to_thread(
-        client.chat.completions.create,
-        model=os.getenv("AZURE_OPENAI_DEPLOYMENT"),
-        messages=[
-            {"role": "system", "content": "Eres un asistente de IA experto."},
-            {"role": "user", "content": prompt},
-        ],
-        temperature=0.2,
-        max_tokens=1024,
+
+async def ask_azure_openai(message: str, document_content: str, use_cache: bool = True) -> str:
+    """Consulta Azure OpenAI con o sin contexto de documento funcional."""
+    return await _complete(
+        build_chat_prompt(message, document_content), SYSTEM_PROMPT_CHAT, 1024, use_cache, PRIORITY_INTERACTIVE
     )
-    return response.choices[0].message.content
+
+async def stream_azure_openai(message: str, document_content: str, use_cache: bool = True) -> AsyncIterator[str]:
+    """Como ask_azure_openai, pero devuelve los fragmentos de la respuesta a medida que se generan."""
+    async for delta in _stream_completion(
+        build_chat_prompt(message, document_content), SYSTEM_PROMPT_CHAT, 1024, use_cache, PRIORITY_INTERACTIVE
+    ):
+        yield delta
@@ -0,0 +1,223 @@
+"""
+Maquetación del documento funcional en PDF.
+
+Los anchos de glifo de cada fuente y estilo se calculan una sola vez por
+proceso (tabla carácter -> ancho a 1 pt) y el corte de líneas suma anchos
+acumulados, sin medir prefijos crecientes con FPDF.
+
+Por defecto se usa la fuente Helvetica estándar con el juego de caracteres
+Latin-1, que incluye los acentos y signos del castellano y es la opción más
+rápida. Con PDF_FONT_PATH (ruta a un .ttf, o "auto" para buscar una fuente del
+sistema conocida) el texto se escribe en Unicode con esa fuente TrueType.
+"""
+import os
+import threading
+from pathlib import Path
+
+from fpdf import FPDF
+from fpdf.enums import XPos, YPos
+
+from app.utils.markdown_sections import MarkdownIndex
+
+# Fuente TrueType para el cuerpo ("" = Helvetica estándar, "auto" = buscar en el sistema);
+# las variantes negrita/cursiva son opcionales
+PDF_FONT_PATH = os.getenv("PDF_FONT_PATH", "")
+PDF_FONT_BOLD_PATH = os.getenv("PDF_FONT_BOLD_PATH", "")
+PDF_FONT_ITALIC_PATH = os.getenv("PDF_FONT_ITALIC_PATH", "")
+
+# (regular, negrita, cursiva) buscadas con PDF_FONT_PATH=auto
+_SYSTEM_FONTS = [
+    (
+        "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+        "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf",
+        "/usr/share/fonts/truetype/dejavu/DejaVuSans-Oblique.ttf",
+    ),
+    (
+        "/usr/share/fonts/truetype/liberation/LiberationSans-Regular.ttf",
+        "/usr/share/fonts/truetype/liberation/LiberationSans-Bold.ttf",
+        "/usr/share/fonts/truetype/liberation/LiberationSans-Italic.ttf",
+    ),
+    ("C:/Windows/Fonts/arial.ttf", "C:/Windows/Fonts/arialbd.ttf", "C:/Windows/Fonts/ariali.ttf"),
+    ("/Library/Fonts/Arial.ttf", "/Library/Fonts/Arial Bold.ttf", "/Library/Fonts/Arial Italic.ttf"),
+]
+
+CORE_FAMILY = "Helvetica"
+TTF_FAMILY = "Body"
+TITLE_COLOR = (30, 64, 175)
+TEXT_COLOR = (34, 34, 34)
+BULLET_INDENT = 5
+# (tamaño de letra, alto de línea) por nivel de encabezado; el resto usa el último
+_HEADING_STYLES = {1: (16, 10), 2: (14, 8), 3: (12, 7)}
+_MINOR_HEADING_STYLE = (11, 6)
+_BODY_STYLE = (12, 7)
+
+# Sustituciones para la fuente estándar, que solo admite Latin-1
+_LATIN1_FALLBACKS = str.maketrans({
+    "\u2018": "'", "\u2019": "'", "\u201c": '"', "\u201d": '"',
+    "\u2013": "-", "\u2014": "-", "\u2022": "-", "\u2026": "...", "\u00a0": " ", "\t": " ",
+})
+
+
+def _font_files() -> tuple[str, str, str] | None:
+    """Ficheros (regular, negrita, cursiva) de la fuente TrueType a usar, o None para la fuente estándar."""
+    if not PDF_FONT_PATH:
+        return None
+    if PDF_FONT_PATH != "auto":
+        return (PDF_FONT_PATH, PDF_FONT_BOLD_PATH or PDF_FONT_PATH, PDF_FONT_ITALIC_PATH or PDF_FONT_PATH)
+    for regular, bold, italic in _SYSTEM_FONTS:
+        if Path(regular).exists():
+            return (regular, bold if Path(bold).exists() else regular, italic if Path(italic).exists() else regular)
+    return None
+
+
+class GlyphWidths:
+    """Tabla de anchos de glifo (en puntos, a 1 pt de tamaño) de una fuente y estilo."""
+
+    def __init__(self, font, unicode: bool):
+        self._font = font
+        self.unicode = unicode
+        self._widths: dict[str, float] = {}
+        # Latin-1 imprimible precalculado; el resto se añade la primera vez que aparece
+        for code in list(range(32, 127)) + list(range(160, 256)):
+            self.char_width(chr(code))
+
+    def char_width(self, ch: str) -> float:
+        width = self._widths.get(ch)
+        if width is None:
+            width = self._font.get_text_width(ch, 1, None)[1]
+            self._widths[ch] = width
+        return width
+
+    def text_width(self, text: str) -> float:
+        widths = self._widths
+        return sum(widths[c] if c in widths else self.char_width(c) for c in text)
+
+    def sanitize(self, text: str) -> str:
+        """Adapta el texto a los caracteres que la fuente puede representar."""
+        text = text.replace("\t", " ")
+        if self.unicode:
+            return text
+        text = text.translate(_LATIN1_FALLBACKS)
+        return "".join(c if c in self._widths else "?" for c in text)
+
+
+# (fichero o familia estándar, estilo) -> tabla, compartida entre exportaciones
+_glyph_tables: dict[tuple[str, str], GlyphWidths] = {}
+_tables_lock = threading.Lock()
+
+
+def wrap_text(text: str, glyphs: GlyphWidths, size: float, max_width: float) -> list[str]:
+    """Corta el texto en líneas que caben en max_width (unidades de página) a ese tamaño.
+
+    Corte voraz por palabras sumando anchos acumulados; las palabras más largas que la línea
+    se parten por caracteres. Cada carácter se mide una sola vez.
+    """
+    limit = max_width / size
+    space = glyphs.char_width(" ")
+    lines: list[str] = []
+    current: list[str] = []
+    current_width = 0.0
+    for word in text.split(" "):
+        word_width = glyphs.text_width(word)
+        if word_width > limit:
+            # Palabra más larga que una línea: se cierra la línea actual y se trocea
+            if current:
+                lines.append(" ".join(current))
+                current, current_width = [], 0.0
+            piece_start, piece_width = 0, 0.0
+            for i, ch in enumerate(word):
+                w = glyphs.char_width(ch)
+                if piece_width + w > limit and i > piece_start:
+                    lines.append(word[piece_start:i])
+                    piece_start, piece_width = i, 0.0
+                piece_width += w
+            current, current_width = [word[piece_start:]], piece_width
+            continue
+        needed = word_width if not current else current_width + space + word_width
+        if needed <= limit:
+            current.append(word)
+            current_width = needed
+        else:
+            lines.append(" ".join(current))
+            current, current_width = [word], word_width
+    if current:
+        lines.append(" ".join(current))
+    return lines
+
+
+class FuncionalPDF(FPDF):
+    """PDF del documento funcional con cabecera fija y tablas de anchos compartidas."""
+
+    def __init__(self):
+        super().__init__()
+        files = _font_files()
+        self.body_family = CORE_FAMILY
+        self._font_key = CORE_FAMILY
+        if files is not None:
+            regular, bold, italic = files
+            self.add_font(TTF_FAMILY, "", regular)
+            self.add_font(TTF_FAMILY, "B", bold)
+            self.add_font(TTF_FAMILY, "I", italic)
+            self.body_family = TTF_FAMILY
+            self._font_key = regular
+        self.set_auto_page_break(auto=True, margin=15)
+
+    def glyphs(self, style: str) -> GlyphWidths:
+        """Tabla de anchos de la fuente del cuerpo en el estilo indicado ("", "B" o "I")."""
+        key = (self._font_key, style)
+        table = _glyph_tables.get(key)
+        if table is None:
+            self.set_font(self.body_family, style, 12)
+            with _tables_lock:
+                table = _glyph_tables.setdefault(key, GlyphWidths(self.current_font, self.body_family == TTF_FAMILY))
+        return table
+
+    def header(self):
+        self.set_font(self.body_family, 'B', 14)
+        self.set_text_color(*TITLE_COLOR)
+        self.cell(0, 10, 'Documento Funcional', new_x=XPos.LMARGIN, new_y=YPos.NEXT, align='C')
+        self.ln(4)
+
+    def write_wrapped(self, text: str, style: str, size: float, line_height: float, indent: float = 0) -> None:
+        """Corta el párrafo con las tablas de anchos y lo escribe con una celda por línea."""
+        glyphs = self.glyphs(style)
+        self.set_font(self.body_family, style, size)
+        max_width = self.w - self.l_margin - self.r_margin - indent
+        for line in wrap_text(glyphs.sanitize(text), glyphs, size / self.k, max_width):
+            if indent:
+                self.set_x(self.l_margin + indent)
+            self.cell(max_width, line_height, line, new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+
+
+def render_funcional_pdf(content: str) -> bytes:
+    """Convierte el Markdown del funcional en un PDF (encabezados, listas, negrita y cursiva de línea completa)."""
+    pdf = FuncionalPDF()
+    pdf.add_page()
+    document = MarkdownIndex(content)
+
+    def write_body(text: str) -> None:
+        if not text:
+            return
+        pdf.set_text_color(*TEXT_COLOR)
+        size, line_height = _BODY_STYLE
+        for line in text.removesuffix("\n").split("\n"):
+            line = line.rstrip("\r").strip()
+            if not line:
+                pdf.ln(4)
+            elif line.startswith("- "):
+                pdf.write_wrapped(f"- {line[2:]}", "", size, line_height, indent=BULLET_INDENT)
+            elif len(line) > 4 and line.startswith("**") and line.endswith("**"):
+                pdf.write_wrapped(line[2:-2], "B", size, line_height)
+            elif len(line) > 2 and line.startswith("*") and line.endswith("*"):
+                pdf.write_wrapped(line[1:-1], "I", size, line_height)
+            else:
+                pdf.write_wrapped(line, "", size, line_height)
+
+    write_body(document.preamble)
+    for section in document.sections:
+        if section.title:
+            size, line_height = _HEADING_STYLES.get(section.level, _MINOR_HEADING_STYLE)
+            pdf.set_text_color(*TITLE_COLOR)
+            pdf.write_wrapped(section.title, "B", size, line_height)
+        write_body(section.body(content))
+    return bytes(pdf.output())
@@ -0,0 +1,148 @@
+"""
+Plantillas de estructura del documento funcional (plantilla.txt y plantillas con nombre).
+
+Cada plantilla se parsea una sola vez a un árbol de secciones numeradas de
+profundidad arbitraria ("1.", "1.1", "1.1.1"...) y queda en caché en memoria. La
+caché se invalida cuando cambia el mtime/tamaño del fichero, comprobándolo como
+mucho cada PLANTILLA_RECHECK_SECONDS para que las lecturas frecuentes no toquen
+el disco.
+
+La plantilla "default" es plantilla.txt; el resto son los ficheros .txt de
+PLANTILLAS_DIR, seleccionables por nombre en cada generación.
+"""
+import hashlib
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+PLANTILLA_PATH = Path(os.getenv("PLANTILLA_PATH", "plantilla.txt"))
+PLANTILLAS_DIR = Path(os.getenv("PLANTILLAS_DIR", "plantillas"))
+PLANTILLA_RECHECK_SECONDS = float(os.getenv("PLANTILLA_RECHECK_SECONDS", 2))
+DEFAULT_PLANTILLA = "default"
+
+# "1. Título" (el punto es obligatorio en el primer nivel) o "1.1 Título", "1.1.1. Título"...: el título no
+# empieza por una cifra, para que líneas como "2023 objetivos" o "10 usuarios concurrentes" no sean secciones
+_LINE_RE = re.compile(r"^(?:(\d+)\.|(\d+(?:\.\d+)+)\.?)\s*([^\d\s].*)$")
+_NAME_RE = re.compile(r"^[\w-]+$")
+
+
+class PlantillaNotFoundError(LookupError):
+    """No existe una plantilla con ese nombre."""
+
+
+def parse_plantilla(text: str) -> list[dict]:
+    """Convierte el texto de una plantilla en un árbol [{"num", "title", "children"}].
+
+    La profundidad de cada sección es la de su numeración; las líneas sin número se ignoran.
+    """
+    tree: list[dict] = []
+    # Último nodo visto en cada profundidad
+    open_nodes: list[dict] = []
+    for line in text.splitlines():
+        m = _LINE_RE.match(line.strip())
+        if not m:
+            continue
+        num, title = m.group(1) or m.group(2), m.group(3).strip()
+        depth = num.count(".")
+        node = {"num": num, "title": title, "children": []}
+        del open_nodes[depth:]
+        # Se cuelga del antecesor abierto más profundo (o de la raíz si no hay ninguno)
+        (open_nodes[-1]["children"] if open_nodes else tree).append(node)
+        open_nodes.append(node)
+    return tree
+
+
+def plantilla_to_text(tree: list, depth: int = 0) -> str:
+    """Construye la plantilla como texto plano para el prompt."""
+    lines = []
+    for node in tree:
+        separator = "." if depth == 0 else ""
+        lines.append(f"{node['num']}{separator} {node['title']}")
+        if node.get("children"):
+            lines.append(plantilla_to_text(node["children"], depth + 1))
+    return "\n".join(lines)
+
+
+@dataclass(frozen=True)
+class Plantilla:
+    """Plantilla parseada: árbol de secciones, texto para el prompt y hash del contenido."""
+
+    name: str
+    path: Path
+    tree: list
+    text: str
+    digest: str
+
+
+class PlantillaStore:
+    """Caché en memoria de las plantillas, invalidada por mtime/tamaño del fichero."""
+
+    def __init__(self, default_path: Path, directory: Path, recheck_seconds: float):
+        self.default_path = default_path
+        self.directory = directory
+        self.recheck_seconds = recheck_seconds
+        self._lock = threading.Lock()
+        # nombre -> (momento de la última comprobación, (mtime_ns, tamaño), plantilla)
+        self._cache: dict[str, tuple[float, tuple[int, int] | None, Plantilla]] = {}
+
+    def path_for(self, name: str | None) -> Path:
+        """Ruta del fichero de la plantilla con ese nombre."""
+        if not name or name == DEFAULT_PLANTILLA:
+            return self.default_path
+        if not _NAME_RE.match(name):
+            raise PlantillaNotFoundError(name)
+        return self.directory / f"{name}.txt"
+
+    def names(self) -> list[str]:
+        """Nombres de las plantillas disponibles."""
+        names = [DEFAULT_PLANTILLA]
+        if self.directory.is_dir():
+            names.extend(sorted(p.stem for p in self.directory.glob("*.txt") if _NAME_RE.match(p.stem)))
+        return names
+
+    def get(self, name: str | None = None) -> Plantilla:
+        """Devuelve la plantilla, leyéndola de disco solo si ha cambiado desde la última vez.
+
+        La plantilla por defecto inexistente se trata como vacía (como hasta ahora); una plantilla
+        con nombre inexistente lanza PlantillaNotFoundError.
+        """
+        name = name or DEFAULT_PLANTILLA
+        now = time.monotonic()
+        with self._lock:
+            cached = self._cache.get(name)
+        if cached is not None and now - cached[0] < self.recheck_seconds:
+            return cached[2]
+        path = self.path_for(name)
+        try:
+            st = path.stat()
+            stamp = (st.st_mtime_ns, st.st_size)
+        except FileNotFoundError:
+            if name != DEFAULT_PLANTILLA:
+                raise PlantillaNotFoundError(name)
+            stamp = None
+        if cached is not None and cached[1] == stamp:
+            plantilla = cached[2]
+        else:
+            content = path.read_text(encoding="utf-8") if stamp is not None else ""
+            tree = parse_plantilla(content)
+            plantilla = Plantilla(
+                name=name,
+                path=path,
+                tree=tree,
+                text=plantilla_to_text(tree),
+                digest=hashlib.sha256(content.encode("utf-8")).hexdigest(),
+            )
+        with self._lock:
+            self._cache[name] = (now, stamp, plantilla)
+        return plantilla
+
+
+plantilla_store = PlantillaStore(PLANTILLA_PATH, PLANTILLAS_DIR, PLANTILLA_RECHECK_SECONDS)
+
+
+def get_plantilla(name: str | None = None) -> Plantilla:
+    """Plantilla por nombre (por defecto plantilla.txt) desde la caché compartida."""
+    return plantilla_store.get(name)
@@ -0,0 +1,175 @@
+"""
+Índice local de relevancia (BM25) sobre el texto extraído de los documentos.
+
+Los documentos se trocean en fragmentos de tamaño acotado y, para cada sección
+de la plantilla, se seleccionan los fragmentos más relevantes dentro de un
+presupuesto de tokens. No necesita red ni servicios de embeddings: el cálculo de
+puntuaciones está vectorizado con NumPy sobre un índice invertido en memoria
+(NumPy se importa al construir el primer índice).
+"""
+import math
+import os
+import re
+import unicodedata
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+from app.utils.tokens import estimate_tokens
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# Tamaño objetivo de cada fragmento de documento
+RETRIEVAL_CHUNK_TOKENS = int(os.getenv("RETRIEVAL_CHUNK_TOKENS", 400))
+# Número máximo de fragmentos por sección
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", 12))
+# Presupuesto de tokens de documentos en el prompt de cada sección
+SECTION_CONTEXT_TOKENS = int(os.getenv("SECTION_CONTEXT_TOKENS", 6000))
+# Presupuesto total de tokens de documentos en el prompt del modo de llamada única
+RETRIEVAL_MAX_CONTEXT_TOKENS = int(os.getenv("RETRIEVAL_MAX_CONTEXT_TOKENS", 24000))
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+_STOPWORDS = frozenset(
+    "de la que el en y a los del se las por un para con no una su al lo como mas pero sus le ya o "
+    "este ha si porque esta son entre cuando muy sin sobre ser tiene tambien me hasta hay donde "
+    "quien desde todo nos durante todos uno les ni contra otros ese eso ante ellos e esto antes "
+    "algunos que unos yo otro otras otra el tanto esa estos mucho quienes nada muchos cual poco "
+    "ella estar estas algunas algo nosotros the of and to in is for on with".split()
+)
+
+
+def tokenize(text: str) -> list[str]:
+    """Normaliza (minúsculas, sin tildes) y divide el texto en términos, descartando palabras vacías."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return [w for w in _WORD_RE.findall(text) if len(w) > 1 and w not in _STOPWORDS]
+
+
+@dataclass
+class Chunk:
+    """Fragmento contiguo de un documento."""
+
+    doc: str
+    position: int
+    text: str
+    tokens: int
+
+
+def chunk_text(doc: str, text: str, max_tokens: int = RETRIEVAL_CHUNK_TOKENS) -> list[Chunk]:
+    """Divide un documento en fragmentos por párrafos, sin superar max_tokens por fragmento."""
+    max_chars = max_tokens * 4
+    pieces: list[str] = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        if len(paragraph) <= max_chars:
+            pieces.append(paragraph)
+            continue
+        # Párrafos muy largos (p. ej. PDFs sin saltos): se cortan por palabras
+        words, current, size = paragraph.split(), [], 0
+        for word in words:
+            if current and size + len(word) + 1 > max_chars:
+                pieces.append(" ".join(current))
+                current, size = [], 0
+            current.append(word)
+            size += len(word) + 1
+        if current:
+            pieces.append(" ".join(current))
+    chunks: list[Chunk] = []
+    current_parts: list[str] = []
+    current_size = 0
+    for piece in pieces:
+        if current_parts and current_size + len(piece) + 2 > max_chars:
+            joined = "\n\n".join(current_parts)
+            chunks.append(Chunk(doc, len(chunks), joined, estimate_tokens(joined)))
+            current_parts, current_size = [], 0
+        current_parts.append(piece)
+        current_size += len(piece) + 2
+    if current_parts:
+        joined = "\n\n".join(current_parts)
+        chunks.append(Chunk(doc, len(chunks), joined, estimate_tokens(joined)))
+    return chunks
+
+
+class BM25Index:
+    """Índice invertido BM25 sobre los fragmentos de un conjunto de documentos."""
+
+    def __init__(self, chunks: list[Chunk], k1: float = 1.5, b: float = 0.75):
+        import numpy as np
+        self.chunks = chunks
+        self.k1 = k1
+        n = len(chunks)
+        postings: dict[str, dict[int, int]] = {}
+        doc_len = np.zeros(n, dtype=np.float64)
+        for i, chunk in enumerate(chunks):
+            terms = tokenize(chunk.text)
+            doc_len[i] = len(terms)
+            for term in terms:
+                row = postings.setdefault(term, {})
+                row[i] = row.get(i, 0) + 1
+        avgdl = float(doc_len.mean()) if n and doc_len.mean() > 0 else 1.0
+        # Denominador de normalización por longitud, precalculado por fragmento
+        self._norm = k1 * (1 - b + b * doc_len / avgdl)
+        self._postings: dict[str, tuple["np.ndarray", "np.ndarray", float]] = {}
+        for term, row in postings.items():
+            idx = np.fromiter(row.keys(), dtype=np.int64, count=len(row))
+            tf = np.fromiter(row.values(), dtype=np.float64, count=len(row))
+            idf = math.log(1 + (n - len(row) + 0.5) / (len(row) + 0.5))
+            self._postings[term] = (idx, tf, idf)
+        self.total_tokens = sum(c.tokens for c in chunks)
+
+    @classmethod
+    def from_documents(cls, documents: list[tuple[str, str]]) -> "BM25Index":
+        """Construye el índice a partir de pares (nombre, texto)."""
+        chunks: list[Chunk] = []
+        for name, text in documents:
+            chunks.extend(chunk_text(name, text))
+        return cls(chunks)
+
+    def scores(self, query: str) -> "np.ndarray":
+        """Puntuación BM25 de cada fragmento para la consulta."""
+        import numpy as np
+        scores = np.zeros(len(self.chunks), dtype=np.float64)
+        for term in set(tokenize(query)):
+            posting = self._postings.get(term)
+            if posting is None:
+                continue
+            idx, tf, idf = posting
+            scores[idx] += idf * tf * (self.k1 + 1) / (tf + self._norm[idx])
+        return scores
+
+    def select(self, query: str, top_k: int = RETRIEVAL_TOP_K, token_budget: int = SECTION_CONTEXT_TOKENS) -> list[Chunk]:
+        """Selecciona hasta top_k fragmentos relevantes sin superar token_budget.
+
+        Si no hay suficientes fragmentos con puntuación positiva, se completa con el
+        comienzo de cada documento. El resultado se devuelve en el orden original.
+        """
+        scores = self.scores(query)
+        ranked = [int(i) for i in (-scores).argsort(kind="stable") if scores[i] > 0]
+        # Relleno: primeros fragmentos de cada documento, alternando documentos
+        fallback = sorted(range(len(self.chunks)), key=lambda i: self.chunks[i].position)
+        picked: list[int] = []
+        seen: set[int] = set()
+        used = 0
+        for i in ranked + fallback:
+            if len(picked) >= top_k:
+                break
+            if i in seen or used + self.chunks[i].tokens > token_budget:
+                continue
+            seen.add(i)
+            picked.append(i)
+            used += self.chunks[i].tokens
+        return [self.chunks[i] for i in sorted(picked)]
+
+
+def format_chunks(chunks: list[Chunk]) -> str:
+    """Agrupa los fragmentos por documento para insertarlos en el prompt."""
+    parts: list[str] = []
+    current_doc = None
+    for chunk in chunks:
+        if chunk.doc != current_doc:
+            parts.append(f"# {chunk.doc}")
+            current_doc = chunk.doc
+        parts.append(chunk.text)
+    return "\n\n".join(parts)
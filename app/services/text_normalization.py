@@ -0,0 +1,219 @@
+"""
+Normalización del texto extraído de los documentos antes de montar los prompts.
+
+Se aplica entre la extracción (app.services.extraction) y la construcción del
+contexto (openai_service.load_documents), sobre las páginas de cada documento:
+
+- Cabeceras y pies de página: líneas que aparecen entre las primeras o últimas
+  líneas de buena parte de las páginas de un documento (comparadas sin cifras,
+  para reconocer también "Página 3 de 10"), y números de página sueltos.
+- Espacios: tabuladores y espacios seguidos, espacios al final de línea y líneas
+  en blanco consecutivas.
+- Párrafos casi duplicados dentro de un documento o entre documentos (p. ej.
+  versiones sucesivas del mismo documento): se comparan por shingles de palabras,
+  con firmas MinHash indexadas por bandas (LSH) para encontrar candidatos y la
+  similitud de Jaccard exacta para confirmarlos. Se conserva la primera aparición.
+
+Cada documento lleva un informe con los tokens estimados antes y después.
+"""
+import hashlib
+import os
+import re
+from collections import Counter
+from dataclasses import asdict, dataclass
+
+from app.services import metrics
+from app.utils.tokens import estimate_tokens
+
+TEXT_NORMALIZATION_ENABLED = os.getenv("TEXT_NORMALIZATION_ENABLED", "1") == "1"
+# Fracción mínima de páginas en las que debe repetirse una línea para tratarla como cabecera o pie
+NORMALIZATION_REPEATED_LINE_RATIO = float(os.getenv("NORMALIZATION_REPEATED_LINE_RATIO", 0.5))
+# Similitud de Jaccard de shingles a partir de la que dos párrafos se consideran duplicados
+NORMALIZATION_DUPLICATE_THRESHOLD = float(os.getenv("NORMALIZATION_DUPLICATE_THRESHOLD", 0.9))
+# Los párrafos más cortos (en palabras) nunca se eliminan como duplicados
+NORMALIZATION_MIN_PARAGRAPH_WORDS = int(os.getenv("NORMALIZATION_MIN_PARAGRAPH_WORDS", 12))
+
+# Líneas del principio y del final de cada página donde se buscan cabeceras y pies
+_EDGE_LINES = 3
+# Con menos páginas no se puede distinguir una cabecera de una línea repetida por casualidad
+_MIN_PAGES = 3
+_SHINGLE_WORDS = 5
+# Firma MinHash de una sola permutación: el mínimo de los hashes de cada uno de _SIGNATURE_BINS tramos,
+# indexada en _SIGNATURE_BANDS bandas. Con 4 bandas de 4 valores, un par con similitud 0.9 es candidato
+# con probabilidad > 0.999 y uno con similitud 0.5, con probabilidad ≈ 0.23.
+_SIGNATURE_BINS = 16
+_SIGNATURE_BANDS = 4
+
+_DIGITS_RE = re.compile(r"\d+")
+_SPACES_RE = re.compile(r"[ \t\u00a0]+")
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+_PAGE_NUMBER_RE = re.compile(
+    r"^[-–—\s]*(?:(?:p[áa]g(?:ina)?|page)\.?\s*)?\d+(?:\s*(?:de|of|/)\s*\d+)?[-–—\s]*$", re.IGNORECASE
+)
+_PARAGRAPH_END = (".", "!", "?", ":", ";")
+
+
+@dataclass
+class NormalizationReport:
+    """Resultado de la normalización de un documento."""
+
+    name: str
+    tokens_before: int
+    tokens_after: int
+    repeated_lines: int = 0
+    duplicate_paragraphs: int = 0
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.tokens_before - self.tokens_after
+
+    def to_dict(self) -> dict:
+        return {**asdict(self), "tokens_saved": self.tokens_saved}
+
+
+def _line_key(line: str) -> str:
+    return _DIGITS_RE.sub("#", " ".join(line.split()).lower())
+
+
+def _edge_indexes(lines: list[str]) -> list[int]:
+    """Posiciones de las primeras y últimas líneas no vacías de una página."""
+    filled = [i for i, line in enumerate(lines) if line.strip()]
+    return sorted(set(filled[:_EDGE_LINES] + filled[-_EDGE_LINES:]))
+
+
+def repeated_lines(pages: list[list[str]]) -> set[str]:
+    """Claves de las líneas que se repiten en los bordes de al menos NORMALIZATION_REPEATED_LINE_RATIO de las páginas."""
+    if len(pages) < _MIN_PAGES:
+        return set()
+    counts: Counter[str] = Counter()
+    for lines in pages:
+        counts.update({_line_key(lines[i]) for i in _edge_indexes(lines)})
+    threshold = max(_MIN_PAGES, NORMALIZATION_REPEATED_LINE_RATIO * len(pages))
+    return {key for key, count in counts.items() if count >= threshold}
+
+
+def _collapse_spaces(line: str) -> str:
+    """Reduce los espacios seguidos a uno, conservando la sangría (listas anidadas de Markdown)."""
+    content = line.lstrip(" \t")
+    return line[: len(line) - len(content)] + _SPACES_RE.sub(" ", content).rstrip()
+
+
+def strip_page_furniture(pages: list[str]) -> tuple[list[str], int]:
+    """Une las páginas sin cabeceras, pies ni números de página y con los espacios reducidos.
+
+    Devuelve las líneas resultantes (sin líneas en blanco consecutivas) y cuántas se han eliminado.
+    """
+    page_lines = [page.splitlines() for page in pages]
+    boilerplate = repeated_lines(page_lines)
+    multipage = len(pages) > 1
+    result: list[str] = []
+    removed = 0
+    for lines in page_lines:
+        edges = set(_edge_indexes(lines))
+        for i, line in enumerate(lines):
+            if i in edges and (_line_key(line) in boilerplate or (multipage and _PAGE_NUMBER_RE.match(line))):
+                removed += 1
+                continue
+            line = _collapse_spaces(line)
+            if line or (result and result[-1]):
+                result.append(line)
+    while result and not result[-1]:
+        result.pop()
+    return result, removed
+
+
+def _paragraphs(lines: list[str]) -> list[tuple[int, int]]:
+    """Rangos [inicio, fin) de líneas de cada párrafo.
+
+    Un párrafo termina en una línea en blanco o en una línea acabada en puntuación final: el texto
+    de los PDF no separa los párrafos con líneas en blanco, pero sí parte cada uno en varias líneas.
+    """
+    ranges, start = [], None
+    for i, line in enumerate(lines):
+        if not line:
+            if start is not None:
+                ranges.append((start, i))
+                start = None
+            continue
+        if start is None:
+            start = i
+        if line.endswith(_PARAGRAPH_END):
+            ranges.append((start, i + 1))
+            start = None
+    if start is not None:
+        ranges.append((start, len(lines)))
+    return ranges
+
+
+def _shingles(text: str) -> set[int]:
+    """Hashes (deterministas entre procesos) de las secuencias de _SHINGLE_WORDS palabras del texto."""
+    words = _WORD_RE.findall(text.lower())
+    return {
+        int.from_bytes(hashlib.blake2b(" ".join(words[i:i + _SHINGLE_WORDS]).encode(), digest_size=8).digest(), "big")
+        for i in range(max(1, len(words) - _SHINGLE_WORDS + 1))
+    }
+
+
+def _band_keys(shingles: set[int]) -> list[tuple]:
+    """Claves LSH de la firma MinHash de un conjunto de shingles."""
+    signature = [None] * _SIGNATURE_BINS
+    for h in shingles:
+        # Los bits altos eligen el tramo; dos conjuntos con similitud J coinciden en cada tramo con probabilidad ≈ J
+        b = h * _SIGNATURE_BINS >> 64
+        if signature[b] is None or h < signature[b]:
+            signature[b] = h
+    rows = _SIGNATURE_BINS // _SIGNATURE_BANDS
+    return [(band, *signature[band * rows:(band + 1) * rows]) for band in range(_SIGNATURE_BANDS)]
+
+
+class DuplicateDetector:
+    """Detecta párrafos casi iguales a otros vistos antes, con un índice LSH de firmas MinHash."""
+
+    def __init__(self, threshold: float = NORMALIZATION_DUPLICATE_THRESHOLD):
+        self.threshold = threshold
+        self._shingles: list[set[int]] = []
+        self._index: dict[tuple, list[int]] = {}
+
+    def seen(self, text: str) -> bool:
+        """Si el párrafo duplica uno anterior; si no, lo añade al índice."""
+        shingles = _shingles(text)
+        keys = _band_keys(shingles)
+        candidates = {i for key in keys for i in self._index.get(key, ())}
+        for i in candidates:
+            other = self._shingles[i]
+            if len(shingles & other) >= self.threshold * len(shingles | other):
+                return True
+        position = len(self._shingles)
+        self._shingles.append(shingles)
+        for key in keys:
+            self._index.setdefault(key, []).append(position)
+        return False
+
+
+def normalize_documents(
+    documents: list[tuple[str, list[str]]],
+) -> tuple[list[tuple[str, str]], list[NormalizationReport]]:
+    """Normaliza (nombre, páginas) de cada documento y devuelve (nombre, texto) y el informe de cada uno."""
+    with metrics.postprocess_duration.time(step="normalize"):
+        detector = DuplicateDetector()
+        normalized, reports = [], []
+        for name, pages in documents:
+            lines, removed_lines = strip_page_furniture(pages)
+            kept: list[str] = []
+            duplicates = 0
+            for start, end in _paragraphs(lines):
+                paragraph = lines[start:end]
+                text = " ".join(paragraph)
+                if len(text.split()) >= NORMALIZATION_MIN_PARAGRAPH_WORDS and detector.seen(text):
+                    duplicates += 1
+                    continue
+                if kept and not lines[start - 1]:
+                    kept.append("")
+                kept.extend(paragraph)
+            text = "\n".join(kept)
+            report = NormalizationReport(
+                name, estimate_tokens("\n".join(pages)), estimate_tokens(text), removed_lines, duplicates
+            )
+            normalized.append((name, text))
+            reports.append(report)
+    return normalized, reports
@@ -0,0 +1,129 @@
+"""
+Guardado de archivos subidos en streaming, con memoria acotada.
+
+El contenido se copia por bloques a un fichero temporal del mismo directorio de
+destino mientras se calcula su hash SHA-256, se aplica el límite de tamaño
+durante la copia y, al terminar, se mueve al destino con un rename atómico. Las
+escrituras en disco se hacen en un hilo para no bloquear el bucle de eventos.
+
+Starlette recibe el cuerpo multipart completo antes de llamar a la ruta, así que
+UploadSizeLimitMiddleware rechaza con 413 los cuerpos demasiado grandes antes de
+leerlos: por la cabecera Content-Length o, si no la hay, en cuanto lo recibido
+supera el límite.
+"""
+import asyncio
+import hashlib
+import os
+import tempfile
+from dataclasses import dataclass
+from pathlib import Path
+
+from fastapi import UploadFile
+from fastapi.responses import JSONResponse
+
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", 1024 * 1024))
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", 200 * 1024 * 1024))
+# Tamaño máximo del cuerpo de una petición de subida (todos sus archivos y las cabeceras multipart)
+MAX_UPLOAD_REQUEST_BYTES = int(os.getenv("MAX_UPLOAD_REQUEST_BYTES", MAX_UPLOAD_BYTES + UPLOAD_CHUNK_SIZE))
+# Prefijo de los ficheros temporales: los listados de documentos los ignoran
+TEMP_UPLOAD_PREFIX = ".upload-"
+
+
+class UploadTooLargeError(Exception):
+    """El archivo subido supera el tamaño máximo permitido."""
+
+    def __init__(self, filename: str, max_bytes: int):
+        super().__init__(f"El archivo {filename} supera el tamaño máximo permitido ({max_bytes} bytes).")
+        self.filename = filename
+        self.max_bytes = max_bytes
+
+
+@dataclass
+class StoredUpload:
+    """Resultado de guardar un archivo subido."""
+
+    path: Path
+    size: int
+    sha256: str
+
+
+def _discard(tmp_name: str) -> None:
+    try:
+        os.unlink(tmp_name)
+    except FileNotFoundError:
+        pass
+
+
+async def save_upload_stream(
+    upload: UploadFile,
+    dest: Path,
+    max_bytes: int = MAX_UPLOAD_BYTES,
+    chunk_size: int = UPLOAD_CHUNK_SIZE,
+) -> StoredUpload:
+    """Copia el archivo subido a dest por bloques, calculando su hash sobre la marcha.
+
+    Si se supera max_bytes o falla la copia, el temporal se elimina y dest queda intacto.
+    """
+    fd, tmp_name = await asyncio.to_thread(
+        tempfile.mkstemp, prefix=TEMP_UPLOAD_PREFIX, suffix=".part", dir=dest.parent
+    )
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while chunk := await upload.read(chunk_size):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLargeError(upload.filename or dest.name, max_bytes)
+                digest.update(chunk)
+                await asyncio.to_thread(out.write, chunk)
+        await asyncio.to_thread(os.replace, tmp_name, dest)
+    except BaseException:
+        await asyncio.to_thread(_discard, tmp_name)
+        raise
+    return StoredUpload(path=dest, size=size, sha256=digest.hexdigest())
+
+
+class UploadSizeLimitMiddleware:
+    """Middleware ASGI: responde 413 a las subidas cuyo cuerpo supera max_bytes sin llegar a recibirlo entero."""
+
+    def __init__(self, app, path: str, max_bytes: int = MAX_UPLOAD_REQUEST_BYTES):
+        self.app = app
+        self.path = path
+        self.max_bytes = max_bytes
+
+    def _too_large(self) -> JSONResponse:
+        return JSONResponse(
+            {"detail": f"La subida supera el tamaño máximo permitido ({self.max_bytes} bytes)."}, status_code=413
+        )
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or scope["path"] != self.path:
+            await self.app(scope, receive, send)
+            return
+        length = dict(scope["headers"]).get(b"content-length")
+        if length is not None and length.isdigit() and int(length) > self.max_bytes:
+            await self._too_large()(scope, receive, send)
+            return
+        received = 0
+        rejected = False
+
+        async def limited_receive():
+            nonlocal received, rejected
+            if rejected:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # Cuerpo sin Content-Length (o con uno falso): se corta aquí y la ruta ve una desconexión
+                    rejected = True
+                    await self._too_large()(scope, receive, send)
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def guarded_send(message):
+            if not rejected:
+                await send(message)
+
+        await self.app(scope, limited_receive, guarded_send)
@@ -0,0 +1,56 @@
+"""
+Precarga opcional de las dependencias pesadas al arrancar.
+
+El SDK de openai, PyPDF2, python-docx, fpdf2, markdown, BeautifulSoup y NumPy se
+importan en su primer uso para que un worker arranque y acepte peticiones
+cuanto antes. Con STARTUP_WARMUP el lifespan los importa igualmente y crea el
+cliente del modelo, para que la primera petición no pague ese coste:
+
+- "0" (por defecto): sin precarga.
+- "background": en un hilo, mientras el worker ya atiende peticiones.
+- "blocking": antes de aceptar peticiones (el worker solo está listo ya precargado).
+
+El desglose de tiempos de importación del arranque se obtiene con
+python -m benchmarks.startup.
+"""
+import asyncio
+import importlib
+import logging
+import os
+import time
+
+from app.services.llm_client import init_llm_client
+
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "0")
+
+WARMUP_MODULES = (
+    "openai",
+    "PyPDF2",
+    "docx",
+    "markdown",
+    "bs4",
+    "numpy",
+    "app.services.pdf_layout",
+)
+
+
+def import_modules(modules: tuple[str, ...] = WARMUP_MODULES) -> dict[str, float]:
+    """Importa los módulos y devuelve los segundos que ha costado cada uno."""
+    timings = {}
+    for name in modules:
+        start = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except Exception as e:
+            logging.error(f"No se pudo precargar el módulo {name}: {e}")
+            continue
+        timings[name] = time.perf_counter() - start
+    return timings
+
+
+async def warm_up() -> dict[str, float]:
+    """Precarga los módulos en un hilo y crea el cliente compartido del modelo en el bucle de eventos."""
+    timings = await asyncio.to_thread(import_modules)
+    init_llm_client()
+    logging.info(f"Precarga completada en {sum(timings.values()):.2f}s: {timings}")
+    return timings
@@ -0,0 +1,71 @@
+"""
+Un solo proceso de la aplicación por directorio de datos.
+
+Los trabajos de generación (generation_jobs), el estado de las extracciones
+(extraction_jobs) y el buffer de escritura diferida del funcional
+(funcional_writer) viven en la memoria del proceso. Con varios workers de
+uvicorn, GET /generate/jobs/{id} solo encontraría el trabajo en el worker que
+lo creó, la deduplicación de generaciones solo funcionaría dentro de cada
+worker y dos workers podrían escribir a la vez el funcional del mismo espacio
+de trabajo. Por eso la aplicación se ejecuta con un único worker (la
+concurrencia la da el bucle de eventos): al arrancar toma un bloqueo exclusivo
+sobre WORKER_LOCK_PATH y un segundo proceso sobre los mismos datos no arranca.
+"""
+import logging
+import os
+from pathlib import Path
+
+from app.services.workspaces import WORKSPACES_DIR
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+WORKER_LOCK_PATH = Path(os.getenv("WORKER_LOCK_PATH", str(WORKSPACES_DIR / ".worker.lock")))
+
+
+class WorkerLockError(RuntimeError):
+    """Otro proceso de la aplicación ya usa el mismo directorio de datos."""
+
+
+class WorkerLock:
+    """Bloqueo exclusivo de fichero que dura mientras el proceso lo mantiene abierto."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._file = None
+
+    def acquire(self) -> None:
+        """Toma el bloqueo; lanza WorkerLockError si lo tiene otro proceso."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        lock_file = open(self.path, "a+")
+        try:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            lock_file.close()
+            raise WorkerLockError(
+                f"Otro proceso de la aplicación ya usa {self.path.parent}. "
+                "Ejecuta un solo worker de uvicorn (sin --workers) por directorio de datos."
+            ) from None
+        lock_file.seek(0)
+        lock_file.truncate()
+        lock_file.write(str(os.getpid()))
+        lock_file.flush()
+        self._file = lock_file
+        logging.info(f"Bloqueo de worker {self.path} tomado por el proceso {os.getpid()}")
+
+    def release(self) -> None:
+        if self._file is None:
+            return
+        # Cerrar el fichero libera el bloqueo
+        self._file.close()
+        self._file = None
+
+
+worker_lock = WorkerLock(WORKER_LOCK_PATH)
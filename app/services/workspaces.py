@@ -0,0 +1,87 @@
+"""
+Espacios de trabajo por usuario y proyecto.
+
+Cada usuario de la sesión puede tener varios proyectos; cada proyecto tiene su
+propio directorio de documentos subidos y su manifiesto de generación bajo
+WORKSPACES_DIR/<usuario>/<proyecto>/, y sus documentos funcionales (con
+versiones) y metadatos en la base de datos, identificados por la clave
+"<usuario>/<proyecto>". Así varios usuarios y proyectos pueden trabajar a la
+vez sin pisarse, dentro de un único worker de uvicorn (ver
+app/services/worker_lock.py).
+"""
+import functools
+import os
+import re
+from dataclasses import dataclass
+from pathlib import Path
+
+from fastapi import HTTPException, Request
+
+from app.services.generation_manifest import SectionManifest
+from app.utils.sessions import SESSION_COOKIE, read_session
+
+WORKSPACES_DIR = Path(os.getenv("WORKSPACES_DIR", "data/workspaces"))
+DEFAULT_PROJECT = "default"
+
+_NAME_RE = re.compile(r"^[\w-]{1,64}$")
+
+
+def valid_name(name: str) -> bool:
+    """Nombres de usuario y proyecto admitidos (se usan como nombres de directorio)."""
+    return bool(_NAME_RE.match(name))
+
+
+@functools.lru_cache(maxsize=None)
+def _manifest(path: Path) -> SectionManifest:
+    # Una sola instancia (y un solo lock) por fichero de manifiesto
+    return SectionManifest(path)
+
+
+@dataclass(frozen=True)
+class Workspace:
+    """Proyecto de un usuario."""
+
+    user: str
+    project: str
+
+    @property
+    def key(self) -> str:
+        """Identificador del espacio de trabajo en la base de datos y en las cachés."""
+        return f"{self.user}/{self.project}"
+
+    @property
+    def root(self) -> Path:
+        return WORKSPACES_DIR / self.user / self.project
+
+    @property
+    def uploads_dir(self) -> Path:
+        return self.root / "uploads"
+
+    @property
+    def manifest(self) -> SectionManifest:
+        """Manifiesto de la última generación por secciones de este proyecto."""
+        return _manifest(self.root / "generation_manifest.json")
+
+
+def _ensure_dirs(workspace: Workspace) -> None:
+    # Sin caché: un directorio borrado en tiempo de ejecución (limpieza manual) se vuelve a crear
+    workspace.uploads_dir.mkdir(parents=True, exist_ok=True)
+
+
+def current_workspace(request: Request) -> Workspace:
+    """Dependencia FastAPI: espacio de trabajo de la sesión; 401 si no hay sesión válida."""
+    session = read_session(request.cookies.get(SESSION_COOKIE))
+    if session is None or not valid_name(session.user) or not valid_name(session.project):
+        raise HTTPException(status_code=401, detail="Sesión no válida. Inicia sesión de nuevo.")
+    workspace = Workspace(session.user, session.project)
+    _ensure_dirs(workspace)
+    return workspace
+
+
+def list_projects(user: str) -> list[str]:
+    """Proyectos existentes del usuario (siempre incluye el proyecto por defecto)."""
+    user_dir = WORKSPACES_DIR / user
+    projects = {DEFAULT_PROJECT}
+    if user_dir.is_dir():
+        projects.update(p.name for p in user_dir.iterdir() if p.is_dir() and valid_name(p.name))
+    return sorted(projects)
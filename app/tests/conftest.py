@@ -0,0 +1,13 @@
+"""Configuración común de los tests: datos de la aplicación aislados en un directorio temporal."""
+import os
+import tempfile
+
+# Antes de importar app: la configuración se lee al importar cada módulo
+_DATA_DIR = tempfile.mkdtemp(prefix="metasketch-tests-")
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{_DATA_DIR}/metasketch.db",
+    "WORKSPACES_DIR": f"{_DATA_DIR}/workspaces",
+    "EXTRACTION_CACHE_DIR": f"{_DATA_DIR}/extraction",
+    "SESSION_SECRET_PATH": f"{_DATA_DIR}/session_secret",
+    "LLM_CACHE_DIR": "",
+})
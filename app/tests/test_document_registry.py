@@ -0,0 +1,80 @@
+"""Tests del índice de documentos (app/services/document_registry.py) y de su conciliación al arrancar."""
+import asyncio
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from app import main
+from app.db import models  # noqa: F401  (registra las tablas en Base.metadata)
+from app.db.database import Base, _create_engine
+from app.services.document_registry import DocumentRegistry
+from app.services.extraction_jobs import STATUS_DONE, STATUS_PENDING
+from app.services.workspaces import Workspace
+
+WORKSPACE = Workspace("ana", "proyecto")
+
+
+@pytest.fixture
+def registry(tmp_path):
+    engine = _create_engine(f"sqlite:///{tmp_path / 'documents.db'}")
+    Base.metadata.create_all(engine)
+    yield DocumentRegistry(sessionmaker(bind=engine, expire_on_commit=False))
+    engine.dispose()
+
+
+def names(registry: DocumentRegistry, workspace: str = WORKSPACE.key) -> list[str]:
+    return [doc["name"] for doc in registry.list(workspace)[0]]
+
+
+def test_sync_directory_adds_and_removes_files(registry, tmp_path):
+    uploads = tmp_path / "uploads"
+    uploads.mkdir()
+    (uploads / "a.txt").write_text("a")
+    (uploads / ".upload-123.part").write_text("temporal")
+    registry.record_upload(WORKSPACE.key, "borrado.pdf", 1, "0" * 64, "application/pdf")
+
+    registry.sync_directory(WORKSPACE.key, uploads)
+    assert names(registry) == ["a.txt"]
+
+
+def test_ensure_synced_runs_once_per_workspace(registry, tmp_path):
+    uploads = tmp_path / "uploads"
+    uploads.mkdir()
+    (uploads / "a.txt").write_text("a")
+    registry.ensure_synced(WORKSPACE.key, uploads)
+    (uploads / "b.txt").write_text("b")
+    registry.ensure_synced(WORKSPACE.key, uploads)
+    assert names(registry) == ["a.txt"]
+
+    registry.ensure_synced("ana/otro", uploads)
+    assert names(registry, "ana/otro") == ["a.txt", "b.txt"]
+
+
+def test_with_extraction_status(registry):
+    registry.record_upload(WORKSPACE.key, "a.pdf", 1, "0" * 64, "application/pdf", STATUS_PENDING)
+    registry.record_upload(WORKSPACE.key, "b.pdf", 1, "0" * 64, "application/pdf", STATUS_DONE)
+    registry.record_upload("luis/default", "c.pdf", 1, "0" * 64, "application/pdf", STATUS_PENDING)
+    assert sorted(registry.with_extraction_status(STATUS_PENDING)) == [("ana/proyecto", "a.pdf"), ("luis/default", "c.pdf")]
+
+
+def test_pending_extractions_are_requeued_at_startup(registry, tmp_path, monkeypatch):
+    monkeypatch.setattr(Workspace, "root", property(lambda self: tmp_path / self.user / self.project))
+    WORKSPACE.uploads_dir.mkdir(parents=True)
+    (WORKSPACE.uploads_dir / "a.pdf").write_bytes(b"%PDF")
+    registry.record_upload(WORKSPACE.key, "a.pdf", 4, "0" * 64, "application/pdf", STATUS_PENDING)
+    registry.record_upload(WORKSPACE.key, "borrado.pdf", 4, "0" * 64, "application/pdf", STATUS_PENDING)
+    registry.record_upload(WORKSPACE.key, "hecho.pdf", 4, "0" * 64, "application/pdf", STATUS_DONE)
+
+    submitted = []
+
+    class Jobs:
+        def submit(self, file_path, digest=None, workspace=None):
+            submitted.append((file_path, workspace))
+
+    monkeypatch.setattr(main, "document_registry", registry)
+    monkeypatch.setattr(main, "extraction_jobs", Jobs())
+    asyncio.run(main._requeue_pending_extractions())
+
+    assert submitted == [(WORKSPACE.uploads_dir / "a.pdf", WORKSPACE.key)]
+    # El registro de un archivo que ya no existe se elimina en lugar de quedarse pendiente
+    assert names(registry) == ["a.pdf", "hecho.pdf"]
@@ -0,0 +1,126 @@
+"""Tests de la extracción por páginas y de las entradas parciales de la caché (app/services/extraction.py)."""
+import pytest
+from fpdf import FPDF
+
+from app.services import extraction
+from app.services.extraction import ExtractionCache
+from app.utils.tokens import estimate_tokens
+
+PAGES = 4
+
+
+def page_text(number: int) -> str:
+    return f"Pagina {number}: " + " ".join(f"requisito{number}x{i}" for i in range(30))
+
+
+@pytest.fixture
+def pdf_path(tmp_path):
+    pdf = FPDF()
+    pdf.set_font("Helvetica", size=10)
+    for number in range(1, PAGES + 1):
+        pdf.add_page()
+        pdf.multi_cell(0, 5, page_text(number))
+    path = tmp_path / "requisitos.pdf"
+    pdf.output(str(path))
+    return path
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ExtractionCache(tmp_path / "cache")
+
+
+@pytest.fixture
+def extract_calls(monkeypatch):
+    """Página inicial de cada extracción real (las lecturas de la caché no extraen)."""
+    calls = []
+    original = extraction.extract_pages
+
+    def spy(file_path, start=0, *args, **kwargs):
+        calls.append(start)
+        return original(file_path, start, *args, **kwargs)
+
+    monkeypatch.setattr(extraction, "extract_pages", spy)
+    return calls
+
+
+def all_pages(pdf_path) -> list[str]:
+    return list(extraction.open_pages(str(pdf_path))[1])
+
+
+def budget_for(pages: list[str], count: int) -> int:
+    """Presupuesto de tokens que se alcanza justo en la página count."""
+    return sum(estimate_tokens(text) for text in pages[:count])
+
+
+def test_pdf_is_extracted_page_by_page(pdf_path, cache):
+    pages = cache.get_pages(str(pdf_path))
+    assert len(pages) == PAGES
+    for number, text in enumerate(pages, start=1):
+        assert text.split()[:2] == ["Pagina", f"{number}:"]
+
+
+def test_budget_cutoff_is_stored_as_partial_and_resumed(pdf_path, cache, extract_calls):
+    full = all_pages(pdf_path)
+    digest = cache.digest(pdf_path)
+    partial_path, entry_path = cache._partial_path(digest), cache._entry_path(digest)
+
+    first = cache.get_pages(str(pdf_path), budget_for(full, 2))
+    assert first == full[:2]
+    assert partial_path.read_text(encoding="utf-8") == "\f".join(full[:2])
+    assert not entry_path.exists()
+
+    # Con un presupuesto menor o igual se sirve la entrada parcial sin extraer
+    assert cache.get_pages(str(pdf_path), budget_for(full, 1)) == full[:1]
+    assert extract_calls == [0]
+
+    # Sin presupuesto se continúa desde la tercera página y la entrada parcial pasa a ser la completa
+    assert cache.get_pages(str(pdf_path)) == full
+    assert extract_calls == [0, 2]
+    assert entry_path.read_text(encoding="utf-8") == "\f".join(full)
+    assert not partial_path.exists()
+    assert cache.is_cached(str(pdf_path))
+
+    assert cache.get_pages(str(pdf_path)) == full
+    assert extract_calls == [0, 2]
+
+
+def test_failure_partway_keeps_partial_and_next_call_resumes(pdf_path, cache, extract_calls, monkeypatch):
+    full = all_pages(pdf_path)
+    digest = cache.digest(pdf_path)
+    partial_path, entry_path = cache._partial_path(digest), cache._entry_path(digest)
+    cache.get_pages(str(pdf_path), budget_for(full, 2))
+
+    original_open_pages = extraction.open_pages
+
+    def failing_open_pages(file_path, start=0, stop=None):
+        total, pages = original_open_pages(file_path, start, stop)
+
+        def fail_after_first():
+            yield next(pages)
+            raise RuntimeError("extracción interrumpida")
+
+        return total, fail_after_first()
+
+    monkeypatch.setattr(extraction, "open_pages", failing_open_pages)
+    assert cache.get_pages(str(pdf_path)) == ["[No se pudo extraer texto del PDF: requisitos.pdf]"]
+    with pytest.raises(RuntimeError):
+        cache.warm(str(pdf_path))
+    # El fallo no estropea lo ya extraído ni deja una entrada completa a medias
+    assert partial_path.read_text(encoding="utf-8") == "\f".join(full[:2])
+    assert not entry_path.exists()
+
+    monkeypatch.setattr(extraction, "open_pages", original_open_pages)
+    assert cache.get_pages(str(pdf_path)) == full
+    assert extract_calls == [0, 2, 2, 2]
+    assert entry_path.read_text(encoding="utf-8") == "\f".join(full)
+    assert not partial_path.exists()
+
+
+def test_invalidate_removes_full_and_partial_entries(pdf_path, cache):
+    digest = cache.digest(pdf_path)
+    cache.get_pages(str(pdf_path), 1)
+    assert cache._partial_path(digest).exists()
+    cache.invalidate(pdf_path)
+    assert not cache._partial_path(digest).exists()
+    assert not cache._entry_path(digest).exists()
@@ -0,0 +1,40 @@
+"""Tests de las rutas de edición del documento funcional (app/api/documents.py)."""
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.utils.sessions import SESSION_COOKIE, sign_session
+
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(app) as client:
+        client.cookies.set(SESSION_COOKIE, sign_session("tests", "funcional-api"))
+        yield client
+
+
+def save(client, **body):
+    return client.post("/api/documents/update-funcional", json=body)
+
+
+def test_update_funcional_accepts_numeric_string_base_version(client):
+    first = save(client, content="# 1. Inicio\n")
+    assert first.status_code == 200
+    version = first.json()["version"]
+
+    second = save(client, content="# 1. Inicio\n\nMás.\n", base_version=str(version))
+    assert second.status_code == 200
+    assert client.get("/api/documents/funcional").json()["content"] == "# 1. Inicio\n\nMás.\n"
+
+    stale = save(client, content="# 1. Inicio\n\nOtra.\n", base_version=version)
+    assert stale.status_code == 409
+
+
+@pytest.mark.parametrize("body", [
+    {"base_version": 1},
+    {"content": 123},
+    {"content": ["# 1. Inicio"]},
+    {"content": "# 1. Inicio\n", "base_version": "última"},
+])
+def test_update_funcional_rejects_invalid_bodies(client, body):
+    assert save(client, **body).status_code == 422
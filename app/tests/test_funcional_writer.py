@@ -0,0 +1,133 @@
+"""Tests del buffer de escritura diferida del documento funcional (app/services/funcional_writer.py)."""
+import asyncio
+import threading
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from app.db import models  # noqa: F401  (registra las tablas en Base.metadata)
+from app.db.database import Base, _create_engine
+from app.services.export_cache import export_artifacts
+from app.services.funcional_store import SOURCE_EDIT, SOURCE_GENERATE, FuncionalStore, FuncionalVersionConflict
+from app.services.funcional_writer import FuncionalWriter
+
+WORKSPACE = "ana/proyecto"
+
+
+class FlakyStore(FuncionalStore):
+    """FuncionalStore real que puede fallar o quedarse bloqueado en las próximas escrituras."""
+
+    def __init__(self, session_factory):
+        super().__init__(session_factory)
+        self.failures = 0
+        self.gate: threading.Event | None = None
+        self.saving = threading.Event()
+
+    def save(self, *args, **kwargs):
+        self.saving.set()
+        if self.gate is not None:
+            self.gate.wait(timeout=5)
+        if self.failures:
+            self.failures -= 1
+            raise OSError("disco lleno")
+        return super().save(*args, **kwargs)
+
+
+@pytest.fixture
+def store(tmp_path) -> FlakyStore:
+    engine = _create_engine(f"sqlite:///{tmp_path / 'funcional.db'}")
+    Base.metadata.create_all(engine)
+    store = FlakyStore(sessionmaker(bind=engine, expire_on_commit=False))
+    store.save(WORKSPACE, "# 1 Inicio\n\nTexto.\n", SOURCE_GENERATE)
+    yield store
+    engine.dispose()
+
+
+@pytest.fixture(autouse=True)
+def no_prerender(monkeypatch):
+    monkeypatch.setattr(export_artifacts, "prerender", lambda content: None)
+
+
+def make_writer(store: FuncionalStore) -> FuncionalWriter:
+    # Sin escrituras automáticas durante el test salvo los reintentos, que son inmediatos
+    return FuncionalWriter(store, delay=60, max_delay=60, retry_delay=0.01)
+
+
+def test_current_returns_edit_while_it_is_being_written(store):
+    async def scenario():
+        writer = make_writer(store)
+        edited = await writer.edit(WORKSPACE, lambda content: content + "Más.\n")
+        store.gate = threading.Event()
+        flush = asyncio.create_task(writer.flush(WORKSPACE))
+        await asyncio.to_thread(store.saving.wait, 5)
+        during = await writer.current(WORKSPACE)
+        store.gate.set()
+        await flush
+        return edited, during
+
+    edited, during = asyncio.run(scenario())
+    assert during.version == edited.version
+    assert during.content == edited.content
+    assert store.current(WORKSPACE).version == edited.version
+
+
+def test_failed_write_is_kept_and_retried(store):
+    async def scenario():
+        writer = make_writer(store)
+        edited = await writer.edit(WORKSPACE, lambda content: content + "Más.\n")
+        store.failures = 2
+        await writer.flush(WORKSPACE)
+        assert store.current(WORKSPACE).version == edited.version - 1
+        assert (await writer.current(WORKSPACE)).content == edited.content
+        # Los reintentos (0.01 s y 0.02 s) los programa el propio escritor
+        for _ in range(100):
+            if store.current(WORKSPACE).version == edited.version:
+                break
+            await asyncio.sleep(0.01)
+        return edited
+
+    edited = asyncio.run(scenario())
+    stored = store.current(WORKSPACE)
+    assert stored.version == edited.version
+    assert stored.content == edited.content
+
+
+def test_conflict_is_reported_to_next_current(store):
+    async def scenario():
+        writer = make_writer(store)
+        await writer.edit(WORKSPACE, lambda content: content + "Mío.\n")
+        # Otro worker guarda una versión antes de que se escriba el buffer
+        await asyncio.to_thread(store.save, WORKSPACE, "# 1 Inicio\n\nDe otro.\n", SOURCE_EDIT)
+        await writer.flush(WORKSPACE)
+        with pytest.raises(FuncionalVersionConflict):
+            await writer.current(WORKSPACE)
+        # El conflicto se comunica una sola vez; después se ve la versión del otro worker
+        return await writer.current(WORKSPACE)
+
+    after = asyncio.run(scenario())
+    assert after.content == "# 1 Inicio\n\nDe otro.\n"
+
+
+def test_conflict_is_reported_to_next_edit(store):
+    async def scenario():
+        writer = make_writer(store)
+        await writer.edit(WORKSPACE, lambda content: content + "Mío.\n")
+        await asyncio.to_thread(store.save, WORKSPACE, "# 1 Inicio\n\nDe otro.\n", SOURCE_EDIT)
+        await writer.flush(WORKSPACE)
+        with pytest.raises(FuncionalVersionConflict):
+            await writer.edit(WORKSPACE, lambda content: content + "Otra edición.\n")
+
+    asyncio.run(scenario())
+    assert store.current(WORKSPACE).content == "# 1 Inicio\n\nDe otro.\n"
+
+
+def test_full_save_replaces_conflicting_edits(store):
+    async def scenario():
+        writer = make_writer(store)
+        await writer.edit(WORKSPACE, lambda content: content + "Mío.\n")
+        await asyncio.to_thread(store.save, WORKSPACE, "# 1 Inicio\n\nDe otro.\n", SOURCE_EDIT)
+        await writer.flush(WORKSPACE)
+        return await writer.save(WORKSPACE, "# 1 Inicio\n\nRegenerado.\n", SOURCE_GENERATE)
+
+    saved = asyncio.run(scenario())
+    assert store.current(WORKSPACE).version == saved.version
@@ -0,0 +1,150 @@
+"""Tests de la pasarela del modelo (app/services/llm_gateway.py) con un cliente falso en proceso."""
+import asyncio
+import time
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+
+from app.services import llm_gateway as gateway_module
+from app.services.llm_gateway import PRIORITY_BATCH, PRIORITY_INTERACTIVE, LLMGateway
+
+
+def rate_limit_error(retry_after: float | None = None) -> openai.RateLimitError:
+    headers = {"retry-after": str(retry_after)} if retry_after is not None else {}
+    response = httpx.Response(429, headers=headers, request=httpx.Request("POST", "http://llm.test/v1/chat/completions"))
+    return openai.RateLimitError("Rate limit", response=response, body=None)
+
+
+class FakeClient:
+    """Cliente con chat.completions.create programable: cada llamada ejecuta el siguiente comportamiento."""
+
+    def __init__(self, *behaviours):
+        self.behaviours = list(behaviours)
+        self.calls: list[tuple[float, dict]] = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, **params):
+        self.calls.append((time.monotonic(), params))
+        behaviour = self.behaviours.pop(0) if self.behaviours else None
+        if isinstance(behaviour, Exception):
+            raise behaviour
+        if callable(behaviour):
+            await behaviour()
+        return SimpleNamespace(params=params)
+
+
+@pytest.fixture
+def use_client(monkeypatch):
+    def install(client: FakeClient) -> FakeClient:
+        monkeypatch.setattr(gateway_module, "get_llm_client", lambda: client)
+        return client
+    return install
+
+
+def make_gateway(**overrides) -> LLMGateway:
+    settings = dict(
+        rpm_limit=0, tpm_limit=0, max_concurrency=8, min_concurrency=1,
+        max_retries=3, base_delay=0.01, max_delay=1.0,
+    )
+    settings.update(overrides)
+    return LLMGateway(**settings)
+
+
+def test_overload_halves_limit_and_success_increases_it(use_client):
+    client = use_client(FakeClient(rate_limit_error()))
+    gateway = make_gateway()
+
+    asyncio.run(gateway.complete(PRIORITY_BATCH, 10, messages=[]))
+
+    assert len(client.calls) == 2
+    # 8 -> 4 por el 429 y +1/4 por la respuesta correcta
+    assert gateway.limit == pytest.approx(4.25)
+    assert gateway.in_flight == 0
+
+
+def test_burst_of_overloads_halves_limit_once(use_client):
+    use_client(FakeClient(rate_limit_error(), rate_limit_error(), rate_limit_error()))
+    gateway = make_gateway(max_retries=0)
+
+    async def scenario():
+        results = await asyncio.gather(
+            *(gateway.complete(PRIORITY_BATCH, 10, messages=[]) for _ in range(3)), return_exceptions=True
+        )
+        assert all(isinstance(r, openai.RateLimitError) for r in results)
+
+    asyncio.run(scenario())
+    assert gateway.limit == pytest.approx(4.0)
+    assert gateway.in_flight == 0
+
+
+def test_limit_never_drops_below_minimum():
+    gateway = make_gateway(max_concurrency=2, min_concurrency=2)
+    gateway._on_overload()
+    assert gateway.limit == 2
+
+
+def test_retry_after_blocks_every_request(use_client):
+    client = use_client(FakeClient(rate_limit_error(retry_after=0.3)))
+    gateway = make_gateway()
+
+    async def scenario():
+        start = time.monotonic()
+        first = asyncio.create_task(gateway.complete(PRIORITY_BATCH, 10, messages=[{"n": 1}]))
+        await asyncio.sleep(0.05)
+        # Llega después del 429: tampoco se envía hasta que pasa el Retry-After
+        second = asyncio.create_task(gateway.complete(PRIORITY_BATCH, 10, messages=[{"n": 2}]))
+        await asyncio.gather(first, second)
+        return start
+
+    start = asyncio.run(scenario())
+    assert len(client.calls) == 3
+    assert all(at - start >= 0.3 for at, _ in client.calls[1:])
+
+
+def test_interactive_requests_go_first(use_client):
+    async def scenario():
+        gate = asyncio.Event()
+
+        async def hold():
+            await gate.wait()
+
+        client = use_client(FakeClient(hold))
+        gateway = make_gateway(max_concurrency=1)
+        busy = asyncio.create_task(gateway.complete(PRIORITY_BATCH, 10, messages="busy"))
+        await asyncio.sleep(0.01)
+        batch = [asyncio.create_task(gateway.complete(PRIORITY_BATCH, 10, messages=f"batch{i}")) for i in range(2)]
+        await asyncio.sleep(0.01)
+        chat = asyncio.create_task(gateway.complete(PRIORITY_INTERACTIVE, 10, messages="chat"))
+        await asyncio.sleep(0.01)
+        gate.set()
+        await asyncio.gather(busy, chat, *batch)
+        return [params["messages"] for _, params in client.calls]
+
+    assert asyncio.run(scenario()) == ["busy", "chat", "batch0", "batch1"]
+
+
+def test_cancelled_requests_release_their_slot(use_client):
+    async def scenario():
+        async def hang():
+            await asyncio.Event().wait()
+
+        use_client(FakeClient(hang))
+        gateway = make_gateway(max_concurrency=1)
+        running = asyncio.create_task(gateway.complete(PRIORITY_BATCH, 10, messages="running"))
+        await asyncio.sleep(0.01)
+        queued = asyncio.create_task(gateway.complete(PRIORITY_BATCH, 10, messages="queued"))
+        await asyncio.sleep(0.01)
+        assert gateway.in_flight == 1 and gateway.queued == 1
+        # Se cancela una en curso y otra en cola: ninguna debe quedarse con la plaza
+        queued.cancel()
+        running.cancel()
+        await asyncio.gather(running, queued, return_exceptions=True)
+        assert gateway.in_flight == 0
+        await asyncio.wait_for(gateway.complete(PRIORITY_BATCH, 10, messages="after"), timeout=1)
+        return gateway
+
+    gateway = asyncio.run(scenario())
+    assert gateway.in_flight == 0
+    assert gateway.queued == 0
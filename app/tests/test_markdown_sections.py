@@ -0,0 +1,91 @@
+"""Tests del índice de secciones Markdown (app/utils/markdown_sections.py)."""
+from app.utils.markdown_sections import MarkdownIndex, parse_sections
+
+DOC = (
+    "# Funcional\n\n"
+    "## 1. Introducción\n\nIntro.\n\n"
+    "## 2. Alcance\n\nAlc.\n\n"
+    "### 2.1 Usuarios\n\nU.\n\n"
+    "#### 2.1.1 Perfiles\n\nP.\n\n"
+    "### 2.2 Sistemas\n\nS.\n\n"
+    "## 3. Requisitos\n\nR.\n"
+)
+
+
+def titles(md: str) -> list[str]:
+    return [section.title for section in parse_sections(md)]
+
+
+def test_parse_sections_builds_offsets_and_tree():
+    sections = parse_sections(DOC)
+    assert [s.title for s in sections] == [
+        "Funcional", "1. Introducción", "2. Alcance", "2.1 Usuarios", "2.1.1 Perfiles", "2.2 Sistemas", "3. Requisitos",
+    ]
+    assert [s.level for s in sections] == [1, 2, 2, 3, 4, 3, 2]
+    assert [s.parent for s in sections] == [None, 0, 0, 2, 3, 2, 0]
+    assert sections[2].children == [3, 5]
+    alcance = sections[2]
+    assert alcance.body(DOC) == "\nAlc.\n\n"
+    assert alcance.subtree_text(DOC).endswith("### 2.2 Sistemas\n\nS.\n\n")
+    assert sections[6].subtree_end == len(DOC)
+
+
+def test_parse_sections_ignores_headings_in_code_fences():
+    md = "## 1. Uno\n\n```bash\n# comentario\n```\n\n## 2. Dos\n"
+    assert titles(md) == ["1. Uno", "2. Dos"]
+
+
+def test_section_numbers():
+    assert [s.number for s in parse_sections(DOC)] == [None, "1", "2", "2.1", "2.1.1", "2.2", "3"]
+
+
+def test_find_by_number_or_title():
+    index = MarkdownIndex(DOC)
+    assert index.find("2.1") == 3
+    assert index.find("2.") == 2
+    assert index.find("Funcional") == 0
+    assert index.find("9") is None
+    assert index.by_number("2.2").title == "2.2 Sistemas"
+
+
+def test_replace_subtree_replaces_section_and_its_subsections():
+    index = MarkdownIndex(DOC)
+    result = index.replace_subtree(index.find("2"), "## 2. Alcance\n\nNuevo.\n")
+    assert titles(result) == ["Funcional", "1. Introducción", "2. Alcance", "3. Requisitos"]
+    assert "## 2. Alcance\n\nNuevo.\n\n## 3. Requisitos" in result
+
+
+def test_replace_subtree_keeps_nested_subsections_of_the_new_content():
+    index = MarkdownIndex(DOC)
+    new = "## 2. Alcance\n\nNuevo.\n\n### 2.1 Usuarios\n\nU2.\n\n#### 2.1.1 Perfiles\n\nP2.\n"
+    result = index.replace_subtree(index.find("2"), new)
+    assert titles(result) == [
+        "Funcional", "1. Introducción", "2. Alcance", "2.1 Usuarios", "2.1.1 Perfiles", "3. Requisitos",
+    ]
+    assert MarkdownIndex(result).by_number("2.1.1").body(result) == "\nP2.\n\n"
+
+
+def test_replace_subtree_of_a_child_keeps_parent_and_siblings():
+    index = MarkdownIndex(DOC)
+    result = index.replace_subtree(index.find("2.1"), "### 2.1 Usuarios\n\nU2.")
+    assert titles(result) == ["Funcional", "1. Introducción", "2. Alcance", "2.1 Usuarios", "2.2 Sistemas", "3. Requisitos"]
+    assert "### 2.1 Usuarios\n\nU2.\n\n### 2.2 Sistemas\n\nS." in result
+
+
+def test_replace_last_subtree_ends_with_single_newline():
+    index = MarkdownIndex(DOC)
+    result = index.replace_subtree(index.find("3"), "## 3. Requisitos\n\nR2.\n\n\n")
+    assert result.endswith("## 3. Requisitos\n\nR2.\n")
+
+
+def test_outline_skips_unnumbered_headings():
+    assert MarkdownIndex(DOC).outline() == [
+        {"num": "1", "title": "1. Introducción", "children": []},
+        {"num": "2", "title": "2. Alcance", "children": [
+            {"num": "2.1", "title": "2.1 Usuarios", "children": [
+                {"num": "2.1.1", "title": "2.1.1 Perfiles", "children": []},
+            ]},
+            {"num": "2.2", "title": "2.2 Sistemas", "children": []},
+        ]},
+        {"num": "3", "title": "3. Requisitos", "children": []},
+    ]
@@ -0,0 +1,95 @@
+"""Tests del parser y la caché de plantillas (app/services/plantillas.py)."""
+import os
+
+import pytest
+
+from app.services.plantillas import PlantillaNotFoundError, PlantillaStore, parse_plantilla, plantilla_to_text
+
+
+def numbers(tree: list) -> list:
+    return [(node["num"], numbers(node["children"])) for node in tree]
+
+
+def test_parse_deep_numbering():
+    tree = parse_plantilla(
+        "1. Resumen\n"
+        "1.1 Objetivos\n"
+        "1.1.1 Objetivo principal\n"
+        "1.1.2. Objetivos secundarios\n"
+        "1.2 Contexto\n"
+        "2. Alcance\n"
+        "2.1.1 Sin padre directo\n"
+    )
+    assert numbers(tree) == [
+        ("1", [("1.1", [("1.1.1", []), ("1.1.2", [])]), ("1.2", [])]),
+        ("2", [("2.1.1", [])]),
+    ]
+    assert tree[0]["children"][0]["children"][1]["title"] == "Objetivos secundarios"
+
+
+def test_parse_subsection_without_space_after_number():
+    tree = parse_plantilla("4. Requisitos no funcionales\n4.4Compatibilidad\n")
+    assert tree[0]["children"] == [{"num": "4.4", "title": "Compatibilidad", "children": []}]
+
+
+@pytest.mark.parametrize("line", [
+    "2023 objetivos",
+    "10 usuarios concurrentes",
+    "1. 2023",
+    "3.5 2024",
+    "Texto sin número",
+    "1.",
+])
+def test_lines_that_are_not_sections(line):
+    assert parse_plantilla(f"1. Resumen\n{line}\n") == [{"num": "1", "title": "Resumen", "children": []}]
+
+
+def test_plantilla_to_text_round_trip():
+    text = "1. Resumen\n1.1 Objetivos\n1.1.1 Principal\n2. Alcance"
+    assert plantilla_to_text(parse_plantilla(text)) == text
+
+
+def write(path, text: str, mtime_ns: int) -> None:
+    path.write_text(text, encoding="utf-8")
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_store_reparses_only_when_file_changes(tmp_path):
+    default = tmp_path / "plantilla.txt"
+    write(default, "1. Uno\n", 1_000_000_000)
+    store = PlantillaStore(default, tmp_path / "plantillas", recheck_seconds=0)
+
+    first = store.get()
+    assert store.get() is first
+
+    write(default, "1. Uno\n2. Dos\n", 2_000_000_000)
+    second = store.get()
+    assert second is not first
+    assert [node["num"] for node in second.tree] == ["1", "2"]
+    assert second.digest != first.digest
+
+
+def test_store_waits_recheck_interval_before_touching_disk(tmp_path):
+    default = tmp_path / "plantilla.txt"
+    write(default, "1. Uno\n", 1_000_000_000)
+    store = PlantillaStore(default, tmp_path / "plantillas", recheck_seconds=3600)
+
+    first = store.get()
+    write(default, "1. Uno\n2. Dos\n", 2_000_000_000)
+    assert store.get() is first
+
+
+def test_store_named_plantillas(tmp_path):
+    directory = tmp_path / "plantillas"
+    directory.mkdir()
+    write(directory / "corta.txt", "1. Solo\n", 1_000_000_000)
+    store = PlantillaStore(tmp_path / "plantilla.txt", directory, recheck_seconds=0)
+
+    assert store.names() == ["default", "corta"]
+    assert store.get("corta").text == "1. Solo"
+    # La plantilla por defecto sin fichero es vacía; una con nombre inexistente es un error
+    assert store.get().tree == []
+    with pytest.raises(PlantillaNotFoundError):
+        store.get("otra")
+    with pytest.raises(PlantillaNotFoundError):
+        store.get("../secreto")
@@ -0,0 +1,138 @@
+"""Tests de la normalización del texto extraído (app/services/text_normalization.py)."""
+import random
+
+import pytest
+
+from app.services import text_normalization as normalization
+from app.services.text_normalization import DuplicateDetector, normalize_documents, strip_page_furniture
+from app.utils.tokens import estimate_tokens
+
+BASE = (
+    "El sistema debe permitir a los usuarios registrar incidencias desde la aplicación móvil "
+    "con fotografías adjuntas, la ubicación del dispositivo y una descripción libre del problema."
+)
+
+
+def jaccard(a: str, b: str) -> float:
+    sa, sb = normalization._shingles(a), normalization._shingles(b)
+    return len(sa & sb) / len(sa | sb)
+
+
+BODIES = [
+    "Alta de clientes desde el portal.\nValidación del CIF.",
+    "Consulta de pedidos por estado.\nFiltro por fechas.",
+    "Facturación mensual agrupada.\nEnvío por correo.",
+    "Informes de actividad comercial.\nExportación a Excel.",
+]
+
+
+def page(number: int, body: str) -> str:
+    return f"ACME Consultoría - Documento confidencial\n\n{body}\n\nPágina {number} de 4"
+
+
+def test_headers_footers_and_page_numbers_are_removed():
+    pages = [page(n, body) for n, body in enumerate(BODIES, start=1)]
+    lines, removed = strip_page_furniture(pages)
+    assert removed == 8
+    assert "\n".join(lines) == "\n\n".join(BODIES)
+
+
+def test_repeated_line_in_the_middle_of_pages_is_kept():
+    pages = [
+        f"{body}\nApartado {chr(65 + n)}.\nLínea que se repite en todas.\nNota {chr(70 + n)}.\nFin {chr(75 + n)}.\nCierre {chr(80 + n)}."
+        for n, body in enumerate(BODIES)
+    ]
+    lines, removed = strip_page_furniture(pages)
+    assert removed == 0
+    assert lines.count("Línea que se repite en todas.") == 4
+
+
+def test_spaces_are_collapsed_but_indentation_is_kept():
+    lines, _ = strip_page_furniture(["Texto   con\tespacios   \n\n\n\n  - elemento   anidado"])
+    assert lines == ["Texto con espacios", "", "  - elemento anidado"]
+
+
+def test_duplicate_threshold():
+    near = BASE.replace("libre del problema", "libre y detallada del problema")
+    similarity = jaccard(BASE, near)
+    assert 0.7 < similarity < 0.9
+
+    strict = DuplicateDetector(threshold=0.9)
+    assert not strict.seen(BASE)
+    assert not strict.seen(near)
+
+    lenient = DuplicateDetector(threshold=similarity - 0.01)
+    assert not lenient.seen(BASE)
+    assert lenient.seen(near)
+
+    # Solo cuenta el texto: mayúsculas y puntuación no distinguen dos párrafos
+    exact = DuplicateDetector(threshold=1.0)
+    assert not exact.seen(BASE)
+    assert exact.seen(BASE.upper().replace(",", ""))
+
+
+def test_near_duplicate_paragraphs_across_documents_keep_the_first():
+    other = "Los informes mensuales se envían por correo electrónico a los responsables de cada departamento afectado."
+    documents = [
+        ("v1.pdf", [f"{BASE}\n\n{other}"]),
+        ("v2.pdf", [f"{BASE}\n\nTexto nuevo de la segunda versión con cambios relevantes para el análisis funcional."]),
+    ]
+    normalized, reports = normalize_documents(documents)
+    assert normalized[0] == ("v1.pdf", f"{BASE}\n\n{other}")
+    assert BASE not in normalized[1][1]
+    assert "Texto nuevo de la segunda versión" in normalized[1][1]
+    assert [r.duplicate_paragraphs for r in reports] == [0, 1]
+
+
+def test_short_paragraphs_are_never_removed():
+    short = "Ver anexo A."
+    normalized, reports = normalize_documents([("a.pdf", [f"{short}\n\n{short}"])])
+    assert normalized[0][1] == f"{short}\n\n{short}"
+    assert reports[0].duplicate_paragraphs == 0
+
+
+def test_tokens_saved_accounting():
+    # El párrafo repetido queda lejos de los bordes de la página: se elimina como duplicado, no como cabecera
+    pages = [
+        page(n, f"{body}\n\n{BASE}\n\n{tail}")
+        for n, (body, tail) in enumerate(zip(BODIES, reversed(BODIES)), start=1)
+    ]
+    normalized, reports = normalize_documents([("a.pdf", pages)])
+    report = reports[0]
+    assert report.tokens_before == estimate_tokens("\n".join(pages))
+    assert report.tokens_after == estimate_tokens(normalized[0][1])
+    assert report.tokens_saved == report.tokens_before - report.tokens_after > 0
+    assert report.repeated_lines == 8
+    assert report.duplicate_paragraphs == 3
+    assert report.to_dict()["tokens_saved"] == report.tokens_saved
+    assert normalized[0][1].count(BASE) == 1
+    assert all(body in normalized[0][1] for body in BODIES)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_only_paragraphs_over_the_threshold_are_removed(seed):
+    # Párrafos que comparten fragmentos entre sí: el resultado debe coincidir con la comparación exhaustiva
+    rng = random.Random(seed)
+    vocabulary = [f"palabra{i}" for i in range(60)]
+    fragments = [" ".join(rng.choices(vocabulary, k=8)) for _ in range(12)]
+    paragraphs = []
+    for _ in range(120):
+        words = " ".join(rng.sample(fragments, 3)).split()
+        # Algunas variantes con cambios puntuales de otros párrafos ya vistos
+        if paragraphs and rng.random() < 0.3:
+            words = rng.choice(paragraphs).rstrip(".").split()
+            words[rng.randrange(len(words))] = rng.choice(vocabulary)
+        paragraphs.append(" ".join(words) + ".")
+
+    threshold = normalization.NORMALIZATION_DUPLICATE_THRESHOLD
+    expected, kept_shingles = [], []
+    for paragraph in paragraphs:
+        shingles = normalization._shingles(paragraph)
+        if any(len(shingles & other) >= threshold * len(shingles | other) for other in kept_shingles):
+            continue
+        kept_shingles.append(shingles)
+        expected.append(paragraph)
+    assert len(expected) < len(paragraphs)
+
+    normalized, _ = normalize_documents([("doc.pdf", ["\n\n".join(paragraphs)])])
+    assert normalized[0][1].split("\n\n") == expected
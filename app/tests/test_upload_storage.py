@@ -0,0 +1,72 @@
+"""Tests del guardado de subidas en streaming y del límite de tamaño (app/services/upload_storage.py)."""
+import asyncio
+import hashlib
+import io
+
+import pytest
+from fastapi import FastAPI, File, UploadFile
+from fastapi.testclient import TestClient
+from starlette.datastructures import Headers
+
+from app.services.upload_storage import UploadSizeLimitMiddleware, UploadTooLargeError, save_upload_stream
+
+
+def make_upload(data: bytes, filename: str = "informe.pdf") -> UploadFile:
+    return UploadFile(io.BytesIO(data), filename=filename, headers=Headers({"content-type": "application/pdf"}))
+
+
+def test_save_upload_stream_writes_file_and_hash(tmp_path):
+    data = b"x" * 2500
+    stored = asyncio.run(save_upload_stream(make_upload(data), tmp_path / "informe.pdf", chunk_size=1000))
+    assert stored.size == len(data)
+    assert stored.sha256 == hashlib.sha256(data).hexdigest()
+    assert (tmp_path / "informe.pdf").read_bytes() == data
+    assert [p.name for p in tmp_path.iterdir()] == ["informe.pdf"]
+
+
+def test_oversized_upload_leaves_destination_untouched(tmp_path):
+    dest = tmp_path / "informe.pdf"
+    dest.write_bytes(b"anterior")
+    with pytest.raises(UploadTooLargeError):
+        asyncio.run(save_upload_stream(make_upload(b"x" * 2500), dest, max_bytes=2000, chunk_size=1000))
+    assert dest.read_bytes() == b"anterior"
+    assert [p.name for p in tmp_path.iterdir()] == ["informe.pdf"]
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.state.calls = 0
+
+    @app.post("/api/upload")
+    async def upload(files: list[UploadFile] = File(...)):
+        app.state.calls += 1
+        return {"uploaded": [f.filename for f in files]}
+
+    app.add_middleware(UploadSizeLimitMiddleware, path="/api/upload", max_bytes=1000)
+    with TestClient(app) as client:
+        yield client
+
+
+def test_small_upload_reaches_the_route(client):
+    response = client.post("/api/upload", files={"files": ("a.txt", b"hola")})
+    assert response.status_code == 200
+    assert response.json() == {"uploaded": ["a.txt"]}
+
+
+def test_content_length_over_limit_is_rejected_before_the_route(client):
+    response = client.post("/api/upload", files={"files": ("a.txt", b"x" * 2000)})
+    assert response.status_code == 413
+    assert client.app.state.calls == 0
+
+
+def test_body_without_content_length_is_cut_at_the_limit(client):
+    def chunks():
+        for _ in range(10):
+            yield b"x" * 500
+
+    response = client.post(
+        "/api/upload", content=chunks(), headers={"content-type": "multipart/form-data; boundary=b"}
+    )
+    assert response.status_code == 413
+    assert client.app.state.calls == 0
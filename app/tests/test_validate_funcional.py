@@ -0,0 +1,72 @@
+"""Tests de la validación y el relleno del documento funcional (openai_service.validate_funcional_markdown)."""
+from app.services.openai_service import validate_funcional_markdown
+from app.services.plantillas import parse_plantilla
+from app.utils.markdown_sections import parse_sections
+
+ESTRUCTURA = parse_plantilla(
+    "1. Introducción\n"
+    "2. Alcance\n"
+    "2.1 Usuarios\n"
+    "2.2 Sistemas\n"
+    "3. Requisitos\n"
+    "4. Glosario\n"
+)
+
+
+def titles(md: str) -> list[str]:
+    return [section.title for section in parse_sections(md)]
+
+
+def test_valid_document_is_unchanged():
+    md = (
+        "## 1. Introducción\n\nA.\n\n## 2. Alcance\n\n### 2.1 Usuarios\n\nU.\n\n### 2.2 Sistemas\n\nS.\n\n"
+        "## 3. Requisitos\n\nR.\n\n## 4. Glosario\n\nG."
+    )
+    assert validate_funcional_markdown(md, ESTRUCTURA) == md
+
+
+def test_missing_sections_are_inserted_in_template_order():
+    md = "## 1. Introducción\n\nA.\n\n## 4. Glosario\n\nG.\n"
+    result = validate_funcional_markdown(md, ESTRUCTURA)
+    assert titles(result) == [
+        "1. Introducción", "2. Alcance", "2.1 Usuarios", "2.2 Sistemas", "3. Requisitos", "4. Glosario",
+    ]
+    assert "### 2.1 Usuarios\n\n(Completar sección)\n\n### 2.2 Sistemas" in result
+    assert "## 3. Requisitos\n\n(Completar sección)\n\n## 4. Glosario\n\nG." in result
+
+
+def test_missing_first_and_last_sections():
+    md = "## 2. Alcance\n\n### 2.1 Usuarios\n\nU.\n\n### 2.2 Sistemas\n\nS.\n\n## 3. Requisitos\n\nR.\n"
+    result = validate_funcional_markdown(md, ESTRUCTURA)
+    assert titles(result) == [
+        "1. Introducción", "2. Alcance", "2.1 Usuarios", "2.2 Sistemas", "3. Requisitos", "4. Glosario",
+    ]
+    assert result.startswith("## 1. Introducción\n\n(Completar sección)\n\n## 2. Alcance")
+    assert result.endswith("## 4. Glosario\n\n(Completar sección)")
+
+
+def test_existing_subsections_are_kept_when_a_sibling_is_inserted():
+    md = (
+        "## 1. Introducción\n\nA.\n\n## 2. Alcance\n\nAlc.\n\n### 2.2 Sistemas\n\nS.\n\n#### 2.2.1 ERP\n\nERP.\n\n"
+        "## 3. Requisitos\n\nR.\n\n## 4. Glosario\n\nG.\n"
+    )
+    result = validate_funcional_markdown(md, ESTRUCTURA)
+    assert titles(result) == [
+        "1. Introducción", "2. Alcance", "2.1 Usuarios", "2.2 Sistemas", "2.2.1 ERP", "3. Requisitos", "4. Glosario",
+    ]
+    assert "## 2. Alcance\n\nAlc.\n\n### 2.1 Usuarios\n\n(Completar sección)\n\n### 2.2 Sistemas\n\nS.\n\n#### 2.2.1 ERP\n\nERP." in result
+
+
+def test_text_index_blocks_are_removed():
+    md = (
+        "# Funcional\n\n## Índice\n\n- 1. Introducción\n- 2. Alcance\n\n## 1. Introducción\n\nA.\n\n"
+        "## 2. Alcance\n\n### 2.1 Usuarios\n\nU.\n\n### 2.2 Sistemas\n\nS.\n\n## 3. Requisitos\n\nR.\n\n"
+        "## 4. Glosario\n\nG.\n\n## Árbol de contenidos\n\n1. Introducción\n2. Alcance\n"
+    )
+    result = validate_funcional_markdown(md, ESTRUCTURA)
+    assert titles(result) == [
+        "Funcional", "1. Introducción", "2. Alcance", "2.1 Usuarios", "2.2 Sistemas", "3. Requisitos", "4. Glosario",
+    ]
+    assert "Índice" not in result and "Árbol de contenidos" not in result
+    assert result.endswith("## 4. Glosario\n\nG.")
+
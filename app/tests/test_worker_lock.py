@@ -0,0 +1,43 @@
+"""Tests del bloqueo de un solo worker por directorio de datos (app/services/worker_lock.py)."""
+import subprocess
+import sys
+
+import pytest
+
+from app.services.worker_lock import WorkerLock, WorkerLockError
+
+_TRY_LOCK = """
+import sys
+from pathlib import Path
+from app.services.worker_lock import WorkerLock, WorkerLockError
+try:
+    WorkerLock(Path(sys.argv[1])).acquire()
+except WorkerLockError:
+    sys.exit(3)
+"""
+
+
+def try_lock_in_other_process(path) -> int:
+    return subprocess.run([sys.executable, "-c", _TRY_LOCK, str(path)], check=False).returncode
+
+
+def test_second_process_cannot_start_while_lock_is_held(tmp_path):
+    path = tmp_path / ".worker.lock"
+    lock = WorkerLock(path)
+    lock.acquire()
+    try:
+        assert try_lock_in_other_process(path) == 3
+    finally:
+        lock.release()
+    assert try_lock_in_other_process(path) == 0
+
+
+def test_lock_is_exclusive_within_a_process(tmp_path):
+    path = tmp_path / ".worker.lock"
+    lock = WorkerLock(path)
+    lock.acquire()
+    try:
+        with pytest.raises(WorkerLockError):
+            WorkerLock(path).acquire()
+    finally:
+        lock.release()
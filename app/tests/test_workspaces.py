@@ -0,0 +1,29 @@
+"""Tests de los espacios de trabajo (app/services/workspaces.py)."""
+import shutil
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from app.services.workspaces import Workspace, current_workspace
+from app.utils.sessions import SESSION_COOKIE, sign_session
+
+
+def request_with_session(user: str, project: str) -> Request:
+    cookie = f"{SESSION_COOKIE}={sign_session(user, project)}".encode("latin-1")
+    return Request({"type": "http", "headers": [(b"cookie", cookie)]})
+
+
+def test_current_workspace_recreates_removed_upload_directory():
+    workspace = current_workspace(request_with_session("tests", "borrado"))
+    assert workspace == Workspace("tests", "borrado")
+    assert workspace.uploads_dir.is_dir()
+
+    shutil.rmtree(workspace.root)
+    assert current_workspace(request_with_session("tests", "borrado")).uploads_dir.is_dir()
+
+
+def test_current_workspace_requires_valid_session():
+    with pytest.raises(HTTPException) as error:
+        current_workspace(Request({"type": "http", "headers": []}))
+    assert error.value.status_code == 401
@@ -0,0 +1,61 @@
+"""
+Respuestas de descarga servidas desde buffers en memoria, con GET condicional.
+
+El buffer se envía por trozos y se cierra cuando termina la respuesta, también
+si el cliente corta la descarga. Las descargas llevan ETag y Last-Modified y
+responden 304 cuando el cliente ya tiene esa versión.
+"""
+import os
+from email.utils import formatdate, parsedate_to_datetime
+from typing import BinaryIO, Iterator, Mapping
+from urllib.parse import quote
+
+from fastapi import Response
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", 64 * 1024))
+
+
+def _iter_chunks(buffer: BinaryIO) -> Iterator[bytes]:
+    try:
+        while chunk := buffer.read(EXPORT_CHUNK_SIZE):
+            yield chunk
+    finally:
+        buffer.close()
+
+
+def validator_headers(etag: str, last_modified: float) -> dict[str, str]:
+    """Cabeceras de validación; no-cache obliga al navegador a revalidar antes de reutilizar su copia."""
+    return {"ETag": etag, "Last-Modified": formatdate(last_modified, usegmt=True), "Cache-Control": "no-cache"}
+
+
+def is_not_modified(request_headers: Mapping[str, str], etag: str, last_modified: float) -> bool:
+    """Indica si el cliente ya tiene esta versión (If-None-Match, o If-Modified-Since si no lo hay)."""
+    if_none_match = request_headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+    if_modified_since = request_headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            return int(last_modified) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def not_modified_response(headers: dict[str, str]) -> Response:
+    """Respuesta 304 sin cuerpo con las cabeceras de validación."""
+    return Response(status_code=304, headers=headers)
+
+
+def download_response(buffer: BinaryIO, filename: str, media_type: str, headers: dict[str, str] | None = None) -> StreamingResponse:
+    """Envía el contenido del buffer como fichero adjunto, por trozos, y lo cierra al terminar."""
+    size = buffer.seek(0, os.SEEK_END)
+    buffer.seek(0)
+    quoted = quote(filename)
+    disposition = f'attachment; filename="{filename}"' if quoted == filename else f"attachment; filename*=utf-8''{quoted}"
+    headers = {**(headers or {}), "Content-Disposition": disposition, "Content-Length": str(size)}
+    # La tarea de fondo cubre el caso en que el generador no llega a ejecutarse
+    return StreamingResponse(_iter_chunks(buffer), media_type=media_type, headers=headers, background=BackgroundTask(buffer.close))
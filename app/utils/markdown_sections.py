@@ -0,0 +1,157 @@
+"""
+Índice de secciones de un documento Markdown a partir de sus encabezados ATX ('#', '##', ...).
+
+El documento se recorre una sola vez y se obtiene la lista ordenada de secciones con
+sus offsets y su árbol (padre, hijos y fin del subárbol). Validación, relleno de
+secciones, limpieza de índices, árbol de contenidos y exportadores trabajan sobre
+este índice en lugar de volver a escanear el texto con expresiones regulares.
+"""
+import re
+from dataclasses import dataclass, field
+
+_HEADING_RE = re.compile(r"^(#{1,6})[ \t]*(.*?)[ \t#]*$")
+_FENCE_RE = re.compile(r"^\s*(```|~~~)")
+# Número de sección al comienzo del título: "4", "4.", "4.1", "4.1.2"...
+_NUMBER_RE = re.compile(r"^(\d+(?:\.\d+)*)\.?(?![\d.])")
+
+
+@dataclass
+class MarkdownSection:
+    """Encabezado y cuerpo de una sección (hasta el siguiente encabezado de cualquier nivel).
+
+    parent y children son posiciones en la lista de secciones; subtree_end es el final
+    de la sección junto con todas sus subsecciones.
+    """
+
+    level: int
+    title: str
+    start: int
+    body_start: int
+    end: int
+    parent: int | None = None
+    children: list[int] = field(default_factory=list)
+    subtree_end: int = 0
+
+    @property
+    def number(self) -> str | None:
+        """Número de sección del título ("4.1" en "4.1 Rendimiento"), o None si no está numerado."""
+        m = _NUMBER_RE.match(self.title)
+        return m.group(1) if m else None
+
+    def text(self, md: str) -> str:
+        """Texto completo de la sección, encabezado incluido."""
+        return md[self.start:self.end]
+
+    def body(self, md: str) -> str:
+        """Cuerpo de la sección sin el encabezado."""
+        return md[self.body_start:self.end]
+
+    def subtree_text(self, md: str) -> str:
+        """Texto de la sección con todas sus subsecciones."""
+        return md[self.start:self.subtree_end]
+
+
+def parse_sections(md: str) -> list[MarkdownSection]:
+    """Recorre el documento una sola vez y devuelve sus secciones en orden, con offsets de caracteres.
+
+    Los '#' dentro de bloques de código delimitados no se consideran encabezados.
+    """
+    sections: list[MarkdownSection] = []
+    stack: list[int] = []
+    offset = 0
+    in_fence = False
+    for line in md.splitlines(keepends=True):
+        stripped = line.rstrip("\r\n")
+        if _FENCE_RE.match(stripped):
+            in_fence = not in_fence
+        elif not in_fence:
+            m = _HEADING_RE.match(stripped)
+            if m:
+                level = len(m.group(1))
+                if sections:
+                    sections[-1].end = offset
+                # Se cierran los subárboles de nivel igual o inferior
+                while stack and sections[stack[-1]].level >= level:
+                    sections[stack.pop()].subtree_end = offset
+                section = MarkdownSection(level, m.group(2).strip(), offset, offset + len(line), len(md))
+                if stack:
+                    section.parent = stack[-1]
+                    sections[stack[-1]].children.append(len(sections))
+                stack.append(len(sections))
+                sections.append(section)
+        offset += len(line)
+    for i in stack:
+        sections[i].subtree_end = len(md)
+    return sections
+
+
+class MarkdownIndex:
+    """Documento Markdown con su índice de secciones y búsqueda por número de sección."""
+
+    def __init__(self, md: str):
+        self.markdown = md
+        self.sections = parse_sections(md)
+        self._by_number: dict[str, int] = {}
+        for i, section in enumerate(self.sections):
+            number = section.number
+            if number is not None:
+                self._by_number.setdefault(number, i)
+
+    @property
+    def preamble(self) -> str:
+        """Texto anterior al primer encabezado."""
+        return self.markdown[:self.sections[0].start] if self.sections else self.markdown
+
+    def by_number(self, number: str) -> MarkdownSection | None:
+        """Primera sección con ese número ("4", "4.1"...), o None."""
+        i = self._by_number.get(number.rstrip("."))
+        return self.sections[i] if i is not None else None
+
+    def find(self, section_id: str) -> int | None:
+        """Posición de la sección identificada por su número o por su título (o el comienzo de este)."""
+        wanted = section_id.strip()
+        m = _NUMBER_RE.match(wanted)
+        if m and m.group(1) in self._by_number:
+            return self._by_number[m.group(1)]
+        for i, section in enumerate(self.sections):
+            if section.title == wanted or section.title.startswith(f"{wanted} "):
+                return i
+        return None
+
+    def subtree(self, i: int) -> list[int]:
+        """Posiciones de la sección i y de todas sus subsecciones, en orden de documento."""
+        end = self.sections[i].subtree_end
+        result = [i]
+        for j in range(i + 1, len(self.sections)):
+            if self.sections[j].start >= end:
+                break
+            result.append(j)
+        return result
+
+    def replace_subtree(self, i: int, text: str) -> str:
+        """Documento con la sección i y sus subsecciones sustituidas por text (encabezado incluido)."""
+        section = self.sections[i]
+        tail = self.markdown[section.subtree_end:]
+        # Se mantiene la línea en blanco que separa la sección de la siguiente
+        text = text.strip("\n") + ("\n\n" if tail else "\n")
+        return self.markdown[:section.start] + text + tail
+
+    def outline(self) -> list[dict]:
+        """Árbol de las secciones numeradas: [{"num", "title", "children"}].
+
+        Los encabezados sin número (p. ej. el título del documento) no aparecen, pero sus
+        subsecciones numeradas se cuelgan de su antecesor numerado más cercano.
+        """
+        roots: list[dict] = []
+        nodes: dict[int, dict] = {}
+        for i, section in enumerate(self.sections):
+            number = section.number
+            if number is None:
+                continue
+            node = {"num": number, "title": section.title, "children": []}
+            nodes[i] = node
+            parent = section.parent
+            while parent is not None and parent not in nodes:
+                parent = self.sections[parent].parent
+            (nodes[parent]["children"] if parent is not None else roots).append(node)
+        return roots
@@ -0,0 +1,84 @@
+"""
+Cookie de sesión firmada (HMAC-SHA256) con el usuario y el proyecto activo.
+
+El secreto se toma de SESSION_SECRET; si no está definido se genera una vez y
+se guarda en SESSION_SECRET_PATH, de modo que todos los workers de uvicorn de
+la misma máquina validan las mismas cookies y sobreviven a los reinicios.
+"""
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+SESSION_COOKIE = "session"
+SESSION_SECRET = os.getenv("SESSION_SECRET", "")
+SESSION_SECRET_PATH = Path(os.getenv("SESSION_SECRET_PATH", ".cache/session_secret"))
+SESSION_MAX_AGE = int(os.getenv("SESSION_MAX_AGE", 7 * 24 * 3600))
+
+_secret: bytes | None = None
+
+
+@dataclass(frozen=True)
+class UserSession:
+    """Contenido de una cookie de sesión válida."""
+
+    user: str
+    project: str
+
+
+def _load_secret() -> bytes:
+    global _secret
+    if _secret is not None:
+        return _secret
+    if SESSION_SECRET:
+        _secret = SESSION_SECRET.encode("utf-8")
+        return _secret
+    SESSION_SECRET_PATH.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        # Creación exclusiva: si varios workers arrancan a la vez, solo uno escribe el secreto
+        fd = os.open(SESSION_SECRET_PATH, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, "w") as f:
+            f.write(secrets.token_hex(32))
+    except FileExistsError:
+        pass
+    value = ""
+    for _ in range(50):
+        value = SESSION_SECRET_PATH.read_text().strip()
+        if value:
+            break
+        # Otro worker acaba de crear el fichero y todavía no lo ha escrito
+        time.sleep(0.01)
+    _secret = value.encode("utf-8")
+    return _secret
+
+
+def _sign(payload: str) -> str:
+    return hmac.new(_load_secret(), payload.encode("ascii"), hashlib.sha256).hexdigest()
+
+
+def sign_session(user: str, project: str) -> str:
+    """Valor de la cookie de sesión para el usuario y proyecto indicados."""
+    data = json.dumps({"u": user, "p": project, "t": int(time.time())}, separators=(",", ":"))
+    payload = base64.urlsafe_b64encode(data.encode("utf-8")).decode("ascii").rstrip("=")
+    return f"{payload}.{_sign(payload)}"
+
+
+def read_session(token: str | None) -> UserSession | None:
+    """Sesión contenida en la cookie, o None si falta, está manipulada o ha caducado."""
+    if not token or "." not in token:
+        return None
+    payload, signature = token.rsplit(".", 1)
+    try:
+        if not hmac.compare_digest(signature, _sign(payload)):
+            return None
+        data = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+    except (ValueError, UnicodeError):
+        return None
+    if time.time() - data.get("t", 0) > SESSION_MAX_AGE:
+        return None
+    return UserSession(user=data["u"], project=data["p"])
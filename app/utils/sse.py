@@ -0,0 +1,14 @@
+"""
+Utilidades para respuestas Server-Sent Events (SSE).
+"""
+import json
+
+# Cabeceras para que ni el navegador ni los proxies (nginx) almacenen o agrupen los eventos
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def sse_event(data: dict, event: str | None = None) -> str:
+    """Serializa un evento SSE con datos JSON."""
+    payload = json.dumps(data, ensure_ascii=False)
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {payload}\n\n"
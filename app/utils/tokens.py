@@ -0,0 +1,8 @@
+"""
+Utilidades para estimar el tamaño en tokens de un texto sin depender del tokenizador del modelo.
+"""
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimación rápida del número de tokens de un texto (≈ 4 caracteres por token)."""
+    return (len(text) + 3) // 4
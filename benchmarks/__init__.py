@@ -0,0 +1 @@
+"""Benchmarks de rendimiento con el stub local del modelo (ver benchmarks/__main__.py)."""
@@ -0,0 +1,159 @@
+"""
+Benchmark de la aplicación contra el stub local del modelo.
+
+    python -m benchmarks                                   # todos los escenarios, corpus small y medium
+    python -m benchmarks --scenarios export,chatbot -n 20 -c 4
+    python -m benchmarks --llm-latency 0.5 --llm-tokens-per-second 60 --llm-429-rate 0.1
+    python -m benchmarks --output bench.json               # guarda los resultados
+    python -m benchmarks --baseline bench.json             # falla (código 1) si hay regresiones
+
+La aplicación se ejecuta en proceso con datos aislados en un directorio temporal
+y el stub (app/services/llm_stub.py) en un subproceso. Para cada escenario se
+informa de p50/p95 de latencia, iteraciones por segundo y pico de memoria
+residente del proceso (sin los procesos de extracción).
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+DEFAULT_SCENARIOS = "extract,upload,generate,export,content-tree,chatbot"
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _start_stub(args: argparse.Namespace, port: int) -> subprocess.Popen:
+    env = {
+        **os.environ,
+        "LLM_STUB_PORT": str(port),
+        "LLM_STUB_LATENCY": str(args.llm_latency),
+        "LLM_STUB_TOKENS_PER_SECOND": str(args.llm_tokens_per_second),
+        "LLM_STUB_COMPLETION_TOKENS": str(args.llm_completion_tokens),
+        "LLM_STUB_429_RATE": str(args.llm_429_rate),
+        "LLM_STUB_RETRY_AFTER": str(args.llm_retry_after),
+    }
+    stub = subprocess.Popen(
+        [sys.executable, "-m", "app.services.llm_stub"], cwd=ROOT, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return stub
+        except OSError:
+            if stub.poll() is not None:
+                break
+            time.sleep(0.1)
+    stub.kill()
+    raise RuntimeError("No se pudo arrancar el stub del modelo.")
+
+
+def _configure_environment(workdir: Path, stub_port: int, llm_cache: bool) -> None:
+    """Datos de la aplicación aislados en workdir; debe llamarse antes de importar app."""
+    os.environ.update({
+        "LLM_BACKEND": "stub",
+        "LLM_STUB_URL": f"http://127.0.0.1:{stub_port}/v1",
+        "LLM_CACHE_ENABLED": "1" if llm_cache else "0",
+        "LLM_CACHE_DIR": "",
+        "WORKSPACES_DIR": str(workdir / "workspaces"),
+        "DATABASE_URL": f"sqlite:///{workdir / 'metasketch.db'}",
+        "EXTRACTION_CACHE_DIR": str(workdir / "extraction"),
+        "SESSION_SECRET_PATH": str(workdir / "session_secret"),
+    })
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Benchmark de Metasketch con el stub del modelo.")
+    parser.add_argument("--scenarios", default=DEFAULT_SCENARIOS, help=f"Escenarios separados por comas ({DEFAULT_SCENARIOS}).")
+    parser.add_argument("--sizes", default="small,medium", help="Tamaños del corpus (small, medium, large).")
+    parser.add_argument("--context-size", default="small", help="Tamaño del corpus subido para generar, exportar y el chatbot.")
+    parser.add_argument("-n", "--iterations", type=int, default=5)
+    parser.add_argument("-c", "--concurrency", type=int, default=1)
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Segundos hasta el primer token del stub.")
+    parser.add_argument("--llm-tokens-per-second", type=float, default=0, help="Velocidad de generación del stub (0: sin límite).")
+    parser.add_argument("--llm-completion-tokens", type=int, default=0, help="Longitud mínima de cada respuesta del stub.")
+    parser.add_argument("--llm-429-rate", type=float, default=0, help="Fracción de peticiones que el stub rechaza con 429.")
+    parser.add_argument("--llm-retry-after", type=int, default=1)
+    parser.add_argument("--llm-cache", action="store_true", help="Usa la caché de respuestas del modelo (por defecto desactivada).")
+    parser.add_argument("--corpus-dir", type=Path, default=ROOT / ".cache" / "benchmarks" / "corpus")
+    parser.add_argument("--workdir", type=Path, default=None, help="Directorio de datos de la aplicación (temporal por defecto).")
+    parser.add_argument("--output", type=Path, default=None, help="Fichero JSON donde guardar los resultados.")
+    parser.add_argument("--baseline", type=Path, default=None, help="Resultados JSON anteriores con los que comparar.")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Empeoramiento admitido respecto a la referencia (0.25 = 25 %%).")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    sizes = [s.strip() for s in args.sizes.split(",") if s.strip()]
+    os.chdir(ROOT)
+
+    from benchmarks.corpus import CORPUS_SIZES, build_corpus
+    unknown = [s for s in sizes + [args.context_size] if s not in CORPUS_SIZES]
+    if unknown:
+        print(f"Tamaños de corpus desconocidos: {', '.join(unknown)}", file=sys.stderr)
+        return 2
+    print("Preparando el corpus...", file=sys.stderr)
+    corpus = build_corpus(args.corpus_dir, sorted(set(sizes + [args.context_size]), key=list(CORPUS_SIZES).index))
+
+    workdir = args.workdir or Path(tempfile.mkdtemp(prefix="metasketch-bench-"))
+    stub_port = _free_port()
+    stub = _start_stub(args, stub_port)
+    _configure_environment(workdir, stub_port, args.llm_cache)
+    try:
+        # La aplicación lee su configuración al importarse
+        from fastapi.testclient import TestClient
+
+        from app.main import app
+        from benchmarks.scenarios import SCENARIOS, BenchContext, make_clients, prepare
+        from benchmarks.stats import compare, format_table
+
+        unknown = [s for s in scenarios if s not in SCENARIOS]
+        if unknown:
+            print(f"Escenarios desconocidos: {', '.join(unknown)}", file=sys.stderr)
+            return 2
+        results = []
+        with TestClient(app) as client:
+            ctx = BenchContext(
+                clients=make_clients(client, args.concurrency),
+                corpus={size: corpus[size] for size in sizes},
+                iterations=args.iterations,
+                concurrency=args.concurrency,
+            )
+            print("Subiendo el corpus de contexto y generando el funcional inicial...", file=sys.stderr)
+            prepare(BenchContext(ctx.clients, corpus, 1, 1), args.context_size)
+            for name in scenarios:
+                print(f"Escenario {name}...", file=sys.stderr)
+                results.extend(SCENARIOS[name](ctx))
+    finally:
+        stub.terminate()
+        stub.wait()
+
+    print(format_table(results))
+    rows = [r.to_dict() for r in results]
+    if args.output:
+        report = {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "settings": vars(args), "results": rows}
+        args.output.write_text(json.dumps(report, indent=2, default=str), encoding="utf-8")
+    if args.baseline:
+        regressions = compare(json.loads(args.baseline.read_text(encoding="utf-8"))["results"], rows, args.tolerance)
+        if regressions:
+            print("\nRegresiones respecto a la referencia:\n  " + "\n  ".join(regressions))
+            return 1
+        print("\nSin regresiones respecto a la referencia.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
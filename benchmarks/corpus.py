@@ -0,0 +1,104 @@
+"""
+Corpus sintético de documentos de requisitos (PDF y DOCX) de tamaño creciente.
+
+El texto es determinista (semilla fija) y tiene la forma de los documentos
+reales: capítulos numerados, párrafos de requisitos y cabecera/pie de página
+repetidos en cada página del PDF.
+"""
+import random
+from pathlib import Path
+
+from docx import Document
+from fpdf import FPDF
+
+# Nombre del tamaño -> páginas aproximadas
+CORPUS_SIZES = {"small": 5, "medium": 50, "large": 200}
+
+_SUBJECTS = ["El sistema", "La aplicación", "El módulo de informes", "El gestor documental", "El portal del cliente"]
+_ACTIONS = [
+    "debe permitir exportar", "debe validar", "debe registrar en el histórico", "debe notificar por correo",
+    "debe mostrar en el panel", "debe cifrar", "debe sincronizar con el ERP",
+]
+_OBJECTS = [
+    "los pedidos pendientes", "las altas de usuarios", "las incidencias abiertas", "los contratos firmados",
+    "las facturas emitidas", "los cambios de configuración", "los accesos fallidos",
+]
+_CONDITIONS = [
+    "en menos de dos segundos", "al cierre de cada jornada", "cuando lo solicite un administrador",
+    "respetando los permisos del rol", "sin interrumpir el servicio", "con trazabilidad completa",
+]
+_PARAGRAPHS_PER_PAGE = 6
+
+
+def _paragraph(rng: random.Random, number: int) -> str:
+    sentences = [
+        f"{rng.choice(_SUBJECTS)} {rng.choice(_ACTIONS)} {rng.choice(_OBJECTS)} {rng.choice(_CONDITIONS)}."
+        for _ in range(rng.randint(3, 6))
+    ]
+    return f"RF-{number:04d}. " + " ".join(sentences)
+
+
+def synthetic_pages(pages: int, seed: int = 0) -> list[tuple[str, list[str]]]:
+    """[(título de capítulo, párrafos)] por página; cada 10 páginas empieza un capítulo."""
+    rng = random.Random(seed)
+    result = []
+    number = 1
+    for page in range(pages):
+        title = f"{page // 10 + 1}. Requisitos del bloque {page // 10 + 1}" if page % 10 == 0 else ""
+        paragraphs = []
+        for _ in range(_PARAGRAPHS_PER_PAGE):
+            paragraphs.append(_paragraph(rng, number))
+            number += 1
+        result.append((title, paragraphs))
+    return result
+
+
+def write_pdf(path: Path, pages: int, seed: int = 0) -> Path:
+    """PDF de pages páginas con cabecera y pie de página en cada una."""
+    pdf = FPDF()
+    pdf.set_auto_page_break(auto=False)
+    pdf.set_font("Helvetica", size=10)
+    for index, (title, paragraphs) in enumerate(synthetic_pages(pages, seed), start=1):
+        pdf.add_page()
+        pdf.set_font("Helvetica", size=8)
+        pdf.cell(0, 6, "Proyecto Metasketch - Documento de requisitos - Confidencial", new_x="LMARGIN", new_y="NEXT")
+        if title:
+            pdf.set_font("Helvetica", "B", 14)
+            pdf.cell(0, 10, title, new_x="LMARGIN", new_y="NEXT")
+        pdf.set_font("Helvetica", size=10)
+        for paragraph in paragraphs:
+            pdf.multi_cell(0, 5, paragraph, new_x="LMARGIN", new_y="NEXT")
+            pdf.ln(2)
+        pdf.set_y(-15)
+        pdf.set_font("Helvetica", size=8)
+        pdf.cell(0, 6, f"Página {index} de {pages}", align="C")
+    pdf.output(str(path))
+    return path
+
+
+def write_docx(path: Path, pages: int, seed: int = 0) -> Path:
+    """DOCX con el mismo contenido que el PDF de pages páginas (sin cabeceras repetidas)."""
+    doc = Document()
+    for title, paragraphs in synthetic_pages(pages, seed):
+        if title:
+            doc.add_heading(title, level=1)
+        for paragraph in paragraphs:
+            doc.add_paragraph(paragraph)
+    doc.save(str(path))
+    return path
+
+
+def build_corpus(directory: Path, sizes: list[str]) -> dict[str, list[Path]]:
+    """Genera (o reutiliza) un PDF y un DOCX por tamaño: {tamaño: [pdf, docx]}."""
+    directory.mkdir(parents=True, exist_ok=True)
+    corpus = {}
+    for size in sizes:
+        pages = CORPUS_SIZES[size]
+        pdf = directory / f"requisitos_{size}.pdf"
+        docx = directory / f"requisitos_{size}.docx"
+        if not pdf.exists():
+            write_pdf(pdf, pages, seed=pages)
+        if not docx.exists():
+            write_docx(docx, pages, seed=pages)
+        corpus[size] = [pdf, docx]
+    return corpus
@@ -0,0 +1,204 @@
+"""
+Escenarios del benchmark sobre la aplicación en proceso (TestClient) y el stub del modelo.
+
+Cada escenario ejecuta N iteraciones con C en paralelo; la iteración i usa el
+cliente i % C, y cada cliente trabaja en su propio proyecto (bench0, bench1...)
+para que las generaciones concurrentes no se dedupliquen entre sí.
+"""
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable
+
+from fastapi.testclient import TestClient
+
+from app.services.export_cache import export_artifacts
+from app.services.exports import EXPORT_FORMATS
+from app.services.extraction import extract_text_from_file
+from app.utils.sessions import SESSION_COOKIE, sign_session
+from benchmarks.stats import RssSampler, ScenarioResult
+
+BENCH_USER = "ana"
+_POLL_INTERVAL = 0.05
+_TIMEOUT = 600
+
+
+class ProjectClient:
+    """Peticiones con la sesión de un proyecto sobre el cliente principal.
+
+    Todos comparten el TestClient que ejecuta el lifespan, y por tanto su bucle de eventos
+    (los trabajos de generación y los locks del escritor del funcional viven en él).
+    """
+
+    def __init__(self, client: TestClient, project: str):
+        self.client = client
+        self.headers = {"Cookie": f"{SESSION_COOKIE}={sign_session(BENCH_USER, project)}"}
+
+    def get(self, url: str, **kwargs):
+        return self.client.get(url, headers=self.headers, **kwargs)
+
+    def post(self, url: str, **kwargs):
+        return self.client.post(url, headers=self.headers, **kwargs)
+
+    def delete(self, url: str, **kwargs):
+        return self.client.delete(url, headers=self.headers, **kwargs)
+
+
+@dataclass
+class BenchContext:
+    """Clientes por proyecto, corpus y parámetros de la ejecución."""
+
+    clients: list[ProjectClient]
+    corpus: dict[str, list[Path]]
+    iterations: int
+    concurrency: int
+
+    def client(self, i: int) -> ProjectClient:
+        return self.clients[i % len(self.clients)]
+
+
+def run_scenario(name: str, ctx: BenchContext, step: Callable[[int], bool]) -> ScenarioResult:
+    """Ejecuta step(i) ctx.iterations veces con ctx.concurrency en paralelo y mide cada iteración."""
+    result = ScenarioResult(name)
+
+    def timed(i: int) -> tuple[bool, float]:
+        start = time.perf_counter()
+        try:
+            ok = step(i)
+        except Exception as e:
+            logging.error(f"Error en la iteración {i} de {name}: {e}")
+            ok = False
+        return ok, time.perf_counter() - start
+
+    with RssSampler() as rss:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=ctx.concurrency) as pool:
+            for ok, latency in pool.map(timed, range(ctx.iterations)):
+                if ok:
+                    result.latencies.append(latency)
+                else:
+                    result.errors += 1
+        result.elapsed = time.perf_counter() - start
+    result.peak_rss = rss.peak
+    return result
+
+
+def _wait_until(check: Callable[[], bool], timeout: float = _TIMEOUT) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if check():
+            return True
+        time.sleep(_POLL_INTERVAL)
+    return False
+
+
+def wait_for_extractions(client: ProjectClient) -> bool:
+    """Espera a que ningún documento del proyecto tenga la extracción pendiente."""
+    def done() -> bool:
+        docs = client.get("/api/documents/list").json()
+        return all(doc["status"] != "pending" for doc in docs)
+    return _wait_until(done)
+
+
+def upload(client: ProjectClient, paths: list[Path], prefix: str = "") -> bool:
+    files = [("files", (f"{prefix}{p.name}", p.read_bytes(), "application/octet-stream")) for p in paths]
+    return client.post("/api/upload", files=files).status_code == 200
+
+
+def generate(client: ProjectClient) -> bool:
+    """Lanza una generación del funcional sin caché de respuestas y espera a que termine."""
+    response = client.post("/api/documents/generate-funcional", params={"no_cache": True})
+    if response.status_code != 202:
+        return False
+    job_id = response.json()["job_id"]
+    status = {}
+
+    def finished() -> bool:
+        status.update(client.get(f"/api/documents/generate-funcional/jobs/{job_id}").json())
+        return status["status"] in ("done", "failed", "cancelled")
+
+    return _wait_until(finished) and status["status"] == "done"
+
+
+def make_clients(client: TestClient, count: int) -> list[ProjectClient]:
+    """Un cliente por proyecto bench<i>."""
+    return [ProjectClient(client, f"bench{i}") for i in range(count)]
+
+
+def prepare(ctx: BenchContext, context_size: str) -> None:
+    """Sube el corpus de contexto a cada proyecto y genera un primer funcional (no se mide)."""
+    for client in ctx.clients:
+        if not upload(client, ctx.corpus[context_size]) or not wait_for_extractions(client):
+            raise RuntimeError("No se pudo preparar el corpus de contexto.")
+        if not generate(client):
+            raise RuntimeError("No se pudo generar el funcional inicial.")
+
+
+def scenario_extract(ctx: BenchContext) -> list[ScenarioResult]:
+    """Extracción de texto en proceso, por formato y tamaño."""
+    results = []
+    for size, paths in ctx.corpus.items():
+        for path in paths:
+            results.append(run_scenario(
+                f"extract[{path.suffix[1:]}-{size}]", ctx, lambda i, path=path: bool(extract_text_from_file(str(path)))
+            ))
+    return results
+
+
+def scenario_upload(ctx: BenchContext) -> list[ScenarioResult]:
+    """Subida de un PDF y un DOCX hasta que su extracción en segundo plano ha terminado."""
+    results = []
+    for size, paths in ctx.corpus.items():
+        def step(i: int, paths=paths) -> bool:
+            client = ctx.client(i)
+            return upload(client, paths, prefix="upload_") and wait_for_extractions(client)
+        results.append(run_scenario(f"upload[{size}]", ctx, step))
+        # Los documentos subidos no deben formar parte del contexto de los escenarios siguientes
+        for client in ctx.clients:
+            for path in paths:
+                client.delete(f"/api/documents/upload_{path.name}")
+    return results
+
+
+def scenario_generate(ctx: BenchContext) -> list[ScenarioResult]:
+    """Generación completa del funcional (trabajo en segundo plano hasta done)."""
+    return [run_scenario("generate-funcional", ctx, lambda i: generate(ctx.client(i)))]
+
+
+def scenario_export(ctx: BenchContext) -> list[ScenarioResult]:
+    """Renderizado de cada formato de exportación (se vacía la caché de exportaciones en cada iteración)."""
+    results = []
+    for format in EXPORT_FORMATS:
+        if format == "pdf-unrestricted":
+            url, params = "/api/documents/export-funcional-pdf-unrestricted", {}
+        else:
+            url, params = "/api/documents/export-funcional", {"format": format}
+
+        def step(i: int, url=url, params=params) -> bool:
+            export_artifacts.clear()
+            return ctx.client(i).get(url, params=params).status_code == 200
+        results.append(run_scenario(f"export[{format}]", ctx, step))
+    return results
+
+
+def scenario_content_tree(ctx: BenchContext) -> list[ScenarioResult]:
+    """Página del árbol de contenidos del funcional."""
+    return [run_scenario("content-tree", ctx, lambda i: ctx.client(i).get("/api/content-tree").status_code == 200)]
+
+
+def scenario_chatbot(ctx: BenchContext) -> list[ScenarioResult]:
+    """Pregunta al chatbot con el funcional como contexto, sin caché de respuestas."""
+    payload = {"message": "¿Qué requisitos de trazabilidad hay?", "document_ref": "funcional", "no_cache": True}
+    return [run_scenario("chatbot", ctx, lambda i: ctx.client(i).post("/api/chatbot", json=payload).status_code == 200)]
+
+
+SCENARIOS = {
+    "extract": scenario_extract,
+    "upload": scenario_upload,
+    "generate": scenario_generate,
+    "export": scenario_export,
+    "content-tree": scenario_content_tree,
+    "chatbot": scenario_chatbot,
+}
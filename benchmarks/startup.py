@@ -0,0 +1,113 @@
+"""
+Informe del tiempo de importación de la aplicación al arrancar un worker.
+
+    python -m benchmarks.startup                       # desglose por paquete y módulos más lentos
+    python -m benchmarks.startup --max-ms 1500         # falla (código 1) si el arranque supera el límite
+    python -m benchmarks.startup --output startup.json
+
+Importa app.main en intérpretes nuevos con python -X importtime (el mejor de
+--repeat ejecuciones) y falla también si alguna de las dependencias pesadas que
+deben cargarse en su primer uso (--forbid) se importa al arrancar.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+DEFAULT_TARGET = "app.main"
+# Dependencias que la aplicación importa en su primer uso (ver app/services/warmup.py)
+DEFAULT_FORBIDDEN = "openai,PyPDF2,docx,fpdf,markdown,bs4,numpy,pdfkit"
+
+
+def measure_imports(target: str, workdir: Path) -> dict[str, tuple[int, int]]:
+    """Tiempo propio y acumulado (µs) de cada módulo importado al importar target en un intérprete nuevo."""
+    env = {
+        **os.environ,
+        "WORKSPACES_DIR": str(workdir / "workspaces"),
+        "DATABASE_URL": f"sqlite:///{workdir / 'metasketch.db'}",
+        "EXTRACTION_CACHE_DIR": str(workdir / "extraction"),
+        "SESSION_SECRET_PATH": str(workdir / "session_secret"),
+    }
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {target}"],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=False,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"No se pudo importar {target}:\n{result.stderr[-2000:]}")
+    modules = {}
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        modules[name.strip()] = (int(self_us), int(cumulative_us))
+    return modules
+
+
+def by_package(modules: dict[str, tuple[int, int]]) -> dict[str, int]:
+    """Tiempo propio (µs) sumado por paquete de primer nivel."""
+    totals: dict[str, int] = defaultdict(int)
+    for name, (self_us, _) in modules.items():
+        totals[name.split(".")[0]] += self_us
+    return dict(totals)
+
+
+def format_report(modules: dict[str, tuple[int, int]], top: int) -> str:
+    total = sum(self_us for self_us, _ in modules.values())
+    lines = [f"Importación total: {total / 1000:.1f} ms ({len(modules)} módulos)", "", f"{'Paquete':<32}{'ms':>10}{'%':>8}"]
+    for package, us in sorted(by_package(modules).items(), key=lambda item: -item[1])[:top]:
+        lines.append(f"{package:<32}{us / 1000:>10.1f}{100 * us / total:>8.1f}")
+    lines += ["", f"{'Módulo (acumulado)':<56}{'ms':>10}"]
+    for name, (_, cumulative_us) in sorted(modules.items(), key=lambda item: -item[1][1])[:top]:
+        lines.append(f"{name:<56}{cumulative_us / 1000:>10.1f}")
+    return "\n".join(lines)
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.startup", description="Tiempo de importación del arranque de Metasketch.")
+    parser.add_argument("--target", default=DEFAULT_TARGET, help="Módulo cuyo arranque se mide.")
+    parser.add_argument("--repeat", type=int, default=3, help="Ejecuciones; se informa de la más rápida.")
+    parser.add_argument("--top", type=int, default=15, help="Paquetes y módulos mostrados.")
+    parser.add_argument("--max-ms", type=float, default=0, help="Tiempo total de importación admitido (0: sin límite).")
+    parser.add_argument("--forbid", default=DEFAULT_FORBIDDEN, help="Paquetes que no deben importarse al arrancar (separados por comas).")
+    parser.add_argument("--output", type=Path, default=None, help="Fichero JSON donde guardar el desglose.")
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = parse_args(argv)
+    with tempfile.TemporaryDirectory(prefix="metasketch-startup-") as workdir:
+        runs = [measure_imports(args.target, Path(workdir)) for _ in range(max(1, args.repeat))]
+    modules = min(runs, key=lambda run: sum(self_us for self_us, _ in run.values()))
+    total_ms = sum(self_us for self_us, _ in modules.values()) / 1000
+    print(format_report(modules, args.top))
+
+    failures = []
+    forbidden = [name.strip() for name in args.forbid.split(",") if name.strip()]
+    loaded = sorted(name for name in forbidden if name in modules)
+    if loaded:
+        failures.append(f"Dependencias importadas al arrancar: {', '.join(loaded)}")
+    if args.max_ms and total_ms > args.max_ms:
+        failures.append(f"El arranque tarda {total_ms:.1f} ms (límite: {args.max_ms:.0f} ms)")
+    if args.output:
+        report = {
+            "target": args.target,
+            "total_ms": round(total_ms, 1),
+            "packages_ms": {k: round(v / 1000, 1) for k, v in by_package(modules).items()},
+            "modules_ms": {k: round(v[0] / 1000, 1) for k, v in modules.items()},
+            "failures": failures,
+        }
+        args.output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    if failures:
+        print("\n" + "\n".join(failures))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+"""
+Estadísticas de los escenarios: percentiles de latencia, throughput y pico de memoria.
+"""
+import os
+import resource
+import threading
+from dataclasses import dataclass, field
+
+
+def percentile(values: list[float], p: float) -> float:
+    """Percentil p (0-100) con interpolación lineal."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * p / 100
+    lower = int(k)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (k - lower)
+
+
+def current_rss() -> int:
+    """Memoria residente actual del proceso en bytes (pico histórico si no hay /proc)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        # ru_maxrss está en KiB en Linux y en bytes en macOS
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss if os.uname().sysname == "Darwin" else maxrss * 1024
+
+
+class RssSampler:
+    """Muestrea la memoria residente en un hilo mientras dura el bloque y guarda el pico."""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.peak = max(self.peak, current_rss())
+            self._stop.wait(self.interval)
+
+    def __enter__(self) -> "RssSampler":
+        self.peak = current_rss()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss())
+
+
+@dataclass
+class ScenarioResult:
+    """Latencias (segundos) de las iteraciones de un escenario."""
+
+    name: str
+    latencies: list[float] = field(default_factory=list)
+    errors: int = 0
+    elapsed: float = 0.0
+    peak_rss: int = 0
+
+    @property
+    def p50(self) -> float:
+        return percentile(self.latencies, 50)
+
+    @property
+    def p95(self) -> float:
+        return percentile(self.latencies, 95)
+
+    @property
+    def throughput(self) -> float:
+        """Iteraciones correctas por segundo."""
+        return len(self.latencies) / self.elapsed if self.elapsed else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "iterations": len(self.latencies) + self.errors,
+            "errors": self.errors,
+            "p50_ms": round(self.p50 * 1000, 2),
+            "p95_ms": round(self.p95 * 1000, 2),
+            "throughput_per_s": round(self.throughput, 3),
+            "peak_rss_mb": round(self.peak_rss / 2**20, 1),
+        }
+
+
+def format_table(results: list[ScenarioResult]) -> str:
+    """Tabla de texto con una fila por escenario."""
+    header = f"{'escenario':<28}{'n':>5}{'errores':>9}{'p50 ms':>11}{'p95 ms':>11}{'it/s':>9}{'RSS MB':>9}"
+    lines = [header, "-" * len(header)]
+    for result in results:
+        row = result.to_dict()
+        lines.append(
+            f"{row['name']:<28}{row['iterations']:>5}{row['errors']:>9}{row['p50_ms']:>11.1f}"
+            f"{row['p95_ms']:>11.1f}{row['throughput_per_s']:>9.2f}{row['peak_rss_mb']:>9.1f}"
+        )
+    return "\n".join(lines)
+
+
+def compare(baseline: list[dict], current: list[dict], tolerance: float) -> list[str]:
+    """Regresiones de p95 o de memoria por encima de tolerance (0.2 = 20 %) respecto a una ejecución anterior."""
+    previous = {row["name"]: row for row in baseline}
+    regressions = []
+    for row in current:
+        before = previous.get(row["name"])
+        if before is None:
+            continue
+        for key in ("p95_ms", "peak_rss_mb"):
+            if before[key] > 0 and row[key] > before[key] * (1 + tolerance):
+                regressions.append(f"{row['name']}: {key} {before[key]} -> {row[key]}")
+        if row["errors"] > before["errors"]:
+            regressions.append(f"{row['name']}: errores {before['errors']} -> {row['errors']}")
+    return regressions